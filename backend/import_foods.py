@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Import a food composition table into the foods catalog
+
+    python import_foods.py taco.csv --source taco
+    python import_foods.py alimentos.jsonl --source tbca --batch-size 2000
+
+Rows are streamed (CSV or JSON Lines), validated against the Food model and
+upserted in unordered batches while the next batch is being parsed. Reimporting
+the same table is idempotent: food IDs derive from the source and the row.
+Uses MONGO_URL/DB_NAME from the environment (or backend/.env), like the server.
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+
+import server
+
+logger = logging.getLogger("import_foods")
+
+# Accepted column names (lower-cased) for each Food field
+COLUMN_ALIASES = {
+    "food_id": ("food_id", "id", "codigo", "código", "code"),
+    "name": ("name", "nome", "alimento", "descricao", "descrição", "description"),
+    "category": ("category", "categoria", "grupo", "group"),
+    "calories_per_100g": ("calories_per_100g", "kcal", "energia_kcal", "energy_kcal", "calorias"),
+    "protein_g": ("protein_g", "proteina", "proteína", "proteina_g", "protein"),
+    "carbs_g": ("carbs_g", "carboidrato", "carboidratos", "carboidrato_g", "carbohydrate"),
+    "fat_g": ("fat_g", "lipidios", "lipídios", "lipideos", "gordura", "gordura_g", "fat"),
+    "fiber_g": ("fiber_g", "fibra", "fibra_alimentar", "fibra_g", "fiber"),
+    "detox_friendly": ("detox_friendly", "detox"),
+}
+
+# Markers composition tables use for "not analysed" and "trace"
+MISSING_VALUES = {"", "na", "n/a", "*", "-", "nd"}
+TRACE_VALUES = {"tr", "traço", "traco"}
+
+NUMERIC_FIELDS = ("calories_per_100g", "protein_g", "carbs_g", "fat_g", "fiber_g")
+
+
+def parse_number(value: Any) -> Optional[float]:
+    """Number from a table cell, accepting decimal commas and trace/missing markers
+
+    With both separators the last one is the decimal point ("1.234,5" and
+    "1,234.5" are 1234.5); a lone separator is always decimal ("1.234" is 1.234).
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    text = str(value).strip().lower()
+    if text in MISSING_VALUES:
+        return None
+    if text in TRACE_VALUES:
+        return 0.0
+    if "," in text and "." in text:
+        thousands = "." if text.rfind(",") > text.rfind(".") else ","
+        text = text.replace(thousands, "")
+    return float(text.replace(",", "."))
+
+
+def parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ("1", "true", "sim", "yes", "s", "y")
+
+
+def read_rows(path: Path) -> Iterator[Tuple[int, Union[Dict[str, Any], str]]]:
+    """Stream (line number, raw row) from a CSV (comma or semicolon) or JSON Lines file
+
+    JSON Lines rows are yielded as text and parsed by to_food, so a malformed
+    line is rejected like any other bad row.
+    """
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for line_number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield line_number, line
+            return
+
+        sample = f.read(4096)
+        f.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        reader = csv.reader(f, dialect=dialect)
+        header = next(reader, [])
+        # line_num counts physical lines, so blank lines and quoted fields spanning lines are accounted for
+        line_number = reader.line_num + 1
+        for values in reader:
+            if values:
+                yield line_number, dict(zip(header, values))
+            line_number = reader.line_num + 1
+
+
+def to_food(row: Union[Dict[str, Any], str], source: str) -> server.Food:
+    """Map a raw row (or JSON Lines text) onto the Food model"""
+    if isinstance(row, str):
+        row = json.loads(row)  # JSONDecodeError is a ValueError
+        if not isinstance(row, dict):
+            raise ValueError("row is not a JSON object")
+    columns = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+    values = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in columns:
+                values[field] = columns[alias]
+                break
+
+    for field in NUMERIC_FIELDS:
+        if field in values:
+            values[field] = parse_number(values[field])
+    if values.get("calories_per_100g") is not None:
+        values["calories_per_100g"] = round(values["calories_per_100g"])
+    values["detox_friendly"] = parse_bool(values.get("detox_friendly", False))
+
+    name = str(values.get("name") or "").strip()
+    category = str(values.get("category") or "").strip()
+    if not name:
+        raise ValueError("row has no name")
+    values["name"], values["category"] = name, category
+    if not values.get("food_id"):
+        # Stable across reimports of the same table
+        digest = hashlib.sha1(f"{server.search_key(name)}|{server.search_key(category)}".encode()).hexdigest()
+        values["food_id"] = f"{source}_{digest[:12]}"
+    else:
+        values["food_id"] = f"{source}_{str(values['food_id']).strip()}"
+
+    return server.Food(**values)
+
+
+class FoodImporter:
+    def __init__(self, source: str, batch_size: int = 1000):
+        self.source = source
+        self.batch_size = batch_size
+        self.rows = 0
+        self.rejected = 0
+        self.upserted = 0
+        self.modified = 0
+
+    async def write(self, batch):
+        result = await server.db.foods.bulk_write(batch, ordered=False)
+        self.upserted += result.upserted_count
+        self.modified += result.modified_count
+
+    async def run(self, path: Path):
+        """Stream the file, keeping at most one batch write in flight"""
+        await server.ensure_indexes()
+        started = time.perf_counter()
+        batch = []
+        pending: Optional[asyncio.Task] = None
+
+        for line_number, row in read_rows(path):
+            try:
+                food = to_food(row, self.source)
+            except (ValidationError, ValueError) as e:
+                self.rejected += 1
+                logger.warning("Row %d rejected: %s", line_number, e)
+                continue
+
+            document = {**server.food_document(food.model_dump(exclude_none=True)), "source": self.source}
+            batch.append(UpdateOne({"food_id": food.food_id}, {"$set": document}, upsert=True))
+            self.rows += 1
+
+            if len(batch) >= self.batch_size:
+                if pending is not None:
+                    await pending
+                pending = asyncio.create_task(self.write(batch))
+                batch = []
+                # Let the write make progress while the next batch is parsed
+                await asyncio.sleep(0)
+                logger.info("%d rows, %.0f rows/s", self.rows, self.rows / (time.perf_counter() - started))
+
+        if pending is not None:
+            await pending
+        if batch:
+            await self.write(batch)
+
+        # Bump the catalog revision so every worker reloads its catalog cache
+        await server.db.metadata.update_one(
+            {"_id": "catalog"},
+            {"$set": {"updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+
+        elapsed = time.perf_counter() - started
+        logger.info(
+            "Imported %d rows in %.1fs (%.0f rows/s): %d new, %d updated, %d rejected",
+            self.rows, elapsed, self.rows / elapsed if elapsed else 0, self.upserted, self.modified, self.rejected
+        )
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", type=Path, help="CSV or JSON Lines file")
+    parser.add_argument("--source", required=True, help="short table name, prefixes every food_id (ex: taco)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    try:
+        await FoodImporter(args.source, args.batch_size).run(args.path)
+    finally:
+        server.close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Convert the entry collections into MongoDB time-series collections
+
+    python migrate_timeseries.py
+    python migrate_timeseries.py food_entries --batch-size 5000 --drop-legacy
+
+Stop the API first. Each collection is renamed to <name>_legacy, recreated as
+a time-series collection (metaField user_id, timeField created_at) and refilled
+from the legacy copy in batches, with one batch write in flight; its indexes
+are then rebuilt. Documents are counted on both sides before the legacy copy is
+dropped (only with --drop-legacy). Start the API again with
+ENTRY_STORAGE=timeseries. Needs MongoDB 8.0+ for entry edits and deletes.
+Uses MONGO_URL/DB_NAME from the environment (or backend/.env), like the server.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import server
+
+logger = logging.getLogger("migrate_timeseries")
+
+
+async def collection_types():
+    cursor = await server.db.list_collections()
+    return {info["name"]: info["type"] for info in await cursor.to_list(None)}
+
+
+async def migrate(name: str, batch_size: int, drop_legacy: bool):
+    legacy = f"{name}_legacy"
+    collections = await collection_types()
+
+    if collections.get(name) == "timeseries":
+        logger.info("%s is already a time-series collection", name)
+        return
+    if legacy in collections:
+        raise SystemExit(f"{legacy} exists from a previous run: restore or drop it first")
+
+    started = time.perf_counter()
+    if name in collections:
+        await server.db[name].rename(legacy)
+    await server.db.create_collection(name, timeseries=server.TIMESERIES_OPTIONS)
+
+    copied = 0
+    batch = []
+    pending: Optional[asyncio.Task] = None
+    async for document in server.db[legacy].find({}):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            if pending is not None:
+                await pending
+            pending = asyncio.create_task(server.db[name].insert_many(batch, ordered=False))
+            copied += len(batch)
+            batch = []
+            logger.info("%s: %d documents copied", name, copied)
+    if pending is not None:
+        await pending
+    if batch:
+        await server.db[name].insert_many(batch, ordered=False)
+        copied += len(batch)
+
+    await server.db[name].create_indexes(server.INDEXES[name])
+
+    expected = await server.db[legacy].count_documents({}) if name in collections else 0
+    migrated = await server.db[name].count_documents({})
+    if migrated != expected:
+        raise SystemExit(f"{name}: {migrated} documents migrated, {legacy} has {expected}; keeping {legacy}")
+
+    if drop_legacy and name in collections:
+        await server.db[legacy].drop()
+    logger.info("Migrated %s: %d documents in %.1fs", name, migrated, time.perf_counter() - started)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "collections", nargs="*", metavar="collection",
+        help=f"collections to convert (default: {', '.join(server.TIMESERIES_COLLECTIONS)})"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--drop-legacy", action="store_true", help="drop <name>_legacy once counts match")
+    args = parser.parse_args(argv)
+    unknown = set(args.collections) - set(server.TIMESERIES_COLLECTIONS)
+    if unknown:
+        parser.error(f"not an entry collection: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        for name in args.collections or server.TIMESERIES_COLLECTIONS:
+            await migrate(name, args.batch_size, args.drop_legacy)
+    finally:
+        server.close_client()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,38 +1,383 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Depends, Query
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+import pymongo
+from pymongo import ReplaceOne, DeleteMany, UpdateOne, UpdateMany, IndexModel, ASCENDING, DESCENDING, monitoring
+from pymongo.errors import DuplicateKeyError, PyMongoError, ConnectionFailure, OperationFailure
+from contextlib import asynccontextmanager
 import os
+import json
+import time
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import ipaddress
 import logging
+import math
+import re
+import unicodedata
+import queue
+import random
+import logging.handlers
+import orjson
+import numpy as np
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # only needed with RATE_LIMIT_BACKEND=redis
+    redis_asyncio = None
+
+try:
+    import brotli
+except ImportError:  # responses fall back to gzip
+    brotli = None
+import gzip
+import zlib
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, TypeAdapter
+from starlette.datastructures import Headers, MutableHeaders
+from typing import List, Optional, Dict, Any, Callable, Awaitable, Hashable, Literal
 import uuid
 import httpx
 from datetime import datetime, timezone, timedelta
 
 
 ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
 
-# Create the main app without a prefix
-app = FastAPI()
+# ============ SETTINGS ============
+
+class Settings(BaseModel):
+    """Runtime configuration; each field maps to the upper-cased environment variable"""
+    mongo_url: str
+    db_name: str
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 0
+    mongo_compressors: Optional[str] = None  # ex: "zstd,snappy,zlib"
+    mongo_server_selection_timeout_ms: int = 30000
+    mongo_connect_timeout_ms: int = 20000
+    mongo_socket_timeout_ms: Optional[int] = None
+    lean_responses: bool = True  # serve reads without re-validating DB documents
+    catalog_refresh_interval: int = 60  # seconds between catalog change checks
+    water_flush_window_ms: int = 500  # taps closer than this are coalesced
+    water_flush_max_delay_ms: int = 2000  # upper bound before a tap reaches MongoDB
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "local"  # "local" (per worker) or "redis" (shared by all workers)
+    redis_url: Optional[str] = None
+    trusted_proxies: Optional[str] = None  # comma-separated IPs/CIDRs of proxies whose X-Forwarded-For is believed
+    max_concurrent_requests: Optional[int] = None  # defaults to MONGO_MAX_POOL_SIZE
+    request_timeout_ms: int = 5000  # MongoDB time budget of one API request
+    compression_minimum_size: int = 1024  # smaller bodies are not worth compressing
+    shared_cache_ttl: float = 60  # upper bound on staleness should an invalidation be missed
+    log_level: str = "INFO"
+    log_format: str = "json"  # "json" or "text"
+    log_sample_rate: float = 0.1  # share of per-request access logs kept (warnings always are)
+    catalog_breaker_failures: int = 5  # consecutive failures that open the catalog breaker
+    catalog_breaker_reset_s: float = 30  # how long it stays open before a trial call
+    entry_storage: str = "standard"  # or "timeseries" for entries and water events (MongoDB 8.0+)
+    rollup_after_days: int = 90  # entries older than this are rolled into daily summaries (0 disables)
+    rollup_hour_utc: int = 3  # when the nightly rollup runs
+    rollup_archive: bool = False  # move rolled-up rows to *_archive collections instead of deleting them
+    cycle_archive_after_days: int = 30  # completed cycles older than this leave daily_records (0 disables)
+    metrics_token: Optional[str] = None  # bearer token for /health/metrics; unset hides the endpoint
+    
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Read settings from the environment, loading backend/.env first"""
+        load_dotenv(ROOT_DIR / '.env')
+        values = {
+            name: os.environ[name.upper()]
+            for name in cls.model_fields
+            if os.environ.get(name.upper())
+        }
+        return cls(**values)
+
+_settings: Optional[Settings] = None
+
+def configure(settings: Settings):
+    """Install explicit settings, dropping any client built from the previous ones"""
+    global _settings
+    _settings = settings
+    close_client()
+
+def get_settings() -> Settings:
+    """Current settings, read from the environment on first use"""
+    global _settings
+    if _settings is None:
+        _settings = Settings.from_env()
+    return _settings
+
+
+# ============ MONGODB CONNECTION ============
+
+_client: Optional[AsyncIOMotorClient] = None
+_client_pid: Optional[int] = None
+
+def get_client() -> AsyncIOMotorClient:
+    """Motor client of the current worker process, created on first use"""
+    global _client, _client_pid
+    
+    # A forked worker must never reuse the parent's sockets
+    if _client is None or _client_pid != os.getpid():
+        settings = get_settings()
+        options = {
+            "maxPoolSize": settings.mongo_max_pool_size,
+            "minPoolSize": settings.mongo_min_pool_size,
+            "compressors": settings.mongo_compressors,
+            "serverSelectionTimeoutMS": settings.mongo_server_selection_timeout_ms,
+            "connectTimeoutMS": settings.mongo_connect_timeout_ms,
+            "socketTimeoutMS": settings.mongo_socket_timeout_ms,
+            "event_listeners": [db_timing_listener],
+        }
+        _client = AsyncIOMotorClient(
+            settings.mongo_url,
+            **{key: value for key, value in options.items() if value is not None}
+        )
+        _client_pid = os.getpid()
+    
+    return _client
+
+def close_client():
+    """Close this process' client; the next access creates a fresh one"""
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        _client.close()
+    _client = None
+    _client_pid = None
+
+class LazyDatabase:
+    """Resolves `db.<collection>` against the current process' client on each access"""
+    
+    def __getattr__(self, name: str):
+        return getattr(get_client()[get_settings().db_name], name)
+    
+    def __getitem__(self, name: str):
+        return get_client()[get_settings().db_name][name]
+
+db = LazyDatabase()
+
+async def in_transaction(fn: Callable[[Any], Awaitable[Any]], enabled: bool = True) -> Any:
+    """Run fn(session) in a transaction on replica sets and sharded clusters.
+    
+    A standalone mongod has no transactions: fn(None) runs its writes one by one,
+    as it does when `enabled` is False.
+    """
+    client = get_client()
+    if not enabled or client.topology_description.topology_type_name not in ("ReplicaSetWithPrimary", "Sharded"):
+        return await fn(None)
+    
+    async with await client.start_session() as session:
+        return await session.with_transaction(fn)
+
+# Append-mostly events stored as time-series collections with ENTRY_STORAGE=timeseries.
+# Documents are bucketed per user and hour of created_at; migrate_timeseries.py
+# converts existing collections.
+TIMESERIES_COLLECTIONS = ("food_entries", "activity_entries", "water_events")
+TIMESERIES_OPTIONS = {"timeField": "created_at", "metaField": "user_id", "granularity": "hours"}
+
+def timeseries_entries() -> bool:
+    return get_settings().entry_storage == "timeseries"
+
+def entry_date_query(user_id: str, start: str, end: Optional[str] = None) -> Dict[str, Any]:
+    """Query for a user's entries dated start..end (inclusive), or on `start` alone
+    
+    An entry's date is the UTC day of its created_at. On time-series storage the
+    matching created_at bounds are added, which is what prunes buckets.
+    """
+    end = end or start
+    query = {"user_id": user_id, "date": start if start == end else {"$gte": start, "$lte": end}}
+    if timeseries_entries():
+        first_day = datetime.strptime(start, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        last_day = datetime.strptime(end, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        query["created_at"] = {"$gte": first_day, "$lt": last_day + timedelta(days=1)}
+    return query
+
+async def ensure_collections():
+    """Create the time-series collections before an insert or index creates regular ones"""
+    if not timeseries_entries():
+        return
+    
+    collections = {info["name"]: info["type"] for info in await (await db.list_collections()).to_list(None)}
+    for name in TIMESERIES_COLLECTIONS:
+        if name not in collections:
+            await db.create_collection(name, timeseries=TIMESERIES_OPTIONS)
+        elif collections[name] != "timeseries":
+            logger.warning("%s is a regular collection; run migrate_timeseries.py to convert it", name)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Configure logging
+# ============ LOGGING ============
+
+TEXT_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+# [commands, milliseconds] spent in MongoDB by the current request
+db_timing_var: contextvars.ContextVar[Optional[List[float]]] = contextvars.ContextVar("db_timing", default=None)
+
+class DBTimingListener(monitoring.CommandListener):
+    """Add each MongoDB command's duration to the request that issued it
+    
+    Runs on Motor's executor threads, which see the request's contextvars.
+    """
+    
+    def record(self, event):
+        timing = db_timing_var.get()
+        if timing is not None:
+            timing[0] += 1
+            timing[1] += event.duration_micros / 1000
+    
+    def started(self, event):
+        pass
+    
+    succeeded = failed = record
+
+db_timing_listener = DBTimingListener()
+
+class RequestContextFilter(logging.Filter):
+    """Stamp records with the request ID and DB timing of the request that logged them"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        timing = db_timing_var.get()
+        if timing is not None:
+            record.db_calls = int(timing[0])
+            record.db_ms = round(timing[1], 2)
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keep a share of the high-volume INFO records (access log, httpx); warnings always pass"""
+    
+    SAMPLED_LOGGERS = ("server.access", "uvicorn.access", "httpx")
+    
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or record.name not in self.SAMPLED_LOGGERS:
+            return True
+        return random.random() < self.rate
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+    
+    EXTRA_FIELDS = ("request_id", "db_calls", "db_ms", "method", "path", "status", "duration_ms")
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, option=orjson.OPT_UTC_Z, default=str).decode()
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """Hand records to the listener thread untouched
+    
+    The queue never leaves the process, so the record needs no pickling and
+    message formatting happens on the listener thread, off the event loop.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+_log_listener: Optional[logging.handlers.QueueListener] = None
+# Loggers configure_logging() rewires; "" is the root logger
+QUEUED_LOGGERS = ("", "uvicorn", "uvicorn.error", "uvicorn.access")
+# logger name -> (handlers, level, propagate) from before configure_logging(), for stop_logging()
+_previous_logging: Dict[str, tuple] = {}
+
+def configure_logging(settings: Settings):
+    """Route every record through a queue to a thread that formats and writes it"""
+    global _log_listener
+    stop_logging()
+    for name in QUEUED_LOGGERS:
+        named_logger = logging.getLogger(name)
+        _previous_logging[name] = (list(named_logger.handlers), named_logger.level, named_logger.propagate)
+    
+    stream_handler = logging.StreamHandler()
+    if settings.log_format == "json":
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_LOG_FORMAT))
+    
+    queue_handler = LocalQueueHandler(queue.SimpleQueue())
+    # Filters run on the calling thread, where the request's contextvars are visible
+    queue_handler.addFilter(SamplingFilter(settings.log_sample_rate))
+    queue_handler.addFilter(RequestContextFilter())
+    
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.log_level.upper())
+    
+    # uvicorn installs its own synchronous handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    
+    _log_listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler)
+    _log_listener.start()
+
+def stop_logging():
+    """Drain the queue, stop the listener thread and restore the previous handlers
+    
+    Left in place, the queue handler would keep accepting records nothing writes.
+    """
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+    for name, (handlers, level, propagate) in _previous_logging.items():
+        named_logger = logging.getLogger(name)
+        named_logger.handlers = handlers
+        named_logger.setLevel(level)
+        named_logger.propagate = propagate
+    _previous_logging.clear()
+
+# Until the app starts and configure_logging() runs (scripts, imports)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format=TEXT_LOG_FORMAT
 )
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("server.access")
+
+async def request_context_middleware(request: Request, call_next):
+    """Assign a request ID, collect DB timing and write the access log line"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+    request_id_var.set(request_id)
+    timing = [0, 0.0]
+    db_timing_var.set(timing)
+    
+    started = time.perf_counter()
+    response = await call_next(request)
+    
+    response.headers["X-Request-ID"] = request_id
+    access_logger.info(
+        "%s %s %d",
+        request.method,
+        request.url.path,
+        response.status_code,
+        extra={
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+    )
+    return response
 
 
 # ============ MODELS ============
@@ -50,6 +395,7 @@ class User(BaseModel):
     chest: Optional[float] = None  # cm
     activation_code: Optional[str] = None  # Código de ativação vinculado
     is_active: bool = False  # Se o usuário está ativo
+    active_cycle_id: Optional[str] = None  # ciclo de 21 dias em andamento
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -62,6 +408,10 @@ class ActivationCode(BaseModel):
     created_at: datetime
     expires_at: Optional[datetime] = None  # Opcional: código com validade
 
+class ActivationCodeList(BaseModel):
+    total: int
+    codes: List[ActivationCode]
+
 class ActivationCodeCreate(BaseModel):
     quantity: int = 1  # Quantos códigos gerar
     expires_days: Optional[int] = None  # Dias até expirar (opcional)
@@ -78,6 +428,7 @@ class SessionDataResponse(BaseModel):
 
 class UserGoals(BaseModel):
     user_id: str
+    cycle_id: Optional[str] = None
     meta_principal: str
     desejo_transformar: str
     sentimento_desejado: str
@@ -85,6 +436,7 @@ class UserGoals(BaseModel):
     medidas_iniciais: Optional[str] = None
     compromisso: str
     created_at: datetime
+    updated_at: Optional[datetime] = None
 
 class UserGoalsCreate(BaseModel):
     meta_principal: str
@@ -113,6 +465,7 @@ class PraticasDiarias(BaseModel):
 
 class DailyRecord(BaseModel):
     user_id: str
+    cycle_id: Optional[str] = None
     date: str  # YYYY-MM-DD format
     day_number: int
     checklist_alimentar: ChecklistAlimentar = Field(default_factory=ChecklistAlimentar)
@@ -137,25 +490,67 @@ class DailyRecordCreate(BaseModel):
     vitoria_dia: Optional[str] = None
     gratidoes: Optional[List[str]] = None
 
+class MethodProgress(BaseModel):
+    goals: Optional[UserGoals] = None
+    daily_records: List[DailyRecord]
+    total_days_completed: int
+
+class Columns(BaseModel):
+    """Rows transposed to one array per field, for ?format=columnar"""
+    count: int
+    columns: Dict[str, List[Any]]
+
+class ColumnarMethodProgress(BaseModel):
+    goals: Optional[UserGoals] = None
+    daily_records: Columns
+    total_days_completed: int
+
 class FinalReflection(BaseModel):
     user_id: str
+    cycle_id: Optional[str] = None
     mudancas: str
     nova_intencao: str
     data_conclusao: datetime
     created_at: datetime
+    updated_at: Optional[datetime] = None
 
 class FinalReflectionCreate(BaseModel):
     mudancas: str
     nova_intencao: str
 
+class CycleSummary(BaseModel):
+    cycle_id: str
+    user_id: str
+    started_at: Optional[datetime] = None
+    completed_at: datetime
+    days_completed: int
+    first_date: Optional[str] = None
+    last_date: Optional[str] = None
+    calories_consumed: int
+    calories_burned: int
+    water_intake: int  # ml, whole cycle
+    habits: Dict[str, float]  # share of days each checklist item / practice was done
+    created_at: datetime  # when it was archived
+
+class ArchivedCycle(CycleSummary):
+    goals: Optional[UserGoals] = None
+    reflection: Optional[FinalReflection] = None
+    daily_records: List[DailyRecord]
+
 class Food(BaseModel):
     food_id: str
     name: str
     category: str
     calories_per_100g: int
     detox_friendly: bool
+    # Macronutrients in grams per 100 g, when the source table has them
+    protein_g: Optional[float] = None
+    carbs_g: Optional[float] = None
+    fat_g: Optional[float] = None
+    fiber_g: Optional[float] = None
 
 class FoodEntry(BaseModel):
+    entry_id: str
     user_id: str
     date: str
     meal_type: str  # cafe_manha, almoco, jantar, lanche
@@ -164,12 +559,99 @@ class FoodEntry(BaseModel):
     portions: float  # in grams
     calories: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
+
+class NutrientTotals(BaseModel):
+    calories: int
+    protein_g: float
+    carbs_g: float
+    fat_g: float
+    fiber_g: float
+
+class DayNutrients(BaseModel):
+    date: str
+    totals: NutrientTotals
+    by_meal: Dict[str, NutrientTotals]
+
+class ActivityCategoryTotals(BaseModel):
+    calories_burned: int
+    duration: int  # minutes
+    entries: int
+
+class ActivityGroup(BaseModel):
+    """Rolled-up activity entries that share every input of their calories"""
+    activity_id: str
+    intensity: str
+    duration: int  # minutes, per entry
+    calories_burned: int  # per entry
+    entries: int
+
+class DailySummary(BaseModel):
+    """A day whose food and activity entries were rolled up (they no longer exist)"""
+    user_id: str
+    date: str
+    totals: NutrientTotals
+    by_meal: Dict[str, NutrientTotals]
+    food_entry_count: int
+    calories_burned: int
+    by_activity_category: Dict[str, ActivityCategoryTotals]
+    activity_entry_count: int
+    activities: List[ActivityGroup] = []
+    updated_at: datetime
+
+class NutrientRange(BaseModel):
+    start: str
+    end: str
+    totals: NutrientTotals
+    days: List[DayNutrients]  # only days with entries
+
+class TodayCalories(BaseModel):
+    total_calories: int
+    by_meal: Dict[str, List[FoodEntry]]
+    all_entries: List[FoodEntry]
+    totals: NutrientTotals
+    by_meal_totals: Dict[str, NutrientTotals]
 
 class FoodEntryCreate(BaseModel):
     meal_type: str
     food_id: str
     portions: float
 
+class FoodEntryUpdate(BaseModel):
+    meal_type: Optional[str] = None
+    portions: Optional[float] = Field(default=None, gt=0, le=5000)
+
+class FoodSuggestion(Food):
+    times_logged: int
+    last_portions: float  # grams, for one-tap logging
+    last_used: datetime
+
+class MealTemplateItem(BaseModel):
+    food_id: str
+    portions: float = Field(gt=0, le=5000)  # grams
+
+class MealTemplateCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=80)
+    meal_type: Optional[str] = None  # default meal when logging
+    items: List[MealTemplateItem] = Field(min_length=1, max_length=30)
+
+class MealTemplateFood(MealTemplateItem):
+    food_name: str
+    calories: int
+
+class MealTemplate(BaseModel):
+    template_id: str
+    user_id: str
+    name: str
+    meal_type: Optional[str] = None
+    items: List[MealTemplateFood]
+    total_calories: int
+    created_at: datetime
+    updated_at: datetime
+
+class MealTemplateLog(BaseModel):
+    meal_type: Optional[str] = None  # overrides the template's
+
 class Activity(BaseModel):
     activity_id: str
     name: str
@@ -177,6 +659,7 @@ class Activity(BaseModel):
     category: str
 
 class ActivityEntry(BaseModel):
+    entry_id: str
     user_id: str
     date: str
     activity_id: str
@@ -185,138 +668,801 @@ class ActivityEntry(BaseModel):
     intensity: str  # baixa, media, alta
     calories_burned: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
 
 class ActivityEntryCreate(BaseModel):
     activity_id: str
     duration: int
     intensity: str
 
+class ActivityEntryUpdate(BaseModel):
+    duration: Optional[int] = None
+    intensity: Optional[str] = None
 
-# ============ AUTH HELPERS ============
+class DeletedEntry(BaseModel):
+    collection: str  # food_entries, activity_entries, daily_records
+    entry_id: Optional[str] = None  # daily records are identified by their date
+    date: str
+    updated_at: datetime  # when it was deleted
 
-async def get_current_user(request: Request) -> Optional[User]:
-    """Get current user from session token in Authorization header or cookie"""
-    session_token = None
+class TodayActivities(BaseModel):
+    total_calories_burned: int
+    entries: List[ActivityEntry]
+
+class Bootstrap(BaseModel):
+    user: User
+    goals: Optional[UserGoals] = None
+    daily_record: Optional[DailyRecord] = None
+    calories_today: TodayCalories
+    activities_today: TodayActivities
+    daily_records: List[DailyRecord]
+    total_days_completed: int
+
+class SyncChanges(BaseModel):
+    watermark: datetime  # pass back as `since` on the next sync
+    profile: Optional[User] = None
+    goals: Optional[UserGoals] = None
+    daily_records: List[DailyRecord]
+    food_entries: List[FoodEntry]
+    activity_entries: List[ActivityEntry]
+    deleted_entries: List[DeletedEntry]  # drop these locally
+    daily_summaries: List[DailySummary] = []  # drop local entries of these dates, the summary replaces them
+
+class Job(BaseModel):
+    job_id: str
+    user_id: str
+    kind: str
+    status: str  # pending, running, completed, failed, superseded
+    total: int = 0
+    processed: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+# ============ RESPONSES ============
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (UTC datetimes as `Z`, like Pydantic)"""
     
-    # Try Authorization header first
-    auth_header = request.headers.get("Authorization")
-    if auth_header and auth_header.startswith("Bearer "):
-        session_token = auth_header.replace("Bearer ", "")
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+_type_adapters: Dict[Any, TypeAdapter] = {}
+
+def drop_none(value: Any) -> Any:
+    """Recursively drop null fields; clients read a missing field as null"""
+    if isinstance(value, dict):
+        return {key: drop_none(item) for key, item in value.items() if item is not None}
+    if isinstance(value, list):
+        return [drop_none(item) for item in value]
+    return value
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Transpose documents into one array per field, null where a row lacks it"""
+    fields = dict.fromkeys(key for row in rows for key in row)
+    return {
+        "count": len(rows),
+        "columns": {field: [row.get(field) for row in rows] for field in fields}
+    }
+
+def lean_response(content: Any, model: Any, exclude_none: bool = False) -> Response:
+    """Serialize trusted DB documents as-is, skipping Pydantic re-validation.
     
-    # Fallback to cookie
-    if not session_token:
-        session_token = request.cookies.get("session_token")
+    `model` mirrors the endpoint's response_model, which keeps the OpenAPI schema
+    accurate; it is only applied here when LEAN_RESPONSES is turned off.
+    """
+    if not get_settings().lean_responses:
+        adapter = _type_adapters.get(model)
+        if adapter is None:
+            adapter = _type_adapters[model] = TypeAdapter(model)
+        content = adapter.dump_python(adapter.validate_python(content), mode="json", exclude_none=exclude_none)
+    elif exclude_none:
+        content = drop_none(content)
     
-    if not session_token:
-        return None
+    return FastJSONResponse(content)
+
+class CompressionMiddleware:
+    """Compress responses of known length with brotli (when installed) or gzip
     
-    # Find session in database
-    session = await db.user_sessions.find_one(
-        {"session_token": session_token}, 
-        {"_id": 0}
-    )
+    Bodies are collected (http middlewares re-chunk them) and compressed once.
+    Responses without Content-Length (true streams) and bodies under
+    `minimum_size` (COMPRESSION_MINIMUM_SIZE by default) pass through untouched.
+    """
     
-    if not session:
-        return None
+    def __init__(self, app, minimum_size: Optional[int] = None, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
     
-    # Check if session is expired
-    expires_at = session["expires_at"]
-    if expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """The supported coding with the highest q-value (br on a tie); q=0 refuses one"""
+        weights: Dict[str, float] = {}
+        for part in accept_encoding.split(","):
+            coding, *params = [item.strip() for item in part.split(";")]
+            weight = 1.0
+            for param in params:
+                name, _, value = param.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        weight = float(value)
+                    except ValueError:
+                        weight = 0.0
+            if coding:
+                weights[coding.lower()] = weight
+        
+        def weight_of(coding: str) -> float:
+            return weights.get(coding, weights.get("*", 0.0))
+        
+        supported = ["br", "gzip"] if brotli is not None else ["gzip"]
+        best = max(supported, key=weight_of)
+        return best if weight_of(best) > 0 else None
     
-    if expires_at < datetime.now(timezone.utc):
-        return None
+    def compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
     
-    # Get user
-    user_doc = await db.users.find_one(
-        {"user_id": session["user_id"]}, 
-        {"_id": 0}
-    )
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        
+        minimum_size = self.minimum_size or get_settings().compression_minimum_size
+        start_message = None
+        chunks: List[bytes] = []
+        passthrough = False
+        
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            
+            if passthrough:
+                await send(message)
+                return
+            
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    "content-encoding" in headers
+                    or int(headers.get("content-length", 0)) < minimum_size
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = self.compress(encoding, b"".join(chunks))
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+        
+        await self.app(scope, receive, send_compressed)
+
+
+# ============ REQUEST COALESCING ============
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight execution and its result"""
     
-    if user_doc:
-        return User(**user_doc)
-    return None
+    def __init__(self):
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.calls: Dict[str, int] = {}
+        self.executions: Dict[str, int] = {}
+    
+    async def do(self, key: tuple, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Await fn(), or the identical call already running; key[0] names the endpoint"""
+        name = key[0]
+        self.calls[name] = self.calls.get(name, 0) + 1
+        
+        future = self.in_flight.get(key)
+        if future is None:
+            self.executions[name] = self.executions.get(name, 0) + 1
+            future = asyncio.ensure_future(fn())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        
+        # A disconnecting client must not cancel the work other requests wait on
+        return await asyncio.shield(future)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Calls, executions and coalescing ratio (share of calls that piggybacked) per endpoint"""
+        return {
+            name: {
+                "calls": calls,
+                "executions": self.executions.get(name, 0),
+                "coalescing_ratio": round(1 - self.executions.get(name, 0) / calls, 4),
+            }
+            for name, calls in self.calls.items()
+        }
 
-def require_auth(current_user: Optional[User] = Depends(get_current_user)) -> User:
-    """Dependency to require authentication"""
-    if not current_user:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    return current_user
+single_flight = SingleFlight()
 
+async def coalesced_response(
+    key: tuple,
+    load: Callable[[], Awaitable[Any]],
+    model: Any,
+    exclude_none: bool = False
+) -> Response:
+    """Load and serialize once for every identical concurrent request"""
+    async def render() -> bytes:
+        return lean_response(await load(), model, exclude_none).body
+    
+    body = await single_flight.do(key, render)
+    return Response(content=body, media_type="application/json")
 
-# ============ AUTH ENDPOINTS ============
 
-@api_router.post("/auth/process-session")
-async def process_session(request: Request, response: Response):
-    """Exchange session_id for user data and create session"""
-    data = await request.json()
-    session_id = data.get("session_id")
+# ============ RATE LIMITING & ADMISSION CONTROL ============
+
+# (method or None for any, path prefix, burst, tokens per second); first match wins
+RATE_LIMITS = [
+    ("POST", "/api/activation/validate", 5, 5 / 60),
+    ("POST", "/api/auth/process-session", 10, 10 / 60),
+    ("POST", "/api/admin/generate-codes", 5, 5 / 60),
+    (None, "/api/daily/record", 30, 2),
+    (None, "/api/daily/water", 30, 3),
+    (None, "/api/", 120, 20),
+]
+
+# Many users can share one IP (NAT, mobile carriers), so its bucket is larger
+IP_BUDGET_MULTIPLIER = 5
+
+class LocalBucketStore:
+    """Token buckets kept in this worker's memory"""
     
-    if not session_id:
-        raise HTTPException(status_code=400, detail="session_id is required")
+    MAX_KEYS = 100_000
     
-    # Exchange session_id for user data
-    async with httpx.AsyncClient() as client:
-        try:
-            api_response = await client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": session_id}
-            )
-            api_response.raise_for_status()
-            user_data = api_response.json()
-        except Exception as e:
-            logger.error(f"Failed to exchange session_id: {e}")
-            raise HTTPException(status_code=400, detail="Invalid session_id")
+    def __init__(self):
+        self.buckets: Dict[str, List[float]] = {}  # key -> [tokens, updated, capacity, rate]
     
-    # Create SessionDataResponse
-    session_data_response = SessionDataResponse(**user_data)
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        """Take one token; returns 0 when allowed, else seconds until one is available"""
+        now = time.monotonic()
+        
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.MAX_KEYS:
+                self._prune(now)
+            bucket = self.buckets[key] = [capacity, now, capacity, rate]
+        
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return 0.0
+        
+        bucket[0] = tokens
+        return (1 - tokens) / rate
     
-    # Lista de emails SUPER ADMIN (não precisam de código de ativação)
-    SUPER_ADMIN_EMAILS = [
-        "dgf281219@gmail.com",
-        "isabela@ansanello.com",
-    ]
+    def _prune(self, now: float):
+        """Forget buckets that have refilled completely"""
+        self.buckets = {
+            key: bucket for key, bucket in self.buckets.items()
+            if bucket[0] + (now - bucket[1]) * bucket[3] < bucket[2]
+        }
+
+class RedisBucketStore:
+    """Token buckets in Redis, shared by every worker and node"""
     
-    # Check if user exists
-    user_id = f"user_{uuid.uuid4().hex[:12]}"
-    existing_user = await db.users.find_one(
-        {"email": session_data_response.email},
-        {"_id": 0}
-    )
+    TAKE_SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
     
-    if not existing_user:
-        # Create new user
-        is_super_admin = session_data_response.email in SUPER_ADMIN_EMAILS
-        new_user = {
-            "user_id": user_id,
-            "email": session_data_response.email,
-            "name": session_data_response.name,
-            "picture": session_data_response.picture,
-            "is_active": is_super_admin,  # Super admins são ativados automaticamente
-            "activation_code": "SUPER_ADMIN" if is_super_admin else None,
-            "created_at": datetime.now(timezone.utc)
-        }
-        await db.users.insert_one(new_user)
-    else:
-        user_id = existing_user["user_id"]
-        
-        # Se for super admin e ainda não está ativo, ativar automaticamente
-        if session_data_response.email in SUPER_ADMIN_EMAILS and not existing_user.get("is_active", False):
-            await db.users.update_one(
-                {"user_id": user_id},
-                {"$set": {"is_active": True, "activation_code": "SUPER_ADMIN", "updated_at": datetime.now(timezone.utc)}}
-            )
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the `redis` package")
+        self.redis = redis_asyncio.from_url(url)
+        self.script = self.redis.register_script(self.TAKE_SCRIPT)
     
-    # Create session
-    session_token = session_data_response.session_token
-    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        """Take one token; returns 0 when allowed, else seconds until one is available"""
+        wait = await self.script(keys=[f"ratelimit:{key}"], args=[capacity, rate, time.time()])
+        return float(wait)
+
+class AdmissionControl:
+    """Per-route token buckets (by session and by IP) plus a global in-flight cap"""
     
-    await db.user_sessions.insert_one({
-        "user_id": user_id,
-        "session_token": session_token,
-        "expires_at": expires_at,
-        "created_at": datetime.now(timezone.utc)
-    })
+    def __init__(self, store, max_concurrent: int, trusted_proxies: Optional[str] = None):
+        self.store = store
+        self.max_concurrent = max_concurrent
+        self.trusted_proxies = [
+            ipaddress.ip_network(proxy.strip(), strict=False)
+            for proxy in (trusted_proxies or "").split(",")
+            if proxy.strip()
+        ]
+        self.in_flight = 0
+        self.counters = {"allowed": 0, "rate_limited": 0, "shed": 0}
+    
+    @staticmethod
+    def budget_for(method: str, path: str):
+        for budget in RATE_LIMITS:
+            budget_method, prefix = budget[0], budget[1]
+            if (budget_method is None or budget_method == method) and path.startswith(prefix):
+                return budget
+        return None
+    
+    def is_trusted_proxy(self, host: str) -> bool:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+    
+    def client_ip(self, request: Request) -> str:
+        """Address the IP buckets key on
+        
+        X-Forwarded-For is client-controlled: it is only read when the request
+        comes from a trusted proxy, and then the right-most hop that is not one
+        of our proxies is the client (anything left of it may be forged).
+        """
+        peer = request.client.host if request.client else "unknown"
+        if not self.is_trusted_proxy(peer):
+            return peer
+        
+        hops = [
+            hop.strip()
+            for header in request.headers.getlist("X-Forwarded-For")
+            for hop in header.split(",")
+            if hop.strip()
+        ]
+        for hop in reversed(hops):
+            if not self.is_trusted_proxy(hop):
+                return hop
+        return hops[0] if hops else peer
+    
+    async def retry_after(self, request: Request) -> float:
+        """Seconds the client must wait, 0 when the request is within budget"""
+        budget = self.budget_for(request.method, request.url.path)
+        if budget is None:
+            return 0.0
+        
+        _, prefix, burst, rate = budget
+        waits = [
+            await self.store.take(f"ip:{self.client_ip(request)}:{prefix}", burst * IP_BUDGET_MULTIPLIER, rate * IP_BUDGET_MULTIPLIER)
+        ]
+        
+        session_token = session_token_from(request)
+        if session_token:
+            session_key = hashlib.sha256(session_token.encode()).hexdigest()[:16]
+            waits.append(await self.store.take(f"session:{session_key}:{prefix}", burst, rate))
+        
+        return max(waits)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {**self.counters, "in_flight": self.in_flight, "max_concurrent": self.max_concurrent}
+
+_admission_control: Optional[AdmissionControl] = None
+
+def get_admission_control() -> AdmissionControl:
+    """Admission control for this worker, built from settings on first use"""
+    global _admission_control
+    if _admission_control is None:
+        settings = get_settings()
+        if settings.rate_limit_backend == "redis":
+            store = RedisBucketStore(settings.redis_url)
+        else:
+            store = LocalBucketStore()
+        _admission_control = AdmissionControl(
+            store,
+            settings.max_concurrent_requests or settings.mongo_max_pool_size,
+            settings.trusted_proxies
+        )
+    return _admission_control
+
+async def admission_control_middleware(request: Request, call_next):
+    """Shed load with 503 past the in-flight cap and answer 429 over a route's budget"""
+    if not request.url.path.startswith("/api/") or not get_settings().rate_limit_enabled:
+        return await call_next(request)
+    
+    control = get_admission_control()
+    
+    if control.in_flight >= control.max_concurrent:
+        control.counters["shed"] += 1
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Servidor ocupado, tente novamente em instantes"},
+            headers={"Retry-After": "1"}
+        )
+    
+    try:
+        wait = await control.retry_after(request)
+    except Exception:
+        # A limiter outage must not take the API down with it
+        logger.exception("Rate limiter unavailable, letting request through")
+        wait = 0.0
+    
+    if wait > 0:
+        control.counters["rate_limited"] += 1
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Muitas requisições, tente novamente em instantes"},
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+    
+    control.counters["allowed"] += 1
+    control.in_flight += 1
+    try:
+        return await call_next(request)
+    finally:
+        control.in_flight -= 1
+
+
+# ============ MONGODB TIMEOUT BUDGET ============
+
+async def deadline_middleware(request: Request, call_next):
+    """Give every MongoDB call of a request the time left in its budget
+
+    pymongo.timeout() derives maxTimeMS (and socket/server selection
+    timeouts) from the remaining budget; Motor carries it to its executor
+    threads through contextvars.
+    """
+    if not request.url.path.startswith("/api/"):
+        return await call_next(request)
+    
+    with pymongo.timeout(get_settings().request_timeout_ms / 1000):
+        return await call_next(request)
+
+async def mongo_error_handler(request: Request, exc: Exception):
+    """Fail fast with 503 when MongoDB is slow or unreachable (or its breaker is open)"""
+    if isinstance(exc, CircuitOpenError) or exc.timeout or isinstance(exc, ConnectionFailure):
+        logger.warning("MongoDB unavailable for %s %s: %s", request.method, request.url.path, exc)
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Banco de dados indisponível, tente novamente em instantes"},
+            headers={"Retry-After": "1"}
+        )
+    
+    logger.exception("MongoDB error on %s %s", request.method, request.url.path, exc_info=exc)
+    return JSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+
+
+# ============ SHARED CACHES ============
+
+class ExpiringCache:
+    """Bounded dict whose entries expire; only used while invalidations flow
+    
+    Readers take `generation` before querying and hand it to set(): a value
+    loaded while its key or one of its tags was invalidated is dropped instead
+    of cached; invalidations of other keys do not affect it. Entries can be
+    tagged (user id, document _ids) so that an invalidation evicts just the
+    entries it concerns without scanning the cache.
+    """
+    
+    def __init__(self, name: str, max_size: int = 10_000):
+        self.name = name
+        self.max_size = max_size
+        self.entries: Dict[Hashable, tuple] = {}  # key -> (expires, value, tags)
+        self.tagged: Dict[Hashable, set] = {}  # tag -> keys of the entries carrying it
+        self.generation = 0  # bumped by every invalidation
+        self.invalidated: Dict[Hashable, int] = {}  # key or tag -> generation of its last invalidation
+        self.floor = 0  # loads that started before this generation are stale (clear, forgotten invalidations)
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable) -> Any:
+        if not change_streams.active:
+            return None
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+    
+    def set(self, key: Hashable, value: Any, generation: int, tags: tuple = ()):
+        if not change_streams.active or self.is_stale(generation, key, tags):
+            return
+        self._remove(key)
+        if len(self.entries) >= self.max_size:
+            self._remove(next(iter(self.entries)))
+        self.entries[key] = (time.monotonic() + get_settings().shared_cache_ttl, value, tags)
+        for tag in tags:
+            self.tagged.setdefault(tag, set()).add(key)
+    
+    def _remove(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+    
+    def is_stale(self, generation: int, key: Hashable, tags: tuple = ()) -> bool:
+        if generation < self.floor:
+            return True
+        return any(self.invalidated.get(name, -1) > generation for name in (key, *tags))
+    
+    def _invalidate(self, name: Hashable):
+        self.generation += 1
+        # Re-inserted so the dict stays ordered by generation, oldest first
+        self.invalidated.pop(name, None)
+        self.invalidated[name] = self.generation
+        if len(self.invalidated) > self.max_size:
+            # Forgetting one makes every load older than it stale instead
+            self.floor = self.invalidated.pop(next(iter(self.invalidated)))
+    
+    def pop(self, key: Hashable):
+        self._invalidate(key)
+        self._remove(key)
+    
+    def discard_tagged(self, tag: Hashable):
+        self._invalidate(tag)
+        for key in list(self.tagged.get(tag, ())):
+            self._remove(key)
+    
+    def clear(self):
+        self.generation += 1
+        self.floor = self.generation
+        self.invalidated.clear()
+        self.entries.clear()
+        self.tagged.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+class ChangeStreamInvalidator:
+    """Watch the database and drop cache entries that any worker's write made stale
+    
+    Caches are only consulted while the stream is open (`active`); on a
+    standalone mongod (no change streams) or while reconnecting every read
+    goes to MongoDB, so a missed event can never serve stale data.
+    """
+    
+    COLLECTIONS = ["users", "user_sessions", "user_goals", "daily_records", "foods", "activities"]
+    RETRY_DELAY = 5
+    
+    def __init__(self):
+        self.active = False
+        self.handlers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self.caches: List[ExpiringCache] = []
+        self.events = 0
+    
+    def on(self, collection: str, handler: Callable[[Dict[str, Any]], None]):
+        self.handlers.setdefault(collection, []).append(handler)
+    
+    def set_active(self, active: bool):
+        # Whatever was cached may have changed while no events were flowing
+        for cache in self.caches:
+            cache.clear()
+        self.active = active
+    
+    async def watch(self):
+        pipeline = [{"$match": {"ns.coll": {"$in": self.COLLECTIONS}}}]
+        while True:
+            try:
+                async with db.watch(pipeline, full_document="updateLookup") as stream:
+                    self.set_active(True)
+                    logger.info("Change stream open, shared caches enabled")
+                    async for change in stream:
+                        self.events += 1
+                        for handler in self.handlers.get(change["ns"]["coll"], []):
+                            handler(change)
+            except asyncio.CancelledError:
+                self.set_active(False)
+                raise
+            except OperationFailure as exc:
+                self.set_active(False)
+                if exc.code in (40573, 40324):  # not a replica set / $changeStream unsupported
+                    logger.info("Change streams unavailable (%s), shared caches disabled", exc)
+                    return
+                logger.exception("Change stream failed, retrying in %ss", self.RETRY_DELAY)
+            except Exception:
+                self.set_active(False)
+                logger.exception("Change stream failed, retrying in %ss", self.RETRY_DELAY)
+            await asyncio.sleep(self.RETRY_DELAY)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "events": self.events,
+            "caches": {cache.name: cache.stats() for cache in self.caches}
+        }
+
+change_streams = ChangeStreamInvalidator()
+
+# session token -> {"expires_at", "user"}, tagged with the session and user
+# documents' _ids and the user_id
+session_cache = ExpiringCache("sessions")
+# user_id -> (daily records, goals) of /method/progress, tagged with the records' _ids
+progress_cache = ExpiringCache("progress")
+change_streams.caches += [session_cache, progress_cache]
+
+def changed_user_id(change: Dict[str, Any]) -> Optional[str]:
+    return (change.get("fullDocument") or {}).get("user_id")
+
+def invalidate_progress(change: Dict[str, Any]):
+    user_id = changed_user_id(change)
+    if user_id:
+        progress_cache.pop(user_id)
+    else:
+        # A delete only carries the _id: only a cached user can hold it
+        progress_cache.discard_tagged(change["documentKey"]["_id"])
+
+def invalidate_sessions(change: Dict[str, Any]):
+    session_cache.discard_tagged(change["documentKey"]["_id"])
+
+change_streams.on("users", invalidate_sessions)
+change_streams.on("user_sessions", invalidate_sessions)
+change_streams.on("daily_records", invalidate_progress)
+change_streams.on("user_goals", invalidate_progress)
+change_streams.on("foods", lambda change: catalog_cache.schedule_reload())
+change_streams.on("activities", lambda change: catalog_cache.schedule_reload())
+
+def forget_user_reads(user_id: str):
+    """Drop this worker's cached reads of a user right after writing them
+    
+    The change stream reaches every worker (this one included) a moment later;
+    this keeps read-your-writes exact for the client that made the change.
+    """
+    progress_cache.pop(user_id)
+    session_cache.discard_tagged(user_id)
+
+
+# ============ AUTH HELPERS ============
+
+def session_token_from(request: Request) -> Optional[str]:
+    """Session token from the Authorization header, falling back to the cookie"""
+    auth_header = request.headers.get("Authorization")
+    if auth_header and auth_header.startswith("Bearer "):
+        return auth_header.replace("Bearer ", "")
+    return request.cookies.get("session_token")
+
+async def get_current_user(request: Request) -> Optional[User]:
+    """Get current user from session token in Authorization header or cookie"""
+    session_token = session_token_from(request)
+    
+    if not session_token:
+        return None
+    
+    cached = session_cache.get(session_token)
+    if cached is not None:
+        if cached["expires_at"] < datetime.now(timezone.utc):
+            return None
+        return User(**cached["user"])
+    
+    generation = session_cache.generation
+    
+    # Find session in database
+    session = await db.user_sessions.find_one(
+        {"session_token": session_token}
+    )
+    
+    if not session:
+        return None
+    
+    # Check if session is expired
+    expires_at = session["expires_at"]
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    
+    if expires_at < datetime.now(timezone.utc):
+        return None
+    
+    # Get user
+    user_doc = await db.users.find_one(
+        {"user_id": session["user_id"]}
+    )
+    
+    if user_doc:
+        user_oid = user_doc.pop("_id")
+        session_cache.set(session_token, {
+            "expires_at": expires_at,
+            "user": user_doc
+        }, generation, tags=(session["_id"], user_oid, user_doc["user_id"]))
+        return User(**user_doc)
+    return None
+
+def require_auth(current_user: Optional[User] = Depends(get_current_user)) -> User:
+    """Dependency to require authentication"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return current_user
+
+
+# ============ AUTH ENDPOINTS ============
+
+@api_router.post("/auth/process-session")
+async def process_session(request: Request, response: Response):
+    """Exchange session_id for user data and create session"""
+    data = await request.json()
+    session_id = data.get("session_id")
+    
+    if not session_id:
+        raise HTTPException(status_code=400, detail="session_id is required")
+    
+    # Exchange session_id for user data
+    async with httpx.AsyncClient() as client:
+        try:
+            api_response = await client.get(
+                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
+                headers={"X-Session-ID": session_id}
+            )
+            api_response.raise_for_status()
+            user_data = api_response.json()
+        except Exception as e:
+            logger.error("Failed to exchange session_id: %s", e)
+            raise HTTPException(status_code=400, detail="Invalid session_id")
+    
+    # Create SessionDataResponse
+    session_data_response = SessionDataResponse(**user_data)
+    
+    # Lista de emails SUPER ADMIN (não precisam de código de ativação)
+    SUPER_ADMIN_EMAILS = [
+        "dgf281219@gmail.com",
+        "isabela@ansanello.com",
+    ]
+    
+    # Check if user exists
+    user_id = f"user_{uuid.uuid4().hex[:12]}"
+    existing_user = await db.users.find_one(
+        {"email": session_data_response.email},
+        {"_id": 0}
+    )
+    
+    if not existing_user:
+        # Create new user
+        is_super_admin = session_data_response.email in SUPER_ADMIN_EMAILS
+        new_user = {
+            "user_id": user_id,
+            "email": session_data_response.email,
+            "name": session_data_response.name,
+            "picture": session_data_response.picture,
+            "is_active": is_super_admin,  # Super admins são ativados automaticamente
+            "activation_code": "SUPER_ADMIN" if is_super_admin else None,
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc)
+        }
+        await db.users.insert_one(new_user)
+    else:
+        user_id = existing_user["user_id"]
+        
+        # Se for super admin e ainda não está ativo, ativar automaticamente
+        if session_data_response.email in SUPER_ADMIN_EMAILS and not existing_user.get("is_active", False):
+            await db.users.update_one(
+                {"user_id": user_id},
+                {"$set": {"is_active": True, "activation_code": "SUPER_ADMIN", "updated_at": datetime.now(timezone.utc)}}
+            )
+    
+    # Create session
+    session_token = session_data_response.session_token
+    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+    
+    await db.user_sessions.insert_one({
+        "user_id": user_id,
+        "session_token": session_token,
+        "expires_at": expires_at,
+        "created_at": datetime.now(timezone.utc)
+    })
     
     # Set cookie
     response.set_cookie(
@@ -349,6 +1495,7 @@ async def logout(request: Request, response: Response, current_user: User = Depe
     
     if session_token:
         await db.user_sessions.delete_one({"session_token": session_token})
+        session_cache.pop(session_token)
     
     response.delete_cookie("session_token", path="/")
     
@@ -463,13 +1610,14 @@ async def validate_activation_code(
             }
         }
     )
+    forget_user_reads(current_user.user_id)
     
     return {
         "message": "Código ativado com sucesso!",
         "is_active": True
     }
 
-@api_router.get("/admin/codes")
+@api_router.get("/admin/codes", response_model=ActivationCodeList, response_model_exclude_none=True)
 async def list_activation_codes(current_user: User = Depends(require_auth)):
     """Listar todos os códigos de ativação (ADMIN ONLY)"""
     ADMIN_EMAILS = [
@@ -482,10 +1630,10 @@ async def list_activation_codes(current_user: User = Depends(require_auth)):
     
     codes = await db.activation_codes.find({}, {"_id": 0}).to_list(1000)
     
-    return {
+    return lean_response({
         "total": len(codes),
         "codes": codes
-    }
+    }, ActivationCodeList, exclude_none=True)
 
 
 # ============ USER ENDPOINTS ============
@@ -507,6 +1655,7 @@ class UserProfileUpdate(BaseModel):
 @api_router.put("/user/profile")
 async def update_user_profile(
     profile: UserProfileUpdate,
+    response: Response,
     current_user: User = Depends(require_auth)
 ):
     """Update user profile"""
@@ -517,53 +1666,88 @@ async def update_user_profile(
         {"user_id": current_user.user_id},
         {"$set": update_data}
     )
+    forget_user_reads(current_user.user_id)
     
     updated_user = await db.users.find_one(
         {"user_id": current_user.user_id},
         {"_id": 0}
     )
     
+    # Past activity calories depend on the weight; recompute them without blocking
+    if profile.weight is not None and profile.weight != current_user.weight:
+        job = await start_calories_burned_recalculation(current_user.user_id, profile.weight)
+        response.headers["X-Job-Id"] = job["job_id"]
+    
     return User(**updated_user)
 
+@api_router.get("/user/recalculation", response_model=Optional[Job])
+async def get_recalculation_status(current_user: User = Depends(require_auth)):
+    """Progress of the latest calories_burned recalculation for the current user"""
+    job = await db.jobs.find_one(
+        {"user_id": current_user.user_id, "kind": "recalculate_calories_burned"},
+        {"_id": 0},
+        sort=[("created_at", DESCENDING)]
+    )
+    
+    return lean_response(job, Optional[Job])
+
 @api_router.post("/user/goals")
 async def create_user_goals(
     goals: UserGoalsCreate,
     current_user: User = Depends(require_auth)
 ):
-    """Create or update user goals for 21-day challenge"""
-    existing_goals = await db.user_goals.find_one(
-        {"user_id": current_user.user_id},
-        {"_id": 0}
+    """Set the goals of the active 21-day cycle, starting a new cycle once the last one is completed"""
+    cycle = {"user_id": current_user.user_id, "cycle_id": current_user.active_cycle_id}
+    existing_goals, reflection = await asyncio.gather(
+        db.user_goals.find_one(cycle, {"_id": 1}),
+        db.final_reflections.find_one(cycle, {"_id": 1})
     )
     
+    now = datetime.now(timezone.utc)
     goals_data = {
         "user_id": current_user.user_id,
+        "cycle_id": current_user.active_cycle_id,
         **goals.model_dump(),
-        "created_at": datetime.now(timezone.utc)
+        "created_at": now,
+        "updated_at": now
     }
     
-    if existing_goals:
-        await db.user_goals.update_one(
-            {"user_id": current_user.user_id},
-            {"$set": goals_data}
-        )
+    if existing_goals and not reflection:
+        await db.user_goals.update_one(cycle, {"$set": goals_data})
     else:
+        # No cycle yet, or the active one has its final reflection: start the next
+        goals_data["cycle_id"] = f"cycle_{uuid.uuid4().hex[:12]}"
         await db.user_goals.insert_one(goals_data)
+        goals_data.pop("_id")
+        await asyncio.gather(
+            db.users.update_one(
+                {"user_id": current_user.user_id},
+                {"$set": {"active_cycle_id": goals_data["cycle_id"], "updated_at": now}}
+            ),
+            # Days logged before these goals (or after an archive) join the new cycle
+            adopt_unassigned_records(current_user.user_id, goals_data["cycle_id"], now)
+        )
+    forget_user_reads(current_user.user_id)
     
     return UserGoals(**goals_data)
 
-@api_router.get("/user/goals")
-async def get_user_goals(current_user: User = Depends(require_auth)):
-    """Get user goals"""
-    goals = await db.user_goals.find_one(
-        {"user_id": current_user.user_id},
-        {"_id": 0}
+async def adopt_unassigned_records(user_id: str, cycle_id: str, now: datetime):
+    """Move the user's daily records that belong to no cycle into `cycle_id`"""
+    await db.daily_records.update_many(
+        {"user_id": user_id, "cycle_id": None},
+        {"$set": {"cycle_id": cycle_id, "updated_at": now}}
     )
+
+async def load_user_goals(user_id: str, cycle_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Goals document of one of the user's cycles, if any"""
+    return await db.user_goals.find_one({"user_id": user_id, "cycle_id": cycle_id}, {"_id": 0})
+
+@api_router.get("/user/goals", response_model=Optional[UserGoals])
+async def get_user_goals(current_user: User = Depends(require_auth)):
+    """Get the goals of the active cycle"""
+    goals = await load_user_goals(current_user.user_id, current_user.active_cycle_id)
     
-    if not goals:
-        return None
-    
-    return UserGoals(**goals)
+    return lean_response(goals, Optional[UserGoals])
 
 
 # ============ DAILY RECORD ENDPOINTS ============
@@ -587,6 +1771,8 @@ async def create_or_update_daily_record(
         "day_number": record.day_number,
         "updated_at": now
     }
+    if not existing_record:
+        record_data["cycle_id"] = await open_cycle_id(current_user.user_id, current_user.active_cycle_id)
     
     if record.checklist_alimentar:
         record_data["checklist_alimentar"] = record.checklist_alimentar.model_dump()
@@ -607,6 +1793,7 @@ async def create_or_update_daily_record(
             {"user_id": current_user.user_id, "date": record.date},
             {"$set": record_data}
         )
+        forget_user_reads(current_user.user_id)
         updated_record = await db.daily_records.find_one(
             {"user_id": current_user.user_id, "date": record.date},
             {"_id": 0}
@@ -623,208 +1810,1055 @@ async def create_or_update_daily_record(
         record_data["water_intake"] = 0
         
         await db.daily_records.insert_one(record_data)
+        forget_user_reads(current_user.user_id)
         return DailyRecord(**record_data)
 
-@api_router.get("/daily/record/{date}")
+async def load_daily_record(user_id: str, date: str) -> Optional[Dict[str, Any]]:
+    """Daily record of a user for one date, if any, with water taps not yet written behind"""
+    record = await db.daily_records.find_one({"user_id": user_id, "date": date}, {"_id": 0})
+    return await water_buffer.overlay(user_id, date, record)
+
+@api_router.get("/daily/record/{date}", response_model=Optional[DailyRecord])
 async def get_daily_record(date: str, current_user: User = Depends(require_auth)):
     """Get daily record for specific date"""
-    record = await db.daily_records.find_one(
-        {"user_id": current_user.user_id, "date": date},
-        {"_id": 0}
-    )
-    
-    if not record:
-        return None
+    record = await load_daily_record(current_user.user_id, date)
+    if record is None:
+        # Days of archived cycles are read through their archive
+        archived = await load_archived_records(current_user.user_id, date)
+        record = next((record for record in archived if record["date"] == date), None)
     
-    return DailyRecord(**record)
+    return lean_response(record, Optional[DailyRecord])
 
-@api_router.get("/daily/records")
-async def get_all_daily_records(current_user: User = Depends(require_auth)):
-    """Get all daily records for current user"""
-    records = await db.daily_records.find(
-        {"user_id": current_user.user_id},
-        {"_id": 0}
-    ).sort("date", 1).to_list(100)
+@api_router.get(
+    "/daily/records",
+    response_model=List[DailyRecord] | Columns,
+    response_model_exclude_none=True
+)
+async def get_all_daily_records(
+    format: Literal["rows", "columnar"] = "rows",
+    cycle_id: Optional[str] = None,
+    current_user: User = Depends(require_auth)
+):
+    """Daily records of the active cycle, or of `cycle_id` (?format=columnar for one array per field)"""
+    records = await load_cycle_records(current_user.user_id, cycle_id or current_user.active_cycle_id, "date")
     
-    return [DailyRecord(**record) for record in records]
+    if format == "columnar":
+        return lean_response(to_columns(records), Columns)
+    
+    return lean_response(records, List[DailyRecord], exclude_none=True)
 
 
 # ============ METHOD 21 DAYS ENDPOINTS ============
 
-@api_router.get("/method/progress")
-async def get_method_progress(current_user: User = Depends(require_auth)):
-    """Get progress for 21-day challenge"""
-    records = await db.daily_records.find(
-        {"user_id": current_user.user_id},
-        {"_id": 0}
-    ).sort("day_number", 1).to_list(100)
-    
-    goals = await db.user_goals.find_one(
-        {"user_id": current_user.user_id},
-        {"_id": 0}
+async def load_cycle_records(
+    user_id: str,
+    cycle_id: Optional[str],
+    order: str = "day_number",
+    with_ids: bool = False
+) -> List[Dict[str, Any]]:
+    """Daily records of one cycle, from daily_records and (once archived) its archive"""
+    cycle = {"user_id": user_id, "cycle_id": cycle_id}
+    archive, records = await asyncio.gather(
+        db.cycle_archives.find_one(cycle, {"records": 1}),
+        db.daily_records.find(cycle, None if with_ids else {"_id": 0}).sort(order, 1).to_list(100)
     )
+    if archive:
+        records = sorted(unpack_records(archive["records"]) + records, key=lambda record: record[order])
+    return records
+
+@api_router.get(
+    "/method/progress",
+    response_model=MethodProgress | ColumnarMethodProgress,
+    response_model_exclude_none=True
+)
+async def get_method_progress(
+    format: Literal["rows", "columnar"] = "rows",
+    current_user: User = Depends(require_auth)
+):
+    """Progress of the active 21-day cycle (?format=columnar for records as arrays per field)"""
+    async def load():
+        cached = progress_cache.get(current_user.user_id)
+        if cached is None:
+            generation = progress_cache.generation
+            records, goals = await asyncio.gather(
+                load_cycle_records(current_user.user_id, current_user.active_cycle_id, with_ids=True),
+                load_user_goals(current_user.user_id, current_user.active_cycle_id)
+            )
+            # Deletes of these records reach the change stream with their _id alone
+            record_ids = tuple(record.pop("_id") for record in records if "_id" in record)
+            cached = (records, goals)
+            progress_cache.set(current_user.user_id, cached, generation, tags=record_ids)
+        
+        records, goals = cached
+        return {
+            "goals": goals,
+            "daily_records": to_columns(records) if format == "columnar" else records,
+            "total_days_completed": len(records)
+        }
     
-    return {
-        "goals": UserGoals(**goals) if goals else None,
-        "daily_records": [DailyRecord(**record) for record in records],
-        "total_days_completed": len(records)
-    }
+    if format == "columnar":
+        return await coalesced_response(
+            ("method_progress", current_user.user_id, format), load, ColumnarMethodProgress
+        )
+    
+    return await coalesced_response(
+        ("method_progress", current_user.user_id, format), load, MethodProgress, exclude_none=True
+    )
 
 @api_router.post("/method/final-reflection")
 async def create_final_reflection(
     reflection: FinalReflectionCreate,
     current_user: User = Depends(require_auth)
 ):
-    """Create final reflection after 21 days"""
+    """Create final reflection after 21 days, completing the active cycle"""
+    cycle = {"user_id": current_user.user_id, "cycle_id": current_user.active_cycle_id}
     reflection_data = {
-        "user_id": current_user.user_id,
+        **cycle,
         "mudancas": reflection.mudancas,
         "nova_intencao": reflection.nova_intencao,
         "data_conclusao": datetime.now(timezone.utc),
-        "created_at": datetime.now(timezone.utc)
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc)
     }
     
-    existing = await db.final_reflections.find_one(
-        {"user_id": current_user.user_id},
-        {"_id": 0}
-    )
+    existing = await db.final_reflections.find_one(cycle, {"_id": 0})
     
     if existing:
-        await db.final_reflections.update_one(
-            {"user_id": current_user.user_id},
-            {"$set": reflection_data}
-        )
+        await db.final_reflections.update_one(cycle, {"$set": reflection_data})
     else:
         await db.final_reflections.insert_one(reflection_data)
+        reflection_data.pop("_id")
     
     return FinalReflection(**reflection_data)
 
-@api_router.get("/method/final-reflection")
+@api_router.get("/method/final-reflection", response_model=Optional[FinalReflection])
 async def get_final_reflection(current_user: User = Depends(require_auth)):
-    """Get final reflection"""
+    """Get the final reflection of the active cycle"""
     reflection = await db.final_reflections.find_one(
-        {"user_id": current_user.user_id},
+        {"user_id": current_user.user_id, "cycle_id": current_user.active_cycle_id},
         {"_id": 0}
     )
     
-    if not reflection:
-        return None
-    
-    return FinalReflection(**reflection)
+    return lean_response(reflection, Optional[FinalReflection])
 
 
-# ============ CALORIES/FOOD ENDPOINTS ============
+# ============ CYCLE ARCHIVE ============
 
-@api_router.get("/calories/foods")
-async def get_foods(category: Optional[str] = None, search: Optional[str] = None):
-    """Get all foods, optionally filtered by category or search"""
-    query = {}
-    
-    if category:
-        query["category"] = category
-    
-    if search:
-        query["name"] = {"$regex": search, "$options": "i"}
+# A completed cycle's daily records move out of daily_records into one
+# compressed document, next to a summary; reads of its days go through it.
+CYCLE_ARCHIVE_LOCK_TTL = timedelta(hours=1)
+
+def unpack_records(packed: bytes) -> List[Dict[str, Any]]:
+    return orjson.loads(zlib.decompress(packed))
+
+def cycle_summary(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals of a cycle's daily records and how often each habit was kept"""
+    days = len(records)
+    kept: Dict[str, int] = {}
+    for record in records:
+        for group in ("checklist_alimentar", "praticas_diarias"):
+            for habit, done in (record.get(group) or {}).items():
+                kept[habit] = kept.get(habit, 0) + bool(done)
     
-    foods = await db.foods.find(query, {"_id": 0}).to_list(1000)
-    return [Food(**food) for food in foods]
+    return {
+        "days_completed": days,
+        "first_date": records[0]["date"] if records else None,
+        "last_date": records[-1]["date"] if records else None,
+        "calories_consumed": sum(record.get("calories_consumed", 0) for record in records),
+        "calories_burned": sum(record.get("calories_burned", 0) for record in records),
+        "water_intake": sum(record.get("water_intake", 0) for record in records),
+        "habits": {habit: round(count / days, 3) for habit, count in kept.items()}
+    }
 
-@api_router.post("/calories/add-meal")
+async def load_archived_records(user_id: str, date: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Daily records kept in the user's cycle archives (only the archive covering `date` if given)"""
+    query = {"user_id": user_id}
+    if date is not None:
+        query.update(first_date={"$lte": date}, last_date={"$gte": date})
+    archives = await db.cycle_archives.find(query, {"records": 1}).sort("completed_at", 1).to_list(None)
+    return [record for archive in archives for record in unpack_records(archive["records"])]
+
+async def open_cycle_id(user_id: str, cycle_id: Optional[str]) -> Optional[str]:
+    """The cycle a new daily record joins: none once the cycle was archived
+    
+    Archiving clears the user's active cycle, but a request or buffered water
+    tap may still carry it; such records wait outside any cycle for the next one.
+    """
+    if cycle_id is None or not await db.cycle_archives.find_one({"cycle_id": cycle_id}, {"_id": 1}):
+        return cycle_id
+    return None
+
+async def archive_cycle(user_id: str, cycle_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Move the daily records of a completed cycle into a compressed archive
+    
+    Run again on an archived cycle, records that reached it since are merged
+    into the archive (by date) instead of being lost.
+    """
+    cycle = {"user_id": user_id, "cycle_id": cycle_id}
+    reflection, goals, records = await asyncio.gather(
+        db.final_reflections.find_one(cycle, {"_id": 0}),
+        load_user_goals(user_id, cycle_id),
+        db.daily_records.find(cycle).sort("date", 1).to_list(None)
+    )
+    if not reflection or cycle_id is None:
+        return None
+    if reflection.pop("archived_at", None) and not records:
+        return None
+    
+    record_ids = [record.pop("_id") for record in records]
+    now = datetime.now(timezone.utc)
+    
+    async def apply(session):
+        archive = await db.cycle_archives.find_one({"cycle_id": cycle_id}, {"records": 1}, session=session)
+        cycle_records = records
+        if archive:
+            by_date = {record["date"]: record for record in unpack_records(archive["records"])}
+            by_date.update((record["date"], record) for record in records)
+            cycle_records = [by_date[date] for date in sorted(by_date)]
+        
+        raw = orjson.dumps(cycle_records, option=orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z)
+        packed = zlib.compress(raw, 6)
+        summary = {
+            "cycle_id": cycle_id,
+            "user_id": user_id,
+            "started_at": goals["created_at"] if goals else None,
+            "completed_at": reflection["data_conclusao"],
+            **cycle_summary(cycle_records)
+        }
+        await db.cycle_archives.update_one(
+            {"cycle_id": cycle_id},
+            {
+                "$set": {
+                    **summary,
+                    "goals": goals,
+                    "reflection": reflection,
+                    "records": packed,
+                    "raw_bytes": len(raw),
+                    "compressed_bytes": len(packed)
+                },
+                "$setOnInsert": {"created_at": now}
+            },
+            upsert=True,
+            session=session
+        )
+        if record_ids:
+            await db.daily_records.delete_many({"_id": {"$in": record_ids}}, session=session)
+            # Synced clients drop their copies; the archive is read through /cycles
+            await db.deleted_entries.insert_many([
+                {"user_id": user_id, "collection": "daily_records", "date": record["date"], "updated_at": now}
+                for record in records
+            ], session=session)
+        await db.final_reflections.update_one(
+            cycle, {"$set": {"archived_at": now, "updated_at": now}}, session=session
+        )
+        # Writes must not land in the archived cycle: the next goals start a new one
+        await db.users.update_one(
+            {"user_id": user_id, "active_cycle_id": cycle_id},
+            {"$set": {"active_cycle_id": None, "updated_at": now}},
+            session=session
+        )
+        return {**summary, "created_at": now}, len(packed)
+    
+    summary, compressed_bytes = await in_transaction(apply)
+    forget_user_reads(user_id)
+    logger.info("Archived cycle %s of %s: %d daily records, %d bytes", cycle_id, user_id, len(records), compressed_bytes)
+    return summary
+
+async def archive_completed_cycles(after_days: int) -> int:
+    """Archive every cycle completed more than after_days ago, one worker at a time"""
+    owner = await acquire_lock("cycle_archive", CYCLE_ARCHIVE_LOCK_TTL)
+    if not owner:
+        logger.info("Cycle archive already running in another worker")
+        return 0
+    
+    try:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=after_days)
+        reflections = await db.final_reflections.find(
+            {"archived_at": {"$exists": False}, "data_conclusao": {"$lt": cutoff}},
+            {"user_id": 1, "cycle_id": 1}
+        ).to_list(None)
+        
+        archived = 0
+        for reflection in reflections:
+            if await archive_cycle(reflection["user_id"], reflection.get("cycle_id")):
+                archived += 1
+        if archived:
+            logger.info("Archived %d completed cycles", archived)
+        return archived
+    finally:
+        await release_lock("cycle_archive", owner)
+
+@api_router.post("/method/cycles/archive", response_model=CycleSummary)
+async def archive_current_cycle(current_user: User = Depends(require_auth)):
+    """Archive the completed active cycle now instead of waiting for the nightly job"""
+    summary = await archive_cycle(current_user.user_id, current_user.active_cycle_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No completed cycle to archive")
+    return lean_response(summary, CycleSummary)
+
+@api_router.get("/method/cycles", response_model=List[CycleSummary])
+async def get_archived_cycles(current_user: User = Depends(require_auth)):
+    """Summaries of the user's archived cycles, oldest first"""
+    cycles = await db.cycle_archives.find(
+        {"user_id": current_user.user_id},
+        {"_id": 0, "goals": 0, "reflection": 0, "records": 0, "raw_bytes": 0, "compressed_bytes": 0}
+    ).sort("completed_at", 1).to_list(None)
+    return lean_response(cycles, List[CycleSummary])
+
+@api_router.get("/method/cycles/{cycle_id}", response_model=ArchivedCycle, response_model_exclude_none=True)
+async def get_archived_cycle(cycle_id: str, current_user: User = Depends(require_auth)):
+    """One archived cycle with its goals, reflection and daily records"""
+    archive = await db.cycle_archives.find_one(
+        {"cycle_id": cycle_id, "user_id": current_user.user_id},
+        {"_id": 0, "raw_bytes": 0, "compressed_bytes": 0}
+    )
+    if not archive:
+        raise HTTPException(status_code=404, detail="Cycle not found")
+    
+    archive["daily_records"] = unpack_records(archive.pop("records"))
+    return lean_response(archive, ArchivedCycle, exclude_none=True)
+
+
+# ============ NUTRIENT TOTALS ============
+
+MEAL_TYPES = ["cafe_manha", "almoco", "jantar", "lanche"]
+MACRO_FIELDS = ["protein_g", "carbs_g", "fat_g", "fiber_g"]
+NUTRIENTS = ["calories"] + MACRO_FIELDS
+
+def build_food_macros(foods: List[Dict[str, Any]]):
+    """Row index per food_id and a (foods + 1) x macros matrix per 100 g
+    
+    The extra last row is all zeros and stands in for foods no longer in the
+    catalog; macros a source table lacks count as zero.
+    """
+    rows = {food["food_id"]: row for row, food in enumerate(foods)}
+    macros = np.zeros((len(foods) + 1, len(MACRO_FIELDS)))
+    for row, food in enumerate(foods):
+        macros[row] = [food.get(field) or 0.0 for field in MACRO_FIELDS]
+    return rows, macros
+
+def nutrient_values(entries: List[Dict[str, Any]], food_rows: Dict[str, int], food_macros: np.ndarray) -> np.ndarray:
+    """entries x nutrients: the calories stored on each entry plus macros scaled by its portion"""
+    count = len(entries)
+    unknown = len(food_macros) - 1
+    rows = np.fromiter((food_rows.get(entry["food_id"], unknown) for entry in entries), np.intp, count)
+    grams = np.fromiter((entry["portions"] for entry in entries), float, count)
+    
+    values = np.empty((count, len(NUTRIENTS)))
+    values[:, 0] = np.fromiter((entry["calories"] for entry in entries), float, count)
+    values[:, 1:] = food_macros[rows] * (grams / 100)[:, None]
+    return values
+
+def nutrient_dict(values: np.ndarray) -> Dict[str, Any]:
+    totals = {field: round(float(value), 1) for field, value in zip(NUTRIENTS, values)}
+    totals["calories"] = int(round(values[0]))
+    return totals
+
+def nutrient_totals(
+    entries: List[Dict[str, Any]],
+    food_rows: Dict[str, int],
+    food_macros: np.ndarray
+) -> Dict[str, Any]:
+    """Per-day and per-meal totals of every nutrient, summed with one bincount per nutrient"""
+    if not entries:
+        return {"totals": nutrient_dict(np.zeros(len(NUTRIENTS))), "days": []}
+    
+    values = nutrient_values(entries, food_rows, food_macros)
+    
+    dates, day_ids = np.unique(np.array([entry["date"] for entry in entries]), return_inverse=True)
+    meal_slots = len(MEAL_TYPES) + 1  # last slot: unknown meal types, counted in the day total only
+    meal_index = {meal: slot for slot, meal in enumerate(MEAL_TYPES)}
+    meal_ids = np.fromiter(
+        (meal_index.get(entry["meal_type"], len(MEAL_TYPES)) for entry in entries), np.intp, len(entries)
+    )
+    
+    groups = day_ids * meal_slots + meal_ids
+    group_count = len(dates) * meal_slots
+    totals = np.stack([
+        np.bincount(groups, weights=values[:, column], minlength=group_count)
+        for column in range(len(NUTRIENTS))
+    ], axis=1).reshape(len(dates), meal_slots, len(NUTRIENTS))
+    
+    day_totals = totals.sum(axis=1)
+    return {
+        "totals": nutrient_dict(day_totals.sum(axis=0)),
+        "days": [
+            {
+                "date": str(date),
+                "totals": nutrient_dict(day_totals[day]),
+                "by_meal": {meal: nutrient_dict(totals[day, slot]) for slot, meal in enumerate(MEAL_TYPES)}
+            }
+            for day, date in enumerate(dates)
+        ]
+    }
+
+
+# ============ CIRCUIT BREAKER ============
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling MongoDB while a breaker is open"""
+
+class CircuitBreaker:
+    """Stop calling a failing dependency for a while instead of queueing on it
+
+    closed -> open after `failures` consecutive errors; after `reset_timeout`
+    one trial call is let through (half-open) and its outcome decides.
+    """
+    
+    def __init__(self, name: str, failures: int, reset_timeout: float):
+        self.name = name
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+        self.rejected = 0
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+    
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_running):
+            self.rejected += 1
+            raise CircuitOpenError(self.name)
+        
+        # Only the trial owns the flag: a slow call admitted while closed must not
+        # clear it when it finishes during half-open
+        is_trial = state == "half_open"
+        if is_trial:
+            self.trial_running = True
+        try:
+            result = await fn()
+        except PyMongoError:
+            self.consecutive_failures += 1
+            if is_trial or self.consecutive_failures >= self.failures:
+                if self.opened_at is None:
+                    logger.warning("Circuit breaker %s opened", self.name)
+                self.opened_at = time.monotonic()
+            raise
+        finally:
+            if is_trial:
+                self.trial_running = False
+        
+        if self.opened_at is not None:
+            if not is_trial:
+                # Started before the breaker opened: says nothing about recovery
+                return result
+            logger.info("Circuit breaker %s closed", self.name)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.consecutive_failures, "rejected": self.rejected}
+
+
+# ============ CATALOG CACHE ============
+
+# Internal fields of food documents that clients never see
+FOOD_PROJECTION = {"_id": 0, "search_name": 0, "search_tokens": 0, "source": 0}
+
+# Matches read per search before ranking; the endpoint returns a page of them
+SEARCH_CANDIDATES = 200
+
+def search_key(text: str) -> str:
+    """Lower-case, accent- and punctuation-free, single-spaced form of a name, for matching"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.findall(r"\w+", stripped.lower()))
+
+def food_document(food: Dict[str, Any]) -> Dict[str, Any]:
+    """A food as stored: the catalog fields plus its search key and words"""
+    name_key = search_key(food["name"])
+    return {**food, "search_name": name_key, "search_tokens": name_key.split()}
+
+def search_relevance(name_key: str, query: str) -> tuple:
+    """Sort key: exact name, then name prefix, then word prefix; shorter names first"""
+    if name_key == query:
+        rank = 0
+    elif name_key.startswith(query):
+        rank = 1
+    elif f" {query}" in f" {name_key}":
+        rank = 2
+    else:
+        rank = 3
+    return (rank, len(name_key), name_key)
+
+def rank_foods(foods: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    return sorted(foods, key=lambda food: search_relevance(search_key(food["name"]), query))
+
+async def search_foods(query: str, category: Optional[str]) -> List[Dict[str, Any]]:
+    """Foods whose words start with every search term, best matches first
+    
+    Both queries are index range scans: a prefix of search_name (so exact and
+    leading matches are never crowded out) and word prefixes on the multikey
+    search_tokens, which also finds terms in any position.
+    """
+    terms = query.split()
+    name_query = {"search_name": {"$regex": "^" + re.escape(query)}}
+    token_query = {"$and": [{"search_tokens": {"$regex": "^" + re.escape(term)}} for term in terms]}
+    if category:
+        name_query["category"] = token_query["category"] = category
+    
+    leading, by_word = await asyncio.gather(
+        db.foods.find(name_query, FOOD_PROJECTION).sort("search_name", 1).limit(SEARCH_CANDIDATES).to_list(None),
+        db.foods.find(token_query, FOOD_PROJECTION).sort("search_name", 1).limit(SEARCH_CANDIDATES).to_list(None)
+    )
+    candidates = {food["food_id"]: food for food in by_word}
+    candidates.update((food["food_id"], food) for food in leading)
+    return rank_foods(list(candidates.values()), query)
+
+class CatalogCache:
+    """In-memory copy of the foods and activities catalogs, warmed at startup"""
+    
+    def __init__(self):
+        self.foods: List[Dict[str, Any]] = []
+        self.activities: List[Dict[str, Any]] = []
+        self.foods_by_id: Dict[str, Dict[str, Any]] = {}
+        self.food_rows, self.food_macros = build_food_macros([])
+        self.activities_by_id: Dict[str, Dict[str, Any]] = {}
+        self.revision: Optional[datetime] = None
+        self.loaded = False
+        self.breaker: Optional[CircuitBreaker] = None
+        self.reload_task: Optional[asyncio.Task] = None
+    
+    def get_breaker(self) -> CircuitBreaker:
+        """Breaker guarding catalog reads, built from settings on first use"""
+        if self.breaker is None:
+            settings = get_settings()
+            self.breaker = CircuitBreaker(
+                "catalog", settings.catalog_breaker_failures, settings.catalog_breaker_reset_s
+            )
+        return self.breaker
+    
+    async def read(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run a catalog query through the breaker"""
+        return await self.get_breaker().call(fn)
+    
+    async def current_revision(self) -> Optional[datetime]:
+        """When the catalog was last changed, as recorded in metadata.catalog"""
+        meta = await db.metadata.find_one({"_id": "catalog"}, {"updated_at": 1})
+        return meta.get("updated_at") if meta else None
+    
+    async def load(self):
+        """(Re)load both catalogs from MongoDB"""
+        revision, foods, activities = await self.read(lambda: asyncio.gather(
+            self.current_revision(),
+            db.foods.find({}, FOOD_PROJECTION).to_list(None),
+            db.activities.find({}, {"_id": 0}).to_list(None)
+        ))
+        
+        self.revision = revision
+        self.foods = foods
+        self.activities = activities
+        self.foods_by_id = {food["food_id"]: food for food in foods}
+        self.food_rows, self.food_macros = build_food_macros(foods)
+        self.activities_by_id = {activity["activity_id"]: activity for activity in activities}
+        self.loaded = True
+        logger.info("Catalog cache loaded: %d foods, %d activities", len(foods), len(activities))
+    
+    async def ensure_loaded(self):
+        """Load on first use when startup warmup did not run"""
+        if not self.loaded:
+            await self.load()
+    
+    async def refresh_if_changed(self):
+        """Reload when another worker (or deploy) changed the catalog since our load"""
+        if await self.read(self.current_revision) != self.revision:
+            await self.load()
+    
+    def schedule_reload(self, delay: float = 1.0):
+        """Reload shortly after a change event; a burst of item writes loads once"""
+        if self.reload_task is None or self.reload_task.done():
+            self.reload_task = asyncio.create_task(self._reload_after(delay), context=contextvars.Context())
+    
+    async def _reload_after(self, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self.load()
+        except Exception:
+            logger.exception("Catalog reload after change failed")
+    
+    async def watch(self, interval: float):
+        """Poll the catalog revision forever; a single point read per interval"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_if_changed()
+            except CircuitOpenError:
+                pass  # keep serving the copy we have
+            except Exception:
+                logger.exception("Catalog refresh failed")
+
+catalog_cache = CatalogCache()
+
+
+# ============ CALORIES/FOOD ENDPOINTS ============
+
+@api_router.get("/calories/foods", response_model=List[Food], response_model_exclude_none=True)
+async def get_foods(
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=SEARCH_CANDIDATES),
+    offset: int = Query(0, ge=0)
+):
+    """Get a page of foods, optionally filtered by category or an accent-insensitive search"""
+    search = search_key(search) if search else None
+    if search and offset + limit > SEARCH_CANDIDATES:
+        raise HTTPException(
+            status_code=400, detail=f"Search results are limited to the first {SEARCH_CANDIDATES} matches"
+        )
+    
+    async def load():
+        if not search:
+            # Listing is served straight from the warmed catalog cache
+            await catalog_cache.ensure_loaded()
+            foods = [food for food in catalog_cache.foods if not category or food["category"] == category]
+            return foods[offset:offset + limit]
+        
+        try:
+            foods = await catalog_cache.read(lambda: search_foods(search, category))
+        except (CircuitOpenError, PyMongoError):
+            if not catalog_cache.loaded:
+                raise
+            # Database in trouble: search the (possibly stale) cached catalog instead
+            terms = search.split()
+            foods = rank_foods([
+                food for food in catalog_cache.foods
+                if (not category or food["category"] == category)
+                and all(f" {term}" in f" {search_key(food['name'])}" for term in terms)
+            ], search)
+        
+        return foods[offset:offset + limit]
+    
+    return await coalesced_response(
+        ("foods", category, search, limit, offset), load, List[Food], exclude_none=True
+    )
+
+async def find_food(food_id: str) -> Optional[Dict[str, Any]]:
+    """A food from the catalog cache, or MongoDB for items added since it loaded"""
+    await catalog_cache.ensure_loaded()
+    food = catalog_cache.foods_by_id.get(food_id)
+    if food is None:
+        food = await db.foods.find_one({"food_id": food_id}, FOOD_PROJECTION)
+    return food
+
+def priced_portion(food: Dict[str, Any], portions: float) -> Dict[str, Any]:
+    """`portions` grams of `food`, with its name and calories"""
+    return {
+        "food_id": food["food_id"],
+        "food_name": food["name"],
+        "portions": portions,
+        "calories": int((food["calories_per_100g"] * portions) / 100)
+    }
+
+def food_entry_document(
+    user_id: str,
+    date: str,
+    meal_type: str,
+    portion: Dict[str, Any],
+    now: datetime
+) -> Dict[str, Any]:
+    """A food_entries document for a priced portion"""
+    return {
+        "entry_id": f"fe_{uuid.uuid4().hex[:12]}",
+        "user_id": user_id,
+        "date": date,
+        "meal_type": meal_type,
+        "food_id": portion["food_id"],
+        "food_name": portion["food_name"],
+        "portions": portion["portions"],
+        "calories": portion["calories"],
+        "created_at": now,
+        "updated_at": now
+    }
+
+@api_router.post("/calories/add-meal")
 async def add_meal(
     entry: FoodEntryCreate,
     current_user: User = Depends(require_auth)
 ):
     """Add food to meal"""
     # Get food info
-    food = await db.foods.find_one({"food_id": entry.food_id}, {"_id": 0})
+    food = await find_food(entry.food_id)
     if not food:
         raise HTTPException(status_code=404, detail="Food not found")
     
-    # Calculate calories
-    calories = int((food["calories_per_100g"] * entry.portions) / 100)
-    
     # Get today's date
-    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    now = datetime.now(timezone.utc)
+    today = now.strftime("%Y-%m-%d")
     
     # Create food entry
-    food_entry_data = {
-        "user_id": current_user.user_id,
-        "date": today,
-        "meal_type": entry.meal_type,
-        "food_id": entry.food_id,
-        "food_name": food["name"],
-        "portions": entry.portions,
-        "calories": calories,
-        "created_at": datetime.now(timezone.utc)
-    }
+    food_entry_data = food_entry_document(
+        current_user.user_id, today, entry.meal_type, priced_portion(food, entry.portions), now
+    )
     
     await db.food_entries.insert_one(food_entry_data)
     
-    # Update daily record calories
-    daily_record = await db.daily_records.find_one(
-        {"user_id": current_user.user_id, "date": today},
-        {"_id": 0}
-    )
-    
-    if daily_record:
-        new_total = daily_record.get("calories_consumed", 0) + calories
-        await db.daily_records.update_one(
+    await asyncio.gather(
+        # Update daily record calories (only if today's record exists)
+        db.daily_records.update_one(
             {"user_id": current_user.user_id, "date": today},
-            {"$set": {"calories_consumed": new_total}}
-        )
+            {"$inc": {"calories_consumed": food_entry_data["calories"]}, "$set": {"updated_at": now}}
+        ),
+        record_food_uses(current_user.user_id, entry.meal_type, [(entry.food_id, entry.portions)], now)
+    )
+    forget_user_reads(current_user.user_id)
     
     return FoodEntry(**food_entry_data)
 
-@api_router.get("/calories/today")
-async def get_today_calories(current_user: User = Depends(require_auth)):
-    """Get today's food entries and total calories"""
+async def load_today_calories(user_id: str) -> Dict[str, Any]:
+    """Today's food entries grouped by meal, with calorie and macro totals"""
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     
-    food_entries = await db.food_entries.find(
-        {"user_id": current_user.user_id, "date": today},
-        {"_id": 0}
-    ).to_list(1000)
-    
-    total_calories = sum(entry["calories"] for entry in food_entries)
+    food_entries, _ = await asyncio.gather(
+        db.food_entries.find(entry_date_query(user_id, today), {"_id": 0}).to_list(1000),
+        catalog_cache.ensure_loaded()
+    )
     
     # Group by meal type
-    by_meal = {
-        "cafe_manha": [],
-        "almoco": [],
-        "jantar": [],
-        "lanche": []
-    }
+    by_meal = {meal_type: [] for meal_type in MEAL_TYPES}
     
     for entry in food_entries:
         meal_type = entry["meal_type"]
         if meal_type in by_meal:
-            by_meal[meal_type].append(FoodEntry(**entry))
+            by_meal[meal_type].append(entry)
+    
+    nutrients = nutrient_totals(food_entries, catalog_cache.food_rows, catalog_cache.food_macros)
+    empty_meals = {meal_type: nutrients["totals"] for meal_type in MEAL_TYPES}
     
     return {
-        "total_calories": total_calories,
+        "total_calories": nutrients["totals"]["calories"],
         "by_meal": by_meal,
-        "all_entries": [FoodEntry(**entry) for entry in food_entries]
+        "all_entries": food_entries,
+        "totals": nutrients["totals"],
+        "by_meal_totals": nutrients["days"][0]["by_meal"] if nutrients["days"] else empty_meals
     }
 
+@api_router.get("/calories/today", response_model=TodayCalories)
+async def get_today_calories(current_user: User = Depends(require_auth)):
+    """Get today's food entries and total calories"""
+    return lean_response(await load_today_calories(current_user.user_id), TodayCalories)
+
+# Longest range served by /calories/totals
+MAX_TOTALS_DAYS = 366
+
+@api_router.get("/calories/totals", response_model=NutrientRange)
+async def get_nutrient_totals(
+    start: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    end: str = Query(..., pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    current_user: User = Depends(require_auth)
+):
+    """Calorie and macro totals per day and meal between two dates (inclusive)"""
+    try:
+        days = (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days + 1
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    if not 1 <= days <= MAX_TOTALS_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range must cover 1 to {MAX_TOTALS_DAYS} days")
+    
+    entries, summaries, _ = await asyncio.gather(
+        db.food_entries.find(
+            entry_date_query(current_user.user_id, start, end),
+            {"_id": 0, "date": 1, "meal_type": 1, "food_id": 1, "portions": 1, "calories": 1}
+        ).to_list(None),
+        # Days older than the rollup horizon only exist as summaries
+        db.daily_summaries.find(
+            {"user_id": current_user.user_id, "date": {"$gte": start, "$lte": end}, "food_entry_count": {"$gt": 0}},
+            {"_id": 0, "date": 1, "totals": 1, "by_meal": 1}
+        ).to_list(None),
+        catalog_cache.ensure_loaded()
+    )
+    
+    nutrients = with_summaries(
+        nutrient_totals(entries, catalog_cache.food_rows, catalog_cache.food_macros), summaries
+    )
+    return lean_response({"start": start, "end": end, **nutrients}, NutrientRange)
+
+@api_router.put("/calories/{entry_id}", response_model=FoodEntry)
+async def update_food_entry(
+    entry_id: str,
+    update: FoodEntryUpdate,
+    current_user: User = Depends(require_auth)
+):
+    """Change the portion or meal of a food entry"""
+    entry = await db.food_entries.find_one({"user_id": current_user.user_id, "entry_id": entry_id}, {"_id": 0})
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    
+    changes = update.model_dump(exclude_none=True)
+    if "portions" in changes:
+        food = await find_food(entry["food_id"])
+        if not food:
+            raise HTTPException(status_code=404, detail="Food not found")
+        changes["calories"] = priced_portion(food, update.portions)["calories"]
+    
+    updated = await update_entry("food_entries", current_user.user_id, entry_id, changes)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    return lean_response(updated, FoodEntry)
+
 @api_router.delete("/calories/{entry_id}")
 async def delete_food_entry(entry_id: str, current_user: User = Depends(require_auth)):
-    """Delete a food entry"""
-    # Note: This is a simplified version. In production, you'd want proper entry_id tracking
+    """Delete a food entry, taking its calories off the daily record"""
+    if not await delete_entry("food_entries", current_user.user_id, entry_id):
+        raise HTTPException(status_code=404, detail="Entry not found")
     return {"message": "Entry deleted"}
 
 
+# ============ FOOD SUGGESTIONS ============
+
+# Exponentially decayed use counts: a use FOOD_USE_HALF_LIFE ago weighs half of
+# one today. Rather than decaying every stored score, each use adds
+# exp(λ·(t − epoch)), which keeps all of a user's scores on one scale with a
+# single $inc. Floats hold this for decades at a 14 day half-life.
+FOOD_USE_HALF_LIFE = timedelta(days=14)
+FOOD_USE_EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)
+# Past this many foods, a user's stats are trimmed back to the best FOOD_STATS_KEEP
+FOOD_STATS_MAX = 200
+FOOD_STATS_KEEP = 100
+
+def food_use_weight(when: datetime) -> float:
+    decay = math.log(2) / FOOD_USE_HALF_LIFE.total_seconds()
+    return math.exp(decay * (when - FOOD_USE_EPOCH).total_seconds())
+
+def food_stats_key(food_id: str) -> str:
+    """food_id as a field name (no dots or leading $)"""
+    return food_id.replace("%", "%25").replace(".", "%2E").replace("$", "%24")
+
+async def record_food_uses(user_id: str, meal_type: str, uses: List[tuple], when: datetime):
+    """Fold logged (food_id, portions) pairs into the user's compact stats document, in one update"""
+    weight = food_use_weight(when)
+    increments: Dict[str, float] = {}
+    updates: Dict[str, Any] = {"updated_at": when}
+    
+    for food_id, portions in uses:
+        prefix = f"foods.{food_stats_key(food_id)}"
+        for field, amount in (
+            (f"{prefix}.score", weight),
+            (f"{prefix}.meals.{food_stats_key(meal_type)}", weight),
+            (f"{prefix}.count", 1)
+        ):
+            increments[field] = increments.get(field, 0) + amount
+        updates[f"{prefix}.food_id"] = food_id
+        updates[f"{prefix}.last_portions"] = portions
+        updates[f"{prefix}.last_used"] = when
+    
+    await db.user_food_stats.update_one(
+        {"user_id": user_id},
+        {"$inc": increments, "$set": updates},
+        upsert=True
+    )
+
+async def trim_food_stats(user_id: str, min_score: float):
+    """Drop the foods scored below min_score from a user's stats"""
+    stats = await db.user_food_stats.find_one({"user_id": user_id}, {"foods": 1})
+    dropped = [key for key, used in (stats or {}).get("foods", {}).items() if used["score"] < min_score]
+    if dropped:
+        await db.user_food_stats.update_one(
+            {"user_id": user_id},
+            {"$unset": {f"foods.{key}": "" for key in dropped}}
+        )
+
+@api_router.get("/calories/suggestions", response_model=List[FoodSuggestion])
+async def get_food_suggestions(
+    meal_type: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(require_auth)
+):
+    """The user's most used foods lately (for the given meal first), from one point read"""
+    stats, _ = await asyncio.gather(
+        db.user_food_stats.find_one({"user_id": current_user.user_id}, {"_id": 0, "foods": 1}),
+        catalog_cache.ensure_loaded()
+    )
+    foods = (stats or {}).get("foods", {})
+    
+    meal_key = food_stats_key(meal_type) if meal_type else None
+    
+    def relevance(item):
+        _, used = item
+        # Foods eaten at this meal first; overall use breaks ties and fills the list
+        return (used.get("meals", {}).get(meal_key, 0.0), used["score"])
+    
+    ranked = sorted(foods.items(), key=relevance, reverse=True)
+    
+    if len(ranked) > FOOD_STATS_MAX:
+        scores = sorted((used["score"] for used in foods.values()), reverse=True)
+        spawn(trim_food_stats(current_user.user_id, scores[FOOD_STATS_KEEP - 1]))
+    
+    suggestions = []
+    for _, used in ranked:
+        food = catalog_cache.foods_by_id.get(used["food_id"])
+        if food is None:
+            continue  # no longer in the catalog
+        suggestions.append({
+            **food,
+            "times_logged": used["count"],
+            "last_portions": used["last_portions"],
+            "last_used": used["last_used"]
+        })
+        if len(suggestions) == limit:
+            break
+    
+    return lean_response(suggestions, List[FoodSuggestion], exclude_none=True)
+
+
+# ============ MEAL TEMPLATES ============
+
+# Saved meals store each item's name and calories, priced against the catalog
+# revision they were saved at; logging one reprices only if the catalog changed.
+MAX_TEMPLATES_PER_USER = 50
+TEMPLATE_PROJECTION = {"_id": 0, "catalog_revision": 0}
+
+async def price_items(items: List[MealTemplateItem]) -> List[Dict[str, Any]]:
+    """Template items with food names and calories, or 404 for unknown foods"""
+    foods = await asyncio.gather(*(find_food(item.food_id) for item in items))
+    missing = [item.food_id for item, food in zip(items, foods) if food is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Food not found: {', '.join(missing)}")
+    return [priced_portion(food, item.portions) for item, food in zip(items, foods)]
+
+def repriced_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Items priced from the catalog cache; foods no longer listed keep their saved values"""
+    repriced = []
+    for item in items:
+        food = catalog_cache.foods_by_id.get(item["food_id"])
+        repriced.append(priced_portion(food, item["portions"]) if food else item)
+    return repriced
+
+@api_router.post("/calories/templates", response_model=MealTemplate)
+async def create_meal_template(
+    template: MealTemplateCreate,
+    current_user: User = Depends(require_auth)
+):
+    """Save a meal (foods and grams) to log later in one tap"""
+    count, items = await asyncio.gather(
+        db.meal_templates.count_documents({"user_id": current_user.user_id}),
+        price_items(template.items)
+    )
+    if count >= MAX_TEMPLATES_PER_USER:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TEMPLATES_PER_USER} saved meals")
+    
+    now = datetime.now(timezone.utc)
+    template_data = {
+        "template_id": f"tpl_{uuid.uuid4().hex[:12]}",
+        "user_id": current_user.user_id,
+        "name": template.name,
+        "meal_type": template.meal_type,
+        "items": items,
+        "total_calories": sum(item["calories"] for item in items),
+        "catalog_revision": catalog_cache.revision,
+        "created_at": now,
+        "updated_at": now
+    }
+    await db.meal_templates.insert_one(template_data)
+    template_data.pop("_id", None)
+    template_data.pop("catalog_revision")
+    
+    return lean_response(template_data, MealTemplate)
+
+@api_router.get("/calories/templates", response_model=List[MealTemplate])
+async def get_meal_templates(current_user: User = Depends(require_auth)):
+    """The user's saved meals, most recently changed first"""
+    templates = await db.meal_templates.find(
+        {"user_id": current_user.user_id}, TEMPLATE_PROJECTION
+    ).sort("updated_at", DESCENDING).to_list(MAX_TEMPLATES_PER_USER)
+    return lean_response(templates, List[MealTemplate])
+
+@api_router.delete("/calories/templates/{template_id}")
+async def delete_meal_template(template_id: str, current_user: User = Depends(require_auth)):
+    """Delete a saved meal"""
+    result = await db.meal_templates.delete_one({"template_id": template_id, "user_id": current_user.user_id})
+    if result.deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"message": "Template deleted"}
+
+@api_router.post("/calories/templates/{template_id}/log", response_model=List[FoodEntry])
+async def log_meal_template(
+    template_id: str,
+    options: Optional[MealTemplateLog] = None,
+    current_user: User = Depends(require_auth)
+):
+    """Log every item of a saved meal today: one insert_many and one $inc on the daily record"""
+    template, _ = await asyncio.gather(
+        db.meal_templates.find_one({"template_id": template_id, "user_id": current_user.user_id}, {"_id": 0}),
+        catalog_cache.ensure_loaded()
+    )
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    meal_type = (options.meal_type if options else None) or template.get("meal_type")
+    if not meal_type:
+        raise HTTPException(status_code=400, detail="meal_type is required")
+    
+    items = template["items"]
+    if catalog_cache.revision is not None and template.get("catalog_revision") != catalog_cache.revision:
+        # The catalog changed since the calories were cached: reprice in memory
+        # and refresh the template in the background
+        items = repriced_items(items)
+        spawn(db.meal_templates.update_one(
+            {"template_id": template_id},
+            {"$set": {
+                "items": items,
+                "total_calories": sum(item["calories"] for item in items),
+                "catalog_revision": catalog_cache.revision
+            }}
+        ))
+    
+    now = datetime.now(timezone.utc)
+    today = now.strftime("%Y-%m-%d")
+    entries = [food_entry_document(current_user.user_id, today, meal_type, item, now) for item in items]
+    
+    await asyncio.gather(
+        db.food_entries.insert_many([dict(entry) for entry in entries]),
+        # Update daily record calories (only if today's record exists)
+        db.daily_records.update_one(
+            {"user_id": current_user.user_id, "date": today},
+            {"$inc": {"calories_consumed": sum(entry["calories"] for entry in entries)}, "$set": {"updated_at": now}}
+        )
+    )
+    forget_user_reads(current_user.user_id)
+    
+    # Suggestion scores only rank the picker: bumped off the request path, so
+    # the request itself writes twice (a bulk write cannot span collections)
+    spawn(record_food_uses(current_user.user_id, meal_type, [(item["food_id"], item["portions"]) for item in items], now))
+    
+    return lean_response(entries, List[FoodEntry])
+
+
 # ============ ACTIVITIES ENDPOINTS ============
 
-@api_router.get("/activities/list")
+# Ajuste do MET conforme a intensidade informada
+INTENSITY_FACTORS = {
+    "baixa": 0.8,
+    "media": 1.0,
+    "alta": 1.2,
+}
+
+DEFAULT_WEIGHT_KG = 70  # usado quando o perfil ainda não tem peso
+
+def calculate_calories_burned(met_value: float, intensity: str, weight_kg: float, duration_minutes: int) -> int:
+    """Formula: MET * intensity factor * weight(kg) * time(hours)"""
+    met = met_value * INTENSITY_FACTORS.get(intensity, 1.0)
+    return int(met * weight_kg * duration_minutes / 60)
+
+@api_router.get("/activities/list", response_model=List[Activity])
 async def get_activities(category: Optional[str] = None):
     """Get all activities, optionally filtered by category"""
-    query = {}
+    async def load():
+        await catalog_cache.ensure_loaded()
+        return [
+            activity for activity in catalog_cache.activities
+            if not category or activity["category"] == category
+        ]
     
-    if category:
-        query["category"] = category
-    
-    activities = await db.activities.find(query, {"_id": 0}).to_list(1000)
-    return [Activity(**activity) for activity in activities]
+    return await coalesced_response(("activities", category), load, List[Activity])
 
 @api_router.post("/activities/add")
 async def add_activity(
@@ -832,32 +2866,26 @@ async def add_activity(
     current_user: User = Depends(require_auth)
 ):
     """Add activity entry"""
-    # Get activity info
-    activity = await db.activities.find_one({"activity_id": entry.activity_id}, {"_id": 0})
+    # Get activity info from the in-memory MET table
+    await catalog_cache.ensure_loaded()
+    activity = catalog_cache.activities_by_id.get(entry.activity_id)
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
     
-    # Calculate calories burned
-    # Formula: MET * weight(kg) * time(hours)
-    # We'll assume average weight of 70kg if not provided
-    # TODO: Get user weight from profile
-    weight_kg = 70
-    time_hours = entry.duration / 60
-    
-    # Adjust MET based on intensity
-    met = activity["met_value"]
-    if entry.intensity == "baixa":
-        met *= 0.8
-    elif entry.intensity == "alta":
-        met *= 1.2
-    
-    calories_burned = int(met * weight_kg * time_hours)
+    calories_burned = calculate_calories_burned(
+        activity["met_value"],
+        entry.intensity,
+        current_user.weight or DEFAULT_WEIGHT_KG,
+        entry.duration
+    )
     
     # Get today's date
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     
     # Create activity entry
+    now = datetime.now(timezone.utc)
     activity_entry_data = {
+        "entry_id": f"ae_{uuid.uuid4().hex[:12]}",
         "user_id": current_user.user_id,
         "date": today,
         "activity_id": entry.activity_id,
@@ -865,258 +2893,1271 @@ async def add_activity(
         "duration": entry.duration,
         "intensity": entry.intensity,
         "calories_burned": calories_burned,
-        "created_at": datetime.now(timezone.utc)
+        "created_at": now,
+        "updated_at": now
     }
     
     await db.activity_entries.insert_one(activity_entry_data)
     
-    # Update daily record calories
-    daily_record = await db.daily_records.find_one(
+    # Update daily record calories (only if today's record exists)
+    await db.daily_records.update_one(
         {"user_id": current_user.user_id, "date": today},
-        {"_id": 0}
+        {"$inc": {"calories_burned": calories_burned}, "$set": {"updated_at": now}}
     )
-    
-    if daily_record:
-        new_total = daily_record.get("calories_burned", 0) + calories_burned
-        await db.daily_records.update_one(
-            {"user_id": current_user.user_id, "date": today},
-            {"$set": {"calories_burned": new_total}}
-        )
+    forget_user_reads(current_user.user_id)
     
     return ActivityEntry(**activity_entry_data)
 
-@api_router.get("/activities/today")
-async def get_today_activities(current_user: User = Depends(require_auth)):
-    """Get today's activity entries and total calories burned"""
+async def load_today_activities(user_id: str) -> Dict[str, Any]:
+    """Today's activity entries with the total calories burned"""
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     
     activity_entries = await db.activity_entries.find(
-        {"user_id": current_user.user_id, "date": today},
-        {"_id": 0}
+        entry_date_query(user_id, today), {"_id": 0}
     ).to_list(1000)
     
     total_calories = sum(entry["calories_burned"] for entry in activity_entries)
     
     return {
         "total_calories_burned": total_calories,
-        "entries": [ActivityEntry(**entry) for entry in activity_entries]
+        "entries": activity_entries
     }
 
+@api_router.get("/activities/today", response_model=TodayActivities)
+async def get_today_activities(current_user: User = Depends(require_auth)):
+    """Get today's activity entries and total calories burned"""
+    return lean_response(await load_today_activities(current_user.user_id), TodayActivities)
+
+@api_router.put("/activities/{entry_id}", response_model=ActivityEntry)
+async def update_activity_entry(
+    entry_id: str,
+    update: ActivityEntryUpdate,
+    current_user: User = Depends(require_auth)
+):
+    """Change the duration or intensity of an activity entry"""
+    entry = await db.activity_entries.find_one({"user_id": current_user.user_id, "entry_id": entry_id}, {"_id": 0})
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    
+    changes = update.model_dump(exclude_none=True)
+    if changes:
+        await catalog_cache.ensure_loaded()
+        activity = catalog_cache.activities_by_id.get(entry["activity_id"])
+        if not activity:
+            raise HTTPException(status_code=404, detail="Activity not found")
+        changes["calories_burned"] = calculate_calories_burned(
+            activity["met_value"],
+            changes.get("intensity", entry["intensity"]),
+            current_user.weight or DEFAULT_WEIGHT_KG,
+            changes.get("duration", entry["duration"])
+        )
+    
+    updated = await update_entry("activity_entries", current_user.user_id, entry_id, changes)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    return lean_response(updated, ActivityEntry)
+
+@api_router.delete("/activities/{entry_id}")
+async def delete_activity_entry(entry_id: str, current_user: User = Depends(require_auth)):
+    """Delete an activity entry, taking its calories off the daily record"""
+    if not await delete_entry("activity_entries", current_user.user_id, entry_id):
+        raise HTTPException(status_code=404, detail="Entry not found")
+    return {"message": "Entry deleted"}
+
 @api_router.put("/daily/water")
 async def update_water_intake(
-    water_ml: int,
+    water_ml: Optional[int] = Query(None, ge=0),
+    increment_ml: Optional[int] = Query(None, ge=0),
     current_user: User = Depends(require_auth)
 ):
-    """Update water intake for today"""
+    """Set today's water intake (water_ml) or log one drink (increment_ml)"""
+    if water_ml is None and increment_ml is None:
+        raise HTTPException(status_code=400, detail="water_ml or increment_ml is required")
+    
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     
-    # Ensure daily record exists
-    existing = await db.daily_records.find_one(
-        {"user_id": current_user.user_id, "date": today},
-        {"_id": 0}
+    # Coalesced with the user's other taps and written behind in one upsert
+    water_buffer.add(
+        current_user.user_id, today, water_ml=water_ml, increment_ml=increment_ml, cycle_id=current_user.active_cycle_id
     )
     
-    if not existing:
-        # Get current day number (days since first goal)
-        goals = await db.user_goals.find_one(
-            {"user_id": current_user.user_id},
-            {"_id": 0}
+    if water_ml is None:
+        return {"increment_ml": increment_ml}
+    return {"water_intake": water_ml}
+
+
+# ============ ENTRY EDITS ============
+
+# Entry collection -> (its calories field, the daily_records counter it adds to)
+ENTRY_COUNTERS = {
+    "food_entries": ("calories", "calories_consumed"),
+    "activity_entries": ("calories_burned", "calories_burned"),
+}
+
+async def update_entry(
+    collection_name: str,
+    user_id: str,
+    entry_id: str,
+    changes: Dict[str, Any]
+) -> Optional[Dict[str, Any]]:
+    """Apply changes to an entry and move the calorie difference onto its daily record"""
+    calories_field, counter = ENTRY_COUNTERS[collection_name]
+    now = datetime.now(timezone.utc)
+    
+    async def apply(session):
+        # The document as it was before this update, so the delta matches what is reversed
+        before = await db[collection_name].find_one_and_update(
+            {"user_id": user_id, "entry_id": entry_id},
+            {"$set": {**changes, "updated_at": now}},
+            projection={"_id": 0},
+            session=session
+        )
+        if before is None:
+            return None
+        
+        delta = changes.get(calories_field, before[calories_field]) - before[calories_field]
+        if delta:
+            await db.daily_records.update_one(
+                {"user_id": user_id, "date": before["date"]},
+                {"$inc": {counter: delta}, "$set": {"updated_at": now}},
+                session=session
+            )
+        return {**before, **changes, "updated_at": now}
+    
+    # Time-series collections cannot be written inside transactions
+    updated = await in_transaction(apply, enabled=not timeseries_entries())
+    if updated is not None:
+        forget_user_reads(user_id)
+    return updated
+
+async def delete_entry(collection_name: str, user_id: str, entry_id: str) -> bool:
+    """Delete an entry, reverse its calories on the daily record and leave a tombstone for sync"""
+    calories_field, counter = ENTRY_COUNTERS[collection_name]
+    now = datetime.now(timezone.utc)
+    
+    async def apply(session):
+        entry = await db[collection_name].find_one_and_delete(
+            {"user_id": user_id, "entry_id": entry_id},
+            projection={"_id": 0, "date": 1, calories_field: 1},
+            session=session
         )
+        if entry is None:
+            return False
+        
+        await db.daily_records.update_one(
+            {"user_id": user_id, "date": entry["date"]},
+            {"$inc": {counter: -entry[calories_field]}, "$set": {"updated_at": now}},
+            session=session
+        )
+        await db.deleted_entries.insert_one({
+            "user_id": user_id,
+            "collection": collection_name,
+            "entry_id": entry_id,
+            "date": entry["date"],
+            "updated_at": now
+        }, session=session)
+        return True
+    
+    deleted = await in_transaction(apply, enabled=not timeseries_entries())
+    if deleted:
+        forget_user_reads(user_id)
+    return deleted
+
+
+# ============ WATER WRITE-BEHIND ============
+
+async def current_day_number(user_id: str, cycle_id: Optional[str]) -> int:
+    """Day of the cycle for today (days since its goals were created, capped at 21)"""
+    goals = await db.user_goals.find_one({"user_id": user_id, "cycle_id": cycle_id}, {"created_at": 1})
+    
+    if not goals:
+        return 1
+    
+    goals_created = goals["created_at"]
+    if goals_created.tzinfo is None:
+        goals_created = goals_created.replace(tzinfo=timezone.utc)
+    days_since_start = (datetime.now(timezone.utc) - goals_created).days + 1
+    
+    return min(days_since_start, 21)
+
+async def new_daily_record_fields(user_id: str, cycle_id: Optional[str], now: datetime) -> Dict[str, Any]:
+    """Fields of a daily record created by a water tap alone"""
+    cycle_id, day_number = await asyncio.gather(
+        open_cycle_id(user_id, cycle_id),
+        current_day_number(user_id, cycle_id)
+    )
+    return {
+        "cycle_id": cycle_id,
+        "day_number": day_number,
+        "checklist_alimentar": ChecklistAlimentar().model_dump(),
+        "praticas_diarias": PraticasDiarias().model_dump(),
+        "gratidoes": [],
+        "calories_consumed": 0,
+        "calories_burned": 0,
+        "created_at": now
+    }
+
+class WaterWriteBehind:
+    """Coalesces water taps per (user, day) into a single daily record upsert.
+    
+    A flush happens `window` seconds after the last tap, but never later than
+    `max_delay` seconds after the first one. Absolute values (`water_ml`) replace
+    the total; drinks (`increment_ml`) are `$inc`-ed and kept as water_events, so
+    concurrent taps from several workers never overwrite each other.
+    """
+    
+    def __init__(self, window: float, max_delay: float):
+        self.window = window
+        self.max_delay = max_delay
+        self.pending: Dict[Any, Dict[str, Any]] = {}
+        self.timers: Dict[Any, asyncio.Task] = {}
+        self.flushing: set = set()  # timer tasks past their deadline, writing
+    
+    def add(
+        self,
+        user_id: str,
+        date: str,
+        water_ml: Optional[int] = None,
+        increment_ml: Optional[int] = None,
+        cycle_id: Optional[str] = None
+    ):
+        """Buffer one tap and (re)schedule the flush of its key"""
+        key = (user_id, date)
+        now = asyncio.get_running_loop().time()
+        
+        pending = self.pending.get(key)
+        if pending is None:
+            pending = self.pending[key] = {
+                "value": None,  # last absolute value, if any
+                "increment": 0,  # drinks since that value (or in total)
+                "events": [],
+                "first_at": now
+            }
+        pending["cycle_id"] = cycle_id  # for a record the flush creates
+        
+        if water_ml is not None:
+            pending["value"] = water_ml
+            pending["increment"] = 0
+        if increment_ml is not None:
+            pending["increment"] += increment_ml
+            pending["events"].append({
+                "user_id": user_id,
+                "date": date,
+                "amount_ml": increment_ml,
+                "created_at": datetime.now(timezone.utc)
+            })
+        
+        pending["deadline"] = min(now + self.window, pending["first_at"] + self.max_delay)
+        
+        if key not in self.timers:
+            # Detached from the request so its MongoDB deadline does not apply to the flush
+            self.timers[key] = asyncio.create_task(self._flush_when_due(key), context=contextvars.Context())
+    
+    async def _flush_when_due(self, key):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                delay = self.pending[key]["deadline"] - loop.time()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            self.timers.pop(key, None)
         
-        if goals:
-            goals_created = goals["created_at"]
-            if goals_created.tzinfo is None:
-                goals_created = goals_created.replace(tzinfo=timezone.utc)
-            days_since_start = (datetime.now(timezone.utc) - goals_created).days + 1
+        # No longer a timer (new taps schedule a new one) but still awaited on shutdown
+        task = asyncio.current_task()
+        self.flushing.add(task)
+        try:
+            await self.flush(key)
+        finally:
+            self.flushing.discard(task)
+    
+    async def flush(self, key, retry: bool = True):
+        """Write one key's buffered taps: events first, then a single upsert"""
+        pending = self.pending.pop(key, None)
+        if pending is None:
+            return
+        
+        user_id, date = key
+        now = datetime.now(timezone.utc)
+        
+        # Everything that awaits MongoDB stays inside the try: the taps are
+        # already out of self.pending and only _requeue puts them back
+        try:
+            update = {
+                "$set": {"updated_at": now},
+                "$setOnInsert": await new_daily_record_fields(user_id, pending["cycle_id"], now)
+            }
+            if pending["value"] is not None:
+                update["$set"]["water_intake"] = pending["value"] + pending["increment"]
+            else:
+                update["$inc"] = {"water_intake": pending["increment"]}
+            
+            if pending["events"]:
+                await db.water_events.insert_many(pending["events"])
+                pending["events"] = []
+            await db.daily_records.update_one({"user_id": user_id, "date": date}, update, upsert=True)
+            forget_user_reads(user_id)
+        except Exception:
+            logger.exception("Water flush failed for %s on %s, will retry", user_id, date)
+            if retry:
+                self._requeue(key, pending)
+    
+    async def overlay(self, user_id: str, date: str, record: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """A daily record as it will read once this worker's buffered taps are flushed"""
+        pending = self.pending.get((user_id, date))
+        if pending is None:
+            return record
+        
+        if record is None:
+            now = datetime.now(timezone.utc)
+            record = {
+                "user_id": user_id,
+                "date": date,
+                **await new_daily_record_fields(user_id, pending["cycle_id"], now),
+                "water_intake": 0,
+                "updated_at": now
+            }
+        if pending["value"] is not None:
+            water_intake = pending["value"] + pending["increment"]
         else:
-            days_since_start = 1
+            water_intake = (record.get("water_intake") or 0) + pending["increment"]
+        return {**record, "water_intake": water_intake}
+    
+    def _requeue(self, key, failed: Dict[str, Any]):
+        """Put a failed batch back, under any taps that arrived meanwhile"""
+        newer = self.pending.get(key)
+        if newer is None:
+            self.pending[key] = failed
+            failed["first_at"] = asyncio.get_running_loop().time()
+            failed["deadline"] = failed["first_at"] + self.max_delay
+            self.timers[key] = asyncio.create_task(self._flush_when_due(key))
+            return
         
-        # Create new daily record
-        new_record = {
-            "user_id": current_user.user_id,
-            "date": today,
-            "day_number": min(days_since_start, 21),
-            "checklist_alimentar": ChecklistAlimentar().model_dump(),
-            "praticas_diarias": PraticasDiarias().model_dump(),
-            "gratidoes": [],
-            "calories_consumed": 0,
+        newer["events"] = failed["events"] + newer["events"]
+        if newer["value"] is None:
+            newer["value"] = failed["value"]
+            newer["increment"] += failed["increment"]
+    
+    async def flush_all(self):
+        """Write everything still buffered (used on shutdown)"""
+        # Flushes already writing finish first; a failed one requeues its taps
+        await asyncio.gather(*list(self.flushing), return_exceptions=True)
+        for timer in list(self.timers.values()):
+            timer.cancel()
+        self.timers.clear()
+        await asyncio.gather(*(self.flush(key, retry=False) for key in list(self.pending)))
+
+water_buffer = WaterWriteBehind(window=0.5, max_delay=2.0)
+
+
+# ============ BOOTSTRAP ENDPOINT ============
+
+@api_router.get("/bootstrap", response_model=Bootstrap)
+async def bootstrap(date: Optional[str] = None, current_user: User = Depends(require_auth)):
+    """Everything the home screen needs in one round trip (date defaults to today, UTC)"""
+    date = date or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    
+    # One authentication, then all reads in parallel
+    goals, daily_record, calories_today, activities_today, records = await asyncio.gather(
+        load_user_goals(current_user.user_id, current_user.active_cycle_id),
+        load_daily_record(current_user.user_id, date),
+        load_today_calories(current_user.user_id),
+        load_today_activities(current_user.user_id),
+        load_cycle_records(current_user.user_id, current_user.active_cycle_id)
+    )
+    
+    return lean_response({
+        "user": current_user.model_dump(),
+        "goals": goals,
+        "daily_record": daily_record,
+        "calories_today": calories_today,
+        "activities_today": activities_today,
+        "daily_records": records,
+        "total_days_completed": len(records)
+    }, Bootstrap)
+
+
+# ============ DELTA SYNC ============
+
+# Writes stamp updated_at before they commit; the watermark trails the read by
+# this margin so a write racing the sync is re-sent instead of skipped
+SYNC_WATERMARK_LAG = timedelta(seconds=5)
+
+async def load_deleted_entries(user_id: str, since: Optional[datetime]) -> List[Dict[str, Any]]:
+    """Entries deleted since the watermark (a full sync has nothing to delete)"""
+    if since is None:
+        return []
+    return await db.deleted_entries.find(
+        {"user_id": user_id, "updated_at": {"$gte": since}},
+        {"_id": 0, "user_id": 0}
+    ).sort("updated_at", 1).to_list(None)
+
+@api_router.get("/sync/changes", response_model=SyncChanges)
+async def get_sync_changes(since: Optional[datetime] = None, current_user: User = Depends(require_auth)):
+    """Documents changed since the watermark of the previous sync (everything when omitted)"""
+    started = datetime.now(timezone.utc)
+    
+    if since is not None and since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    
+    # Served by the (user_id, updated_at) indexes
+    query = {"user_id": current_user.user_id}
+    if since is not None:
+        query["updated_at"] = {"$gte": since}
+    
+    goals, daily_records, food_entries, activity_entries, deleted_entries, daily_summaries = await asyncio.gather(
+        db.user_goals.find_one({**query, "cycle_id": current_user.active_cycle_id}, {"_id": 0}),
+        # Days of the active cycle, and those logged before its goals (no cycle yet)
+        db.daily_records.find(
+            {**query, "cycle_id": {"$in": [current_user.active_cycle_id, None]}}, {"_id": 0}
+        ).sort("updated_at", 1).to_list(None),
+        db.food_entries.find(query, {"_id": 0}).sort("updated_at", 1).to_list(None),
+        db.activity_entries.find(query, {"_id": 0}).sort("updated_at", 1).to_list(None),
+        load_deleted_entries(current_user.user_id, since),
+        # Entries the nightly rollup removed come back as the summary of their day
+        db.daily_summaries.find(query, {"_id": 0}).sort("updated_at", 1).to_list(None)
+    )
+    
+    # The profile is already loaded by authentication
+    profile_changed_at = current_user.updated_at or current_user.created_at
+    if profile_changed_at.tzinfo is None:
+        profile_changed_at = profile_changed_at.replace(tzinfo=timezone.utc)
+    profile = current_user.model_dump() if since is None or profile_changed_at >= since else None
+    
+    return lean_response({
+        "watermark": started - SYNC_WATERMARK_LAG,
+        "profile": profile,
+        "goals": goals,
+        "daily_records": daily_records,
+        "food_entries": food_entries,
+        "activity_entries": activity_entries,
+        "deleted_entries": deleted_entries,
+        "daily_summaries": daily_summaries
+    }, SyncChanges)
+
+
+# ============ BACKGROUND JOBS ============
+
+background_tasks: set = set()
+
+def spawn(coro) -> asyncio.Task:
+    """Run a coroutine detached from the request, keeping a reference until it finishes"""
+    # A fresh context so the job does not inherit the request's MongoDB deadline
+    task = asyncio.create_task(coro, context=contextvars.Context())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def update_job(job_id: str, **fields):
+    """Record job progress so clients can poll it"""
+    fields["updated_at"] = datetime.now(timezone.utc)
+    await db.jobs.update_one({"job_id": job_id}, {"$set": fields})
+
+# Recalculation in flight per user; a newer weight supersedes an older run
+_recalculation_tasks: Dict[str, asyncio.Task] = {}
+
+async def start_calories_burned_recalculation(user_id: str, weight_kg: float) -> Dict[str, Any]:
+    """Queue a recalculation of the user's past activity calories for a new weight"""
+    now = datetime.now(timezone.utc)
+    job = {
+        "job_id": f"job_{uuid.uuid4().hex[:12]}",
+        "user_id": user_id,
+        "kind": "recalculate_calories_burned",
+        "status": "pending",
+        "total": 0,
+        "processed": 0,
+        "created_at": now,
+        "updated_at": now
+    }
+    await db.jobs.insert_one(job)
+    
+    previous = _recalculation_tasks.get(user_id)
+    if previous and not previous.done():
+        previous.cancel()
+    
+    task = spawn(recalculate_calories_burned(job["job_id"], user_id, weight_kg))
+    _recalculation_tasks[user_id] = task
+    
+    def forget(finished: asyncio.Task):
+        if _recalculation_tasks.get(user_id) is finished:
+            del _recalculation_tasks[user_id]
+    
+    task.add_done_callback(forget)
+    
+    return job
+
+def activity_calories(rows: List[Dict[str, Any]], weight_kg: float) -> np.ndarray:
+    """calories_burned of activity entries (or rolled-up groups) at weight_kg, in one pass
+    
+    MET * intensity factor * weight(kg) * time(hours), one array op per term;
+    same operation order as calculate_calories_burned so results match exactly.
+    Activities no longer in the catalog keep their recorded value.
+    """
+    met_values = np.array([
+        catalog_cache.activities_by_id.get(row["activity_id"], {}).get("met_value", np.nan)
+        for row in rows
+    ], dtype=float)
+    factors = np.array([INTENSITY_FACTORS.get(row["intensity"], 1.0) for row in rows], dtype=float)
+    minutes = np.array([row["duration"] for row in rows], dtype=float)
+    previous = np.array([row["calories_burned"] for row in rows], dtype=float)
+    
+    computed = np.trunc((met_values * factors) * weight_kg * minutes / 60)
+    return np.where(np.isnan(computed), previous, computed).astype(np.int64)
+
+RECALCULATION_BATCH = 500
+
+async def recalculate_calories_burned(job_id: str, user_id: str, weight_kg: float):
+    """Re-derive calories_burned of every activity entry, rolled-up day and daily total in bulk"""
+    try:
+        await update_job(job_id, status="running")
+        await catalog_cache.ensure_loaded()
+        
+        async def apply(session):
+            # Read and written in one transaction (replica sets), and daily totals
+            # move by $inc: activities logged meanwhile keep their calories
+            entries = await db.activity_entries.find(
+                {"user_id": user_id},
+                {"_id": 1, "date": 1, "activity_id": 1, "duration": 1, "intensity": 1, "calories_burned": 1},
+                session=session
+            ).to_list(None)
+            summaries = await db.daily_summaries.find(
+                {"user_id": user_id, "activities.0": {"$exists": True}},
+                {"_id": 0, "date": 1, "calories_burned": 1, "activities": 1},
+                session=session
+            ).to_list(None)
+            now = datetime.now(timezone.utc)
+            # As MongoDB stores it, so the entries written below can be found by it
+            now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+            day_deltas: Dict[str, int] = {}
+            total = len(entries) + len(summaries)
+            await update_job(job_id, total=total, processed=0)
+            
+            calories = activity_calories(entries, weight_kg)
+            differs = calories != [entry["calories_burned"] for entry in entries]
+            changed = 0
+            for start in range(0, len(entries), RECALCULATION_BATCH):
+                batch = (np.flatnonzero(differs[start:start + RECALCULATION_BATCH]) + start).tolist()
+                if batch:
+                    result = await db.activity_entries.bulk_write([
+                        UpdateOne(
+                            {"_id": entries[i]["_id"], "calories_burned": entries[i]["calories_burned"]},
+                            {"$set": {"calories_burned": int(calories[i]), "updated_at": now}}
+                        )
+                        for i in batch
+                    ], ordered=False, session=session)
+                    if result.matched_count < len(batch):
+                        # Edited meanwhile (no transaction): the edit already moved the daily total
+                        written = {
+                            entry["_id"] for entry in await db.activity_entries.find(
+                                {"$or": [
+                                    {"_id": entries[i]["_id"], "calories_burned": int(calories[i]), "updated_at": now}
+                                    for i in batch
+                                ]},
+                                {"_id": 1},
+                                session=session
+                            ).to_list(None)
+                        }
+                        batch = [i for i in batch if entries[i]["_id"] in written]
+                    for i in batch:
+                        date = entries[i]["date"]
+                        day_deltas[date] = day_deltas.get(date, 0) + int(calories[i]) - entries[i]["calories_burned"]
+                    changed += len(batch)
+                await update_job(job_id, processed=min(start + RECALCULATION_BATCH, len(entries)))
+            
+            # Rolled-up days keep the inputs of their calories, grouped
+            summary_updates = []
+            for summary in summaries:
+                groups = summary["activities"]
+                group_calories = activity_calories(groups, weight_kg)
+                groups = [{**group, "calories_burned": int(value)} for group, value in zip(groups, group_calories)]
+                burned = sum(group["calories_burned"] * group["entries"] for group in groups)
+                if burned == summary["calories_burned"] and groups == summary["activities"]:
+                    continue
+                day_deltas[summary["date"]] = day_deltas.get(summary["date"], 0) + burned - summary["calories_burned"]
+                summary_updates.append(UpdateOne(
+                    {"user_id": user_id, "date": summary["date"]},
+                    {"$set": {
+                        "activities": groups,
+                        "by_activity_category": category_totals(groups),
+                        "calories_burned": burned,
+                        "updated_at": now
+                    }}
+                ))
+            if summary_updates:
+                await db.daily_summaries.bulk_write(summary_updates, ordered=False, session=session)
+            
+            day_updates = [
+                UpdateOne(
+                    {"user_id": user_id, "date": date},
+                    {"$inc": {"calories_burned": delta}, "$set": {"updated_at": now}}
+                )
+                for date, delta in day_deltas.items() if delta
+            ]
+            if day_updates:
+                await db.daily_records.bulk_write(day_updates, ordered=False, session=session)
+            return total, changed + len(summary_updates)
+        
+        processed, changed = await in_transaction(apply, enabled=not timeseries_entries())
+        forget_user_reads(user_id)
+        
+        await update_job(job_id, status="completed", processed=processed)
+        logger.info("Recalculated %d activity entries and summaries for %s (%d changed)", processed, user_id, changed)
+    except asyncio.CancelledError:
+        await asyncio.shield(update_job(job_id, status="superseded"))
+        raise
+    except Exception as e:
+        logger.exception("Recalculation job %s failed", job_id)
+        await update_job(job_id, status="failed", error=str(e))
+
+
+# ============ ENTRY ROLLUP ============
+
+# Days of one user rolled up per batch (one read, one summary write and one delete per collection)
+ROLLUP_BATCH_DAYS = 31
+ROLLUP_LOCK_TTL = timedelta(hours=1)
+
+def day_summaries(
+    user_id: str,
+    food_entries: List[Dict[str, Any]],
+    activity_entries: List[Dict[str, Any]],
+    now: datetime
+) -> List[Dict[str, Any]]:
+    """daily_summaries documents: nutrients per meal and calories burned per activity category"""
+    nutrients = nutrient_totals(food_entries, catalog_cache.food_rows, catalog_cache.food_macros)
+    empty = nutrient_dict(np.zeros(len(NUTRIENTS)))
+    summaries: Dict[str, Dict[str, Any]] = {}
+    
+    def summary(date: str) -> Dict[str, Any]:
+        return summaries.setdefault(date, {
+            "user_id": user_id,
+            "date": date,
+            "totals": empty,
+            "by_meal": {meal: empty for meal in MEAL_TYPES},
+            "food_entry_count": 0,
             "calories_burned": 0,
-            "water_intake": water_ml,
-            "created_at": datetime.now(timezone.utc),
-            "updated_at": datetime.now(timezone.utc)
-        }
-        await db.daily_records.insert_one(new_record)
-    else:
-        await db.daily_records.update_one(
-            {"user_id": current_user.user_id, "date": today},
-            {"$set": {"water_intake": water_ml, "updated_at": datetime.now(timezone.utc)}}
+            "by_activity_category": {},
+            "activity_entry_count": 0,
+            "activities": [],
+            "updated_at": now
+        })
+    
+    for day in nutrients["days"]:
+        summary(day["date"]).update(totals=day["totals"], by_meal=day["by_meal"])
+    for entry in food_entries:
+        summary(entry["date"])["food_entry_count"] += 1
+    
+    # Entries with identical inputs collapse into one group, which keeps enough
+    # to recompute their calories after a weight change
+    groups: Dict[tuple, Dict[str, Any]] = {}
+    for entry in activity_entries:
+        key = (entry["date"], entry["activity_id"], entry["intensity"], entry["duration"], entry["calories_burned"])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "activity_id": entry["activity_id"],
+                "intensity": entry["intensity"],
+                "duration": entry["duration"],
+                "calories_burned": entry["calories_burned"],
+                "entries": 0
+            }
+            summary(entry["date"])["activities"].append(group)
+        group["entries"] += 1
+    
+    for day in summaries.values():
+        day["by_activity_category"] = category_totals(day["activities"])
+        day["calories_burned"] = sum(group["calories_burned"] * group["entries"] for group in day["activities"])
+        day["activity_entry_count"] = sum(group["entries"] for group in day["activities"])
+    
+    return list(summaries.values())
+
+def category_totals(groups: List[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+    """by_activity_category of a summary, from its activity groups"""
+    totals: Dict[str, Dict[str, int]] = {}
+    for group in groups:
+        activity = catalog_cache.activities_by_id.get(group["activity_id"], {})
+        category = totals.setdefault(
+            activity.get("category", "outros"), {"calories_burned": 0, "duration": 0, "entries": 0}
         )
+        category["calories_burned"] += group["calories_burned"] * group["entries"]
+        category["duration"] += group["duration"] * group["entries"]
+        category["entries"] += group["entries"]
+    return totals
+
+def with_summaries(nutrients: Dict[str, Any], summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold rolled-up days into nutrient_totals output"""
+    if not summaries:
+        return nutrients
     
-    return {"water_intake": water_ml}
+    days = {day["date"]: day for day in nutrients["days"]}
+    for summary in summaries:
+        # A summary covers every row of its day, including any a rollup left behind
+        days[summary["date"]] = {key: summary[key] for key in ("date", "totals", "by_meal")}
+    
+    ordered = [days[date] for date in sorted(days)]
+    totals = np.array([[day["totals"][field] for field in NUTRIENTS] for day in ordered]).sum(axis=0)
+    return {"totals": nutrient_dict(totals), "days": ordered}
+
+class EntryRollup:
+    """Nightly compaction of old food and activity entries into per-day summaries
+    
+    Past days never change, so a day is summarized once from its raw rows,
+    which are then deleted (or archived). Days that already have a summary
+    were interrupted mid-delete: their leftover rows are removed without being
+    counted again.
+    """
+    
+    def __init__(self):
+        self.last_run: Optional[Dict[str, Any]] = None
+    
+    def stats(self) -> Optional[Dict[str, Any]]:
+        return self.last_run
+    
+    async def schedule(self):
+        """Run once a night at ROLLUP_HOUR_UTC, forever"""
+        while True:
+            settings = get_settings()
+            now = datetime.now(timezone.utc)
+            next_run = now.replace(hour=settings.rollup_hour_utc, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            await asyncio.sleep((next_run - now).total_seconds())
+            
+            try:
+                if settings.rollup_after_days > 0:
+                    await self.run(settings.rollup_after_days, settings.rollup_archive)
+                if settings.cycle_archive_after_days > 0:
+                    await archive_completed_cycles(settings.cycle_archive_after_days)
+            except Exception:
+                logger.exception("Nightly compaction failed")
+    
+    async def run(self, after_days: int, archive: bool = False) -> Optional[Dict[str, Any]]:
+        """Roll up entries older than after_days for every user, once per day across workers"""
+        now = datetime.now(timezone.utc)
+        today = now.strftime("%Y-%m-%d")
+        
+        owner = await acquire_lock("entry_rollup", ROLLUP_LOCK_TTL)
+        if not owner:
+            logger.info("Entry rollup already running in another worker")
+            return None
+        
+        try:
+            meta = await db.metadata.find_one({"_id": "entry_rollup"}) or {}
+            if meta.get("last_run_date") == today:
+                return None
+            
+            cutoff = (now - timedelta(days=after_days)).strftime("%Y-%m-%d")
+            await catalog_cache.ensure_loaded()
+            
+            started = time.perf_counter()
+            stats = {"cutoff": cutoff, "users": 0, "days": 0, "food_entries": 0, "activity_entries": 0}
+            for user_id in await db.users.distinct("user_id"):
+                await self.roll_up_user(user_id, cutoff, archive, stats)
+            
+            elapsed = time.perf_counter() - started
+            rows = stats["food_entries"] + stats["activity_entries"]
+            stats.update(seconds=round(elapsed, 3), rows_per_s=round(rows / elapsed) if elapsed else 0, finished_at=now)
+            
+            await db.metadata.update_one(
+                {"_id": "entry_rollup"},
+                {"$set": {"last_run_date": today, "last_run": stats}},
+                upsert=True
+            )
+            self.last_run = stats
+            logger.info(
+                "Rolled up %d days of %d users before %s: %d food and %d activity entries in %.1fs (%d rows/s)",
+                stats["days"], stats["users"], cutoff, stats["food_entries"], stats["activity_entries"],
+                elapsed, stats["rows_per_s"]
+            )
+            return stats
+        finally:
+            await release_lock("entry_rollup", owner)
+    
+    async def roll_up_user(self, user_id: str, cutoff: str, archive: bool, stats: Dict[str, Any]):
+        old = {"user_id": user_id, "date": {"$lt": cutoff}}
+        if timeseries_entries():
+            old["created_at"] = {"$lt": datetime.strptime(cutoff, "%Y-%m-%d").replace(tzinfo=timezone.utc)}
+        food_dates, activity_dates = await asyncio.gather(
+            db.food_entries.distinct("date", old),
+            db.activity_entries.distinct("date", old)
+        )
+        dates = sorted(set(food_dates) | set(activity_dates))
+        if not dates:
+            return
+        
+        stats["users"] += 1
+        for start in range(0, len(dates), ROLLUP_BATCH_DAYS):
+            await self.roll_up_days(user_id, dates[start:start + ROLLUP_BATCH_DAYS], archive, stats)
+    
+    async def roll_up_days(self, user_id: str, dates: List[str], archive: bool, stats: Dict[str, Any]):
+        query = {"user_id": user_id, "date": {"$in": dates}}
+        food_entries, activity_entries, summarized = await asyncio.gather(
+            db.food_entries.find(query).to_list(None),
+            db.activity_entries.find(query).to_list(None),
+            db.daily_summaries.distinct("date", query)
+        )
+        
+        summarized = set(summarized)
+        summaries = day_summaries(
+            user_id,
+            [entry for entry in food_entries if entry["date"] not in summarized],
+            [entry for entry in activity_entries if entry["date"] not in summarized],
+            datetime.now(timezone.utc)
+        )
+        if summaries:
+            await db.daily_summaries.bulk_write([
+                UpdateOne({"user_id": user_id, "date": summary["date"]}, {"$set": summary}, upsert=True)
+                for summary in summaries
+            ], ordered=False)
+        
+        for collection_name, rows in (("food_entries", food_entries), ("activity_entries", activity_entries)):
+            if not rows:
+                continue
+            if archive:
+                # Replaces are idempotent should a previous run have archived part of the batch
+                await db[f"{collection_name}_archive"].bulk_write(
+                    [ReplaceOne({"_id": row["_id"]}, row, upsert=True) for row in rows], ordered=False
+                )
+            await db[collection_name].delete_many({"_id": {"$in": [row["_id"] for row in rows]}})
+            stats[collection_name] += len(rows)
+        
+        stats["days"] += len(dates)
+        forget_user_reads(user_id)
+
+entry_rollup = EntryRollup()
 
 
-# ============ SEED DATA ON STARTUP ============
+# ============ CATALOG SYNC ON STARTUP ============
 
-@app.on_event("startup")
-async def seed_database():
-    """Seed foods and activities data"""
-    # Check if already seeded
-    foods_count = await db.foods.count_documents({})
-    activities_count = await db.activities.count_documents({})
+# Catálogo versionado (alimentos e atividades) mantido em arquivo de dados
+CATALOG_FILE = ROOT_DIR / 'catalog.json'
+CATALOG_LOCK_TTL = timedelta(minutes=5)
+
+# Collection name -> natural key of each catalog item
+CATALOG_COLLECTIONS = {
+    "foods": "food_id",
+    "activities": "activity_id",
+}
+
+def content_hash(value: Any) -> str:
+    """Stable SHA-256 of a JSON-serializable value"""
+    payload = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def load_catalog() -> Dict[str, Any]:
+    """Read the versioned catalog data file"""
+    with open(CATALOG_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+async def acquire_lock(name: str, ttl: timedelta) -> Optional[str]:
+    """Take a named lock shared by all workers, returning an owner token or None if it is held"""
+    owner = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    
+    # The filter only matches an expired lock; if a live one exists the upsert
+    # collides on _id and we know another worker owns it
+    try:
+        await db.locks.update_one(
+            {"_id": name, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "acquired_at": now, "expires_at": now + ttl}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return None
+    
+    return owner
+
+async def release_lock(name: str, owner: str):
+    """Release a lock taken with acquire_lock"""
+    await db.locks.delete_one({"_id": name, "owner": owner})
+
+async def sync_catalog():
+    """Bring foods and activities in line with the catalog data file"""
+    catalog = load_catalog()
+    catalog_hash = content_hash(catalog)
     
-    if foods_count > 0 and activities_count > 0:
-        logger.info("Database already seeded")
+    # Fast path: a single point read when nothing changed
+    meta = await db.metadata.find_one({"_id": "catalog"}, {"hash": 1})
+    if meta and meta.get("hash") == catalog_hash:
+        logger.info("Catalog v%s already in sync", catalog["version"])
         return
     
-    # Seed foods
-    foods_data = [
-        # Frutas (20 itens)
-        {"food_id": "f001", "name": "Maçã", "category": "Frutas", "calories_per_100g": 52, "detox_friendly": True},
-        {"food_id": "f002", "name": "Banana", "category": "Frutas", "calories_per_100g": 89, "detox_friendly": True},
-        {"food_id": "f003", "name": "Melancia", "category": "Frutas", "calories_per_100g": 30, "detox_friendly": True},
-        {"food_id": "f004", "name": "Morango", "category": "Frutas", "calories_per_100g": 32, "detox_friendly": True},
-        {"food_id": "f005", "name": "Mamão", "category": "Frutas", "calories_per_100g": 43, "detox_friendly": True},
-        {"food_id": "f006", "name": "Abacaxi", "category": "Frutas", "calories_per_100g": 50, "detox_friendly": True},
-        {"food_id": "f007", "name": "Laranja", "category": "Frutas", "calories_per_100g": 47, "detox_friendly": True},
-        {"food_id": "f008", "name": "Uva", "category": "Frutas", "calories_per_100g": 69, "detox_friendly": True},
-        {"food_id": "f009", "name": "Manga", "category": "Frutas", "calories_per_100g": 60, "detox_friendly": True},
-        {"food_id": "f010", "name": "Pera", "category": "Frutas", "calories_per_100g": 57, "detox_friendly": True},
-        {"food_id": "f011", "name": "Kiwi", "category": "Frutas", "calories_per_100g": 61, "detox_friendly": True},
-        {"food_id": "f012", "name": "Abacate", "category": "Frutas", "calories_per_100g": 160, "detox_friendly": True},
-        {"food_id": "f013", "name": "Melão", "category": "Frutas", "calories_per_100g": 34, "detox_friendly": True},
-        {"food_id": "f014", "name": "Goiaba", "category": "Frutas", "calories_per_100g": 68, "detox_friendly": True},
-        {"food_id": "f015", "name": "Ameixa", "category": "Frutas", "calories_per_100g": 46, "detox_friendly": True},
-        {"food_id": "f016", "name": "Pêssego", "category": "Frutas", "calories_per_100g": 39, "detox_friendly": True},
-        {"food_id": "f017", "name": "Caqui", "category": "Frutas", "calories_per_100g": 70, "detox_friendly": True},
-        {"food_id": "f018", "name": "Framboesa", "category": "Frutas", "calories_per_100g": 52, "detox_friendly": True},
-        {"food_id": "f019", "name": "Mirtilo", "category": "Frutas", "calories_per_100g": 57, "detox_friendly": True},
-        {"food_id": "f020", "name": "Cereja", "category": "Frutas", "calories_per_100g": 50, "detox_friendly": True},
+    owner = await acquire_lock("catalog_sync", CATALOG_LOCK_TTL)
+    if not owner:
+        logger.info("Catalog sync already running in another worker")
+        return
+    
+    try:
+        # Re-check under the lock, another worker may have just finished
+        meta = await db.metadata.find_one({"_id": "catalog"}) or {}
+        if meta.get("hash") == catalog_hash:
+            return
         
-        # Verduras e Legumes (20 itens)
-        {"food_id": "v001", "name": "Alface", "category": "Verduras", "calories_per_100g": 15, "detox_friendly": True},
-        {"food_id": "v002", "name": "Couve", "category": "Verduras", "calories_per_100g": 33, "detox_friendly": True},
-        {"food_id": "v003", "name": "Brócolis", "category": "Verduras", "calories_per_100g": 34, "detox_friendly": True},
-        {"food_id": "v004", "name": "Espinafre", "category": "Verduras", "calories_per_100g": 23, "detox_friendly": True},
-        {"food_id": "v005", "name": "Tomate", "category": "Verduras", "calories_per_100g": 18, "detox_friendly": True},
-        {"food_id": "v006", "name": "Cenoura", "category": "Verduras", "calories_per_100g": 41, "detox_friendly": True},
-        {"food_id": "v007", "name": "Pepino", "category": "Verduras", "calories_per_100g": 15, "detox_friendly": True},
-        {"food_id": "v008", "name": "Beterraba", "category": "Verduras", "calories_per_100g": 43, "detox_friendly": True},
-        {"food_id": "v009", "name": "Abobrinha", "category": "Verduras", "calories_per_100g": 17, "detox_friendly": True},
-        {"food_id": "v010", "name": "Berinjela", "category": "Verduras", "calories_per_100g": 25, "detox_friendly": True},
-        {"food_id": "v011", "name": "Pimentão", "category": "Verduras", "calories_per_100g": 20, "detox_friendly": True},
-        {"food_id": "v012", "name": "Rúcula", "category": "Verduras", "calories_per_100g": 25, "detox_friendly": True},
-        {"food_id": "v013", "name": "Agrião", "category": "Verduras", "calories_per_100g": 11, "detox_friendly": True},
-        {"food_id": "v014", "name": "Repolho", "category": "Verduras", "calories_per_100g": 25, "detox_friendly": True},
-        {"food_id": "v015", "name": "Couve-flor", "category": "Verduras", "calories_per_100g": 25, "detox_friendly": True},
-        {"food_id": "v016", "name": "Rabanete", "category": "Verduras", "calories_per_100g": 16, "detox_friendly": True},
-        {"food_id": "v017", "name": "Nabo", "category": "Verduras", "calories_per_100g": 28, "detox_friendly": True},
-        {"food_id": "v018", "name": "Vagem", "category": "Verduras", "calories_per_100g": 31, "detox_friendly": True},
-        {"food_id": "v019", "name": "Aspargo", "category": "Verduras", "calories_per_100g": 20, "detox_friendly": True},
-        {"food_id": "v020", "name": "Acelga", "category": "Verduras", "calories_per_100g": 19, "detox_friendly": True},
+        applied_items = meta.get("items", {})
+        item_hashes = {}
         
-        # Grãos sem glúten (10 itens)
-        {"food_id": "g001", "name": "Arroz Integral", "category": "Grãos", "calories_per_100g": 111, "detox_friendly": True},
-        {"food_id": "g002", "name": "Quinoa", "category": "Grãos", "calories_per_100g": 120, "detox_friendly": True},
-        {"food_id": "g003", "name": "Amaranto", "category": "Grãos", "calories_per_100g": 102, "detox_friendly": True},
-        {"food_id": "g004", "name": "Batata Doce", "category": "Grãos", "calories_per_100g": 86, "detox_friendly": True},
-        {"food_id": "g005", "name": "Mandioca", "category": "Grãos", "calories_per_100g": 160, "detox_friendly": True},
-        {"food_id": "g006", "name": "Inhame", "category": "Grãos", "calories_per_100g": 118, "detox_friendly": True},
-        {"food_id": "g007", "name": "Aveia sem Glúten", "category": "Grãos", "calories_per_100g": 389, "detox_friendly": True},
-        {"food_id": "g008", "name": "Tapioca", "category": "Grãos", "calories_per_100g": 358, "detox_friendly": True},
-        {"food_id": "g009", "name": "Polenta", "category": "Grãos", "calories_per_100g": 70, "detox_friendly": True},
-        {"food_id": "g010", "name": "Feijão", "category": "Grãos", "calories_per_100g": 127, "detox_friendly": True},
+        for collection_name, key in CATALOG_COLLECTIONS.items():
+            previous = applied_items.get(collection_name, {})
+            current = {item[key]: content_hash(item) for item in catalog[collection_name]}
+            
+            # Only items whose content changed since the last applied version
+            operations = [
+                ReplaceOne({key: item[key]}, food_document(item) if collection_name == "foods" else item, upsert=True)
+                for item in catalog[collection_name]
+                if previous.get(item[key]) != current[item[key]]
+            ]
+            
+            # Items dropped from the file; anything never seeded from it is left alone
+            removed = [item_id for item_id in previous if item_id not in current]
+            if removed:
+                operations.append(DeleteMany({key: {"$in": removed}}))
+            
+            if operations:
+                result = await db[collection_name].bulk_write(operations, ordered=False)
+                logger.info(
+                    "Catalog %s: %d upserted, %d updated, %d removed",
+                    collection_name,
+                    result.upserted_count,
+                    result.modified_count,
+                    result.deleted_count
+                )
+            
+            item_hashes[collection_name] = current
         
-        # Proteínas naturais (15 itens)
-        {"food_id": "p001", "name": "Peito de Frango Grelhado", "category": "Proteínas", "calories_per_100g": 165, "detox_friendly": True},
-        {"food_id": "p002", "name": "Peixe Grelhado (Tilápia)", "category": "Proteínas", "calories_per_100g": 96, "detox_friendly": True},
-        {"food_id": "p003", "name": "Salmão", "category": "Proteínas", "calories_per_100g": 208, "detox_friendly": True},
-        {"food_id": "p004", "name": "Ovo Cozido", "category": "Proteínas", "calories_per_100g": 155, "detox_friendly": True},
-        {"food_id": "p005", "name": "Atum", "category": "Proteínas", "calories_per_100g": 144, "detox_friendly": True},
-        {"food_id": "p006", "name": "Peru", "category": "Proteínas", "calories_per_100g": 135, "detox_friendly": True},
-        {"food_id": "p007", "name": "Tofu", "category": "Proteínas", "calories_per_100g": 76, "detox_friendly": True},
-        {"food_id": "p008", "name": "Lentilha", "category": "Proteínas", "calories_per_100g": 116, "detox_friendly": True},
-        {"food_id": "p009", "name": "Grão de Bico", "category": "Proteínas", "calories_per_100g": 164, "detox_friendly": True},
-        {"food_id": "p010", "name": "Ervilha", "category": "Proteínas", "calories_per_100g": 81, "detox_friendly": True},
-        {"food_id": "p011", "name": "Sardinha", "category": "Proteínas", "calories_per_100g": 208, "detox_friendly": True},
-        {"food_id": "p012", "name": "Camarão", "category": "Proteínas", "calories_per_100g": 99, "detox_friendly": True},
-        {"food_id": "p013", "name": "Cottage Cheese", "category": "Proteínas", "calories_per_100g": 98, "detox_friendly": True},
-        {"food_id": "p014", "name": "Ricota", "category": "Proteínas", "calories_per_100g": 174, "detox_friendly": True},
-        {"food_id": "p015", "name": "Cogumelo", "category": "Proteínas", "calories_per_100g": 22, "detox_friendly": True},
+        await db.metadata.update_one(
+            {"_id": "catalog"},
+            {
+                "$set": {
+                    "version": catalog["version"],
+                    "hash": catalog_hash,
+                    "items": item_hashes,
+                    "updated_at": datetime.now(timezone.utc)
+                }
+            },
+            upsert=True
+        )
+        logger.info("Catalog synced to v%s", catalog["version"])
+    finally:
+        await release_lock("catalog_sync", owner)
+
+
+# ============ DATA MIGRATIONS ============
+
+async def backfill_updated_at():
+    """Stamp documents written before updated_at was maintained with their created_at"""
+    await asyncio.gather(*(
+        db[collection_name].update_many(
+            {"updated_at": {"$exists": False}},
+            [{"$set": {"updated_at": "$created_at"}}]
+        )
+        for collection_name in ("users", "user_goals", "final_reflections", "food_entries", "activity_entries")
+    ))
+
+async def backfill_food_search_names():
+    """Give foods stored before search_name existed their search key"""
+    foods = await db.foods.find({"search_name": {"$exists": False}}, {"food_id": 1, "name": 1}).to_list(None)
+    if foods:
+        await db.foods.bulk_write([
+            UpdateOne({"_id": food["_id"]}, {"$set": {"search_name": search_key(food["name"])}})
+            for food in foods
+        ], ordered=False)
+
+async def backfill_food_search_tokens():
+    """Give foods stored before search_tokens existed their search words"""
+    foods = await db.foods.find({"search_tokens": {"$exists": False}}, {"food_id": 1, "name": 1}).to_list(None)
+    if foods:
+        await db.foods.bulk_write([
+            UpdateOne({"_id": food["_id"]}, {"$set": food_document({"name": food["name"]})})
+            for food in foods
+        ], ordered=False)
+
+async def backfill_entry_ids():
+    """Give entries stored before entry_id existed a stable id derived from their _id"""
+    await asyncio.gather(*(
+        db[collection_name].update_many(
+            {"entry_id": {"$exists": False}},
+            [{"$set": {"entry_id": {"$concat": [prefix, {"$toString": "$_id"}]}}}]
+        )
+        for collection_name, prefix in (("food_entries", "fe_"), ("activity_entries", "ae_"))
+    ))
+
+async def backfill_cycle_ids():
+    """Make each user's single challenge run their first cycle"""
+    goals, reflections = await asyncio.gather(
+        db.user_goals.find({"cycle_id": {"$exists": False}}, {"user_id": 1}).to_list(None),
+        db.final_reflections.find({}, {"user_id": 1, "cycle_id": 1}).to_list(None)
+    )
+    
+    # Archived cycles already have an id, stamped on their reflection
+    cycles = {reflection["user_id"]: reflection["cycle_id"] for reflection in reflections if reflection.get("cycle_id")}
+    for document in goals + reflections:
+        cycles.setdefault(document["user_id"], f"cycle_{document['_id']}")
+    if not cycles:
+        return
+    
+    now = datetime.now(timezone.utc)
+    
+    def stamp(field: str = "cycle_id"):
+        return [
+            UpdateMany({"user_id": user_id, field: {"$exists": False}}, {"$set": {field: cycle_id, "updated_at": now}})
+            for user_id, cycle_id in cycles.items()
+        ]
+    
+    await asyncio.gather(
+        db.user_goals.bulk_write(stamp(), ordered=False),
+        db.daily_records.bulk_write(stamp(), ordered=False),
+        db.final_reflections.bulk_write(stamp(), ordered=False),
+        db.users.bulk_write(stamp("active_cycle_id"), ordered=False)
+    )
+
+async def adopt_unassigned_daily_records():
+    """Give daily records written before their user had goals to the user's active cycle"""
+    user_ids = await db.daily_records.distinct("user_id", {"cycle_id": None})
+    if not user_ids:
+        return
+    
+    users = await db.users.find(
+        {"user_id": {"$in": user_ids}, "active_cycle_id": {"$ne": None}},
+        {"_id": 0, "user_id": 1, "active_cycle_id": 1}
+    ).to_list(None)
+    now = datetime.now(timezone.utc)
+    if users:
+        await db.daily_records.bulk_write([
+            UpdateMany(
+                {"user_id": user["user_id"], "cycle_id": None},
+                {"$set": {"cycle_id": user["active_cycle_id"], "updated_at": now}}
+            )
+            for user in users
+        ], ordered=False)
+
+# Applied once per database, in order; never rename an entry once released
+MIGRATIONS = [
+    ("backfill_updated_at", backfill_updated_at),
+    ("backfill_food_search_names", backfill_food_search_names),
+    ("backfill_food_search_tokens", backfill_food_search_tokens),
+    ("backfill_entry_ids", backfill_entry_ids),
+    ("backfill_cycle_ids", backfill_cycle_ids),
+    ("adopt_unassigned_daily_records", adopt_unassigned_daily_records),
+]
+
+async def run_migrations():
+    """Apply pending data migrations, one worker at a time"""
+    names = [name for name, _ in MIGRATIONS]
+    meta = await db.metadata.find_one({"_id": "migrations"}) or {}
+    if set(names) <= set(meta.get("applied", [])):
+        return
+    
+    owner = await acquire_lock("migrations", CATALOG_LOCK_TTL)
+    if not owner:
+        logger.info("Migrations already running in another worker")
+        return
+    
+    try:
+        meta = await db.metadata.find_one({"_id": "migrations"}) or {}
+        applied = set(meta.get("applied", []))
         
-        # Sucos detox (10 itens)
-        {"food_id": "s001", "name": "Suco Verde (Couve, Limão, Maçã)", "category": "Sucos", "calories_per_100g": 45, "detox_friendly": True},
-        {"food_id": "s002", "name": "Suco de Melancia", "category": "Sucos", "calories_per_100g": 30, "detox_friendly": True},
-        {"food_id": "s003", "name": "Suco de Laranja Natural", "category": "Sucos", "calories_per_100g": 45, "detox_friendly": True},
-        {"food_id": "s004", "name": "Suco Detox (Pepino, Hortelã, Limão)", "category": "Sucos", "calories_per_100g": 20, "detox_friendly": True},
-        {"food_id": "s005", "name": "Água de Coco", "category": "Sucos", "calories_per_100g": 19, "detox_friendly": True},
-        {"food_id": "s006", "name": "Suco de Abacaxi com Hortelã", "category": "Sucos", "calories_per_100g": 50, "detox_friendly": True},
-        {"food_id": "s007", "name": "Suco de Beterraba", "category": "Sucos", "calories_per_100g": 43, "detox_friendly": True},
-        {"food_id": "s008", "name": "Suco de Cenoura", "category": "Sucos", "calories_per_100g": 40, "detox_friendly": True},
-        {"food_id": "s009", "name": "Limonada Natural", "category": "Sucos", "calories_per_100g": 25, "detox_friendly": True},
-        {"food_id": "s010", "name": "Chá Verde Gelado", "category": "Sucos", "calories_per_100g": 1, "detox_friendly": True},
+        for name, migration in MIGRATIONS:
+            if name in applied:
+                continue
+            await timed_stage(f"migration:{name}", migration())
+            await db.metadata.update_one(
+                {"_id": "migrations"},
+                {"$addToSet": {"applied": name}},
+                upsert=True
+            )
+    finally:
+        await release_lock("migrations", owner)
+
+
+# ============ APP STARTUP ============
+
+# Índices usados pelas consultas dos endpoints
+INDEXES = {
+    "users": [IndexModel([("user_id", ASCENDING)], unique=True), IndexModel([("email", ASCENDING)])],
+    "user_sessions": [IndexModel([("session_token", ASCENDING)])],
+    "activation_codes": [IndexModel([("code", ASCENDING)])],
+    "user_goals": [
+        IndexModel([("user_id", ASCENDING), ("cycle_id", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)]),
+    ],
+    "daily_records": [
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("cycle_id", ASCENDING), ("day_number", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)]),
+    ],
+    "final_reflections": [IndexModel([("user_id", ASCENDING), ("cycle_id", ASCENDING)])],
+    "cycle_archives": [
+        IndexModel([("cycle_id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("completed_at", ASCENDING)]),
+    ],
+    "food_entries": [
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("entry_id", ASCENDING)]),
+    ],
+    "activity_entries": [
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)]),
+        IndexModel([("user_id", ASCENDING), ("entry_id", ASCENDING)]),
+    ],
+    "deleted_entries": [IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)])],
+    "water_events": [IndexModel([("user_id", ASCENDING), ("date", ASCENDING)])],
+    "daily_summaries": [
+        IndexModel([("user_id", ASCENDING), ("date", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("updated_at", ASCENDING)]),
+    ],
+    "user_food_stats": [IndexModel([("user_id", ASCENDING)], unique=True)],
+    "meal_templates": [
+        IndexModel([("template_id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING)]),
+    ],
+    "jobs": [
+        IndexModel([("job_id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("kind", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "foods": [
+        IndexModel([("food_id", ASCENDING)], unique=True),
+        IndexModel([("category", ASCENDING)]),
+        IndexModel([("search_name", ASCENDING)]),
+        IndexModel([("search_tokens", ASCENDING)])
+    ],
+    "activities": [IndexModel([("activity_id", ASCENDING)], unique=True)],
+}
+
+async def ensure_indexes():
+    """Create all indexes concurrently (no-op for the ones that already exist)"""
+    await ensure_collections()
+    await asyncio.gather(*(
+        db[collection_name].create_indexes(indexes)
+        for collection_name, indexes in INDEXES.items()
+    ))
+
+async def timed_stage(stage: str, awaitable):
+    """Await a startup stage and log how long it took"""
+    started = time.perf_counter()
+    result = await awaitable
+    logger.info("Startup stage '%s' finished in %.1f ms", stage, (time.perf_counter() - started) * 1000)
+    return result
+
+async def warm_catalog():
+    """Sync the catalog, then load it into memory so it is cached at its current version"""
+    await timed_stage("catalog_sync", sync_catalog())
+    await timed_stage("catalog_cache", catalog_cache.load())
+
+STARTUP_RETRY_DELAY = 5  # seconds
+
+async def run_startup(app: FastAPI):
+    """Startup pipeline; the worker is marked ready only once caches are warm"""
+    while True:
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(
+                timed_stage("mongo_ping", db.command("ping")),
+                timed_stage("indexes", ensure_indexes()),
+                timed_stage("migrations", run_migrations()),
+                warm_catalog()
+            )
+        except Exception:
+            logger.exception("Startup pipeline failed, retrying in %ss", STARTUP_RETRY_DELAY)
+            await asyncio.sleep(STARTUP_RETRY_DELAY)
+            continue
         
-        # Lanches saudáveis (15 itens)
-        {"food_id": "l001", "name": "Castanha do Pará", "category": "Lanches", "calories_per_100g": 656, "detox_friendly": True},
-        {"food_id": "l002", "name": "Amêndoas", "category": "Lanches", "calories_per_100g": 579, "detox_friendly": True},
-        {"food_id": "l003", "name": "Nozes", "category": "Lanches", "calories_per_100g": 654, "detox_friendly": True},
-        {"food_id": "l004", "name": "Iogurte Natural", "category": "Lanches", "calories_per_100g": 61, "detox_friendly": True},
-        {"food_id": "l005", "name": "Chia", "category": "Lanches", "calories_per_100g": 486, "detox_friendly": True},
-        {"food_id": "l006", "name": "Linhaça", "category": "Lanches", "calories_per_100g": 534, "detox_friendly": True},
-        {"food_id": "l007", "name": "Tâmaras", "category": "Lanches", "calories_per_100g": 277, "detox_friendly": True},
-        {"food_id": "l008", "name": "Damascos Secos", "category": "Lanches", "calories_per_100g": 241, "detox_friendly": True},
-        {"food_id": "l009", "name": "Pasta de Amendoim Natural", "category": "Lanches", "calories_per_100g": 588, "detox_friendly": True},
-        {"food_id": "l010", "name": "Hummus", "category": "Lanches", "calories_per_100g": 166, "detox_friendly": True},
-        {"food_id": "l011", "name": "Pipoca sem Óleo", "category": "Lanches", "calories_per_100g": 382, "detox_friendly": True},
-        {"food_id": "l012", "name": "Mix de Sementes", "category": "Lanches", "calories_per_100g": 550, "detox_friendly": True},
-        {"food_id": "l013", "name": "Granola sem Açúcar", "category": "Lanches", "calories_per_100g": 471, "detox_friendly": True},
-        {"food_id": "l014", "name": "Coco Fresco", "category": "Lanches", "calories_per_100g": 354, "detox_friendly": True},
-        {"food_id": "l015", "name": "Azeitona", "category": "Lanches", "calories_per_100g": 115, "detox_friendly": True},
-    ]
+        app.state.ready = True
+        logger.info("Startup complete in %.1f ms", (time.perf_counter() - started) * 1000)
+        return
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Bind immediately and warm up in the background; /health/ready gates traffic"""
+    app.state.ready = False
+    settings = get_settings()
+    configure_logging(settings)
+    water_buffer.window = settings.water_flush_window_ms / 1000
+    water_buffer.max_delay = settings.water_flush_max_delay_ms / 1000
+    startup_task = asyncio.create_task(run_startup(app))
+    catalog_watch_task = asyncio.create_task(catalog_cache.watch(settings.catalog_refresh_interval))
+    change_stream_task = asyncio.create_task(change_streams.watch())
+    rollup_task = asyncio.create_task(entry_rollup.schedule())
     
-    if foods_count == 0:
-        await db.foods.insert_many(foods_data)
-        logger.info(f"Seeded {len(foods_data)} foods")
-    
-    # Seed activities
-    activities_data = [
-        {"activity_id": "a001", "name": "Musculação", "met_value": 5.0, "category": "Academia"},
-        {"activity_id": "a002", "name": "Caminhada Leve", "met_value": 3.0, "category": "Cardio"},
-        {"activity_id": "a003", "name": "Caminhada Moderada", "met_value": 4.0, "category": "Cardio"},
-        {"activity_id": "a004", "name": "Caminhada Intensa", "met_value": 5.0, "category": "Cardio"},
-        {"activity_id": "a005", "name": "Corrida Leve", "met_value": 7.0, "category": "Cardio"},
-        {"activity_id": "a006", "name": "Corrida Moderada", "met_value": 9.0, "category": "Cardio"},
-        {"activity_id": "a007", "name": "Corrida Intensa", "met_value": 11.0, "category": "Cardio"},
-        {"activity_id": "a008", "name": "Yoga", "met_value": 3.0, "category": "Flexibilidade"},
-        {"activity_id": "a009", "name": "Pilates", "met_value": 3.5, "category": "Flexibilidade"},
-        {"activity_id": "a010", "name": "Alongamento", "met_value": 2.5, "category": "Flexibilidade"},
-        {"activity_id": "a011", "name": "Vácuo Abdominal", "met_value": 3.5, "category": "Core"},
-        {"activity_id": "a012", "name": "Dança", "met_value": 6.0, "category": "Cardio"},
-        {"activity_id": "a013", "name": "Natação Leve", "met_value": 6.0, "category": "Cardio"},
-        {"activity_id": "a014", "name": "Natação Intensa", "met_value": 9.0, "category": "Cardio"},
-        {"activity_id": "a015", "name": "Ciclismo Leve", "met_value": 5.5, "category": "Cardio"},
-        {"activity_id": "a016", "name": "Ciclismo Moderado", "met_value": 7.0, "category": "Cardio"},
-        {"activity_id": "a017", "name": "Ciclismo Intenso", "met_value": 10.0, "category": "Cardio"},
-        {"activity_id": "a018", "name": "Meditação", "met_value": 1.3, "category": "Mente"},
-        {"activity_id": "a019", "name": "Jump", "met_value": 8.0, "category": "Cardio"},
-        {"activity_id": "a020", "name": "Futebol", "met_value": 7.0, "category": "Esportes"},
-    ]
+    yield
     
-    if activities_count == 0:
-        await db.activities.insert_many(activities_data)
-        logger.info(f"Seeded {len(activities_data)} activities")
+    app.state.ready = False
+    startup_task.cancel()
+    catalog_watch_task.cancel()
+    change_stream_task.cancel()
+    rollup_task.cancel()
+    await water_buffer.flush_all()
+    for task in list(background_tasks):
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    close_client()
+    stop_logging()
 
+# Probes for the load balancer, outside the /api prefix
+health_router = APIRouter(prefix="/health")
 
-# Include the router in the main app
-app.include_router(api_router)
+@health_router.get("/live")
+async def health_live():
+    """Liveness probe: the process is up"""
+    return {"status": "alive"}
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@health_router.get("/ready")
+async def health_ready(request: Request):
+    """Readiness probe: green only after startup warmup completed"""
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+def require_metrics_token(request: Request):
+    """Internal endpoints answer only to the configured bearer token, and 404 without one"""
+    token = get_settings().metrics_token
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+@health_router.get("/metrics", dependencies=[Depends(require_metrics_token)], include_in_schema=False)
+async def health_metrics():
+    """In-process counters of this worker (internal: requires METRICS_TOKEN)"""
+    return {
+        "single_flight": single_flight.stats(),
+        "admission": get_admission_control().stats(),
+        "circuit_breakers": {"catalog": catalog_cache.get_breaker().stats()},
+        "change_streams": change_streams.stats(),
+        "entry_rollup": entry_rollup.stats()
+    }
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """Build the app; without explicit settings the environment is read on first DB access"""
+    if settings is not None:
+        configure(settings)
+    
+    # Create the main app without a prefix
+    app = FastAPI(lifespan=lifespan)
+    
+    app.include_router(health_router)
+    
+    # Include the router in the main app
+    app.include_router(api_router)
+    
+    # Registered before CORS so throttled responses still carry CORS headers
+    app.middleware("http")(deadline_middleware)
+    app.middleware("http")(admission_control_middleware)
+    app.middleware("http")(request_context_middleware)
+    app.add_exception_handler(PyMongoError, mongo_error_handler)
+    app.add_exception_handler(CircuitOpenError, mongo_error_handler)
+    
+    app.add_middleware(CompressionMiddleware)
+    
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    return app
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+app = create_app()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Backend Benchmark Suite for Método Isabela Ansanello App
+Measures startup and request-path costs of backend/server.py locally
+"""
+
+import os
+import sys
+import gzip
+import time
+import random
+import socket
+import statistics
+import subprocess
+import urllib.request
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+# Benchmarks that need a database use MONGO_URL/DB_NAME from the environment
+# (or backend/.env); pure CPU benchmarks run without one
+BENCH_ENV = {
+    **os.environ,
+    "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+    "DB_NAME": os.environ.get("DB_NAME", "metodo_benchmark"),
+}
+
+
+def free_port():
+    """Ask the OS for an unused local TCP port"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=30.0):
+    """Poll url until it answers 200, returning the elapsed seconds (or None on timeout)"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except Exception:
+            time.sleep(0.01)
+    return None
+
+
+def synthetic_daily_records(count, user_id="user_benchmark"):
+    """Daily records shaped like the documents MongoDB returns (naive UTC datetimes)"""
+    start = datetime(2026, 1, 1)
+    return [
+        {
+            "user_id": user_id,
+            "date": (start + timedelta(days=day)).strftime("%Y-%m-%d"),
+            "day_number": day % 21 + 1,
+            "checklist_alimentar": {
+                "sem_acucar": True, "sem_alcool": True, "sem_gluten": day % 2 == 0,
+                "sem_refrigerante": True, "alimentos_naturais": True,
+                "evitar_industrializados": False, "frutas_verduras": True, "mastigar_atencao": False,
+            },
+            "praticas_diarias": {
+                "agua_2l": True, "exercicio": day % 3 == 0, "meditacao": True, "vacuo": False, "gratidao": True,
+            },
+            "sentimentos": "Me senti leve e com energia",
+            "desafios": None,
+            "vitoria_dia": "Recusei o doce da tarde",
+            "gratidoes": ["Família", "Saúde", "Trabalho"],
+            "calories_consumed": 1500 + day,
+            "calories_burned": 300 + day,
+            "water_intake": 2000,
+            "created_at": start + timedelta(days=day, hours=8),
+            "updated_at": start + timedelta(days=day, hours=21),
+        }
+        for day in range(count)
+    ]
+
+
+def synthetic_foods(count):
+    """Catalog items shaped like the foods collection"""
+    return [
+        {
+            "food_id": f"x{index:05d}",
+            "name": f"Alimento {index}",
+            "category": ("Frutas", "Verduras", "Grãos", "Proteínas", "Sucos", "Lanches")[index % 6],
+            "calories_per_100g": 20 + index % 600,
+            "detox_friendly": True,
+        }
+        for index in range(count)
+    ]
+
+
+def synthetic_food_entries(count, foods, days=30):
+    """Food entries spread over `days` days and the four meals"""
+    start = datetime(2026, 1, 1)
+    meals = ("cafe_manha", "almoco", "jantar", "lanche")
+    return [
+        {
+            "date": (start + timedelta(days=index % days)).strftime("%Y-%m-%d"),
+            "meal_type": meals[index % 4],
+            "food_id": foods[index % len(foods)]["food_id"],
+            "portions": 50 + index % 250,
+            "calories": 20 + index % 400,
+        }
+        for index in range(count)
+    ]
+
+
+def synthetic_entry_events(users, days, per_day):
+    """Food entries of `users` users over `days` days, timestamped through each day"""
+    start = datetime(2026, 1, 1)
+    meals = ("cafe_manha", "almoco", "jantar", "lanche")
+    return [
+        {
+            "entry_id": f"fe_{user:04d}{day:04d}{index:02d}",
+            "user_id": f"user_{user:05d}",
+            "date": (start + timedelta(days=day)).strftime("%Y-%m-%d"),
+            "meal_type": meals[index % 4],
+            "food_id": f"x{(user + index) % 90:05d}",
+            "food_name": f"Alimento {(user + index) % 90}",
+            "portions": 50 + (day + index) % 250,
+            "calories": 20 + (day * index) % 400,
+            "created_at": start + timedelta(days=day, hours=7 + index * 2),
+            "updated_at": start + timedelta(days=day, hours=7 + index * 2),
+        }
+        for user in range(users)
+        for day in range(days)
+        for index in range(per_day)
+    ]
+
+
+def loop_nutrient_totals(entries, foods_by_id, nutrients, meals):
+    """The per-entry Python loop the NumPy engine replaced, extended to every nutrient"""
+    days = {}
+    for entry in entries:
+        food = foods_by_id.get(entry["food_id"], {})
+        day = days.setdefault(entry["date"], {meal: dict.fromkeys(nutrients, 0.0) for meal in meals})
+        totals = day.get(entry["meal_type"])
+        if totals is None:
+            continue
+        totals["calories"] += entry["calories"]
+        for field in nutrients[1:]:
+            totals[field] += (food.get(field) or 0.0) * entry["portions"] / 100
+    return days
+
+
+def cpu_time_per_call(fn, repeat):
+    """Median process CPU time of fn() in microseconds"""
+    samples = []
+    for _ in range(repeat):
+        started = time.process_time_ns()
+        fn()
+        samples.append((time.process_time_ns() - started) / 1000)
+    return statistics.median(samples)
+
+
+class BackendBenchmark:
+    def __init__(self, repeat=5):
+        self.repeat = repeat
+        self.results = []
+
+    def log_result(self, name, value, unit, details=None):
+        """Log benchmark result"""
+        result = {
+            "benchmark": name,
+            "value": value,
+            "unit": unit,
+            "details": details or {}
+        }
+        self.results.append(result)
+        if value is None:
+            print(f"⚠️  {name}: not measured {details or ''}")
+        else:
+            print(f"⏱  {name}: {value:.2f} {unit} {details or ''}")
+
+    def bench_import_time(self):
+        """Time a cold `import server` in a fresh interpreter"""
+        code = (
+            "import time; started = time.perf_counter(); import server; "
+            "print(time.perf_counter() - started)"
+        )
+        samples = []
+        for _ in range(self.repeat):
+            output = subprocess.run(
+                [sys.executable, "-c", code],
+                cwd=BACKEND_DIR,
+                env=BENCH_ENV,
+                capture_output=True,
+                text=True,
+                check=True
+            ).stdout
+            samples.append(float(output.strip().splitlines()[-1]) * 1000)
+
+        self.log_result(
+            "import server",
+            statistics.median(samples),
+            "ms",
+            {"min": round(min(samples), 2), "max": round(max(samples), 2)}
+        )
+
+    def bench_time_to_first_request(self):
+        """Spawn uvicorn and time until /health/live and /health/ready answer"""
+        live_samples = []
+        ready_samples = []
+
+        for _ in range(self.repeat):
+            port = free_port()
+            started = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+                cwd=BACKEND_DIR,
+                env=BENCH_ENV,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+            try:
+                if wait_for(f"http://127.0.0.1:{port}/health/live") is None:
+                    continue
+                live_samples.append((time.perf_counter() - started) * 1000)
+                if wait_for(f"http://127.0.0.1:{port}/health/ready", timeout=10) is not None:
+                    ready_samples.append((time.perf_counter() - started) * 1000)
+            finally:
+                process.terminate()
+                process.wait()
+
+        self.log_result(
+            "time to first request (/health/live)",
+            statistics.median(live_samples) if live_samples else None,
+            "ms"
+        )
+        self.log_result(
+            "time to ready (/health/ready, needs MongoDB)",
+            statistics.median(ready_samples) if ready_samples else None,
+            "ms"
+        )
+
+    def bench_list_serialization(self):
+        """CPU per request for list endpoints: Pydantic rebuild + jsonable_encoder vs lean orjson"""
+        from fastapi.encoders import jsonable_encoder
+        from fastapi.responses import JSONResponse
+        import server
+
+        cases = [
+            ("/daily/records", server.DailyRecord, synthetic_daily_records, 21),
+            ("/daily/records", server.DailyRecord, synthetic_daily_records, 100),
+            ("/calories/foods", server.Food, synthetic_foods, 90),
+            ("/calories/foods", server.Food, synthetic_foods, 1000),
+        ]
+
+        for endpoint, model, make_documents, count in cases:
+            documents = make_documents(count)
+
+            def validated():
+                JSONResponse(jsonable_encoder([model(**document) for document in documents]))
+
+            def lean():
+                server.FastJSONResponse(documents)
+
+            before = cpu_time_per_call(validated, self.repeat * 20)
+            after = cpu_time_per_call(lean, self.repeat * 20)
+            self.log_result(
+                f"{endpoint} x{count} CPU per request",
+                after,
+                "µs",
+                {"validated_us": round(before, 1), "saved_us": round(before - after, 1)}
+            )
+
+    def bench_payload_size(self):
+        """Bytes on the wire per list response: verbose JSON vs exclude_none, columnar and compression"""
+        import server
+
+        codes = [
+            {"code": f"CODE{index:04d}", "is_used": index % 3 == 0, "used_by": None, "used_by_email": None,
+             "used_at": None, "created_at": datetime(2026, 1, 1), "expires_at": None}
+            for index in range(200)
+        ]
+        cases = [
+            ("/daily/records", synthetic_daily_records(21)),
+            ("/admin/codes", codes),
+            ("/calories/foods", synthetic_foods(90)),
+        ]
+
+        for endpoint, documents in cases:
+            verbose = server.FastJSONResponse(documents).body
+            lean = server.FastJSONResponse(server.drop_none(documents)).body
+            columnar = server.FastJSONResponse(server.to_columns(documents)).body
+            details = {
+                "verbose": len(verbose),
+                "exclude_none": len(lean),
+                "columnar": len(columnar),
+                "columnar_gzip": len(gzip.compress(columnar, 6)),
+            }
+            if server.brotli is not None:
+                details["brotli"] = len(server.brotli.compress(lean, quality=4))
+            self.log_result(f"{endpoint} x{len(documents)} bytes (gzip, exclude_none)", len(gzip.compress(lean, 6)), "B", details)
+
+    def bench_nutrient_totals(self):
+        """CPU to total calories and macros per day and meal: Python loop vs NumPy bincount"""
+        import server
+
+        foods = [
+            {**food, "protein_g": index % 30 / 2, "carbs_g": index % 70 / 2, "fat_g": index % 20 / 3, "fiber_g": index % 9 / 4}
+            for index, food in enumerate(synthetic_foods(1000))
+        ]
+        foods_by_id = {food["food_id"]: food for food in foods}
+        food_rows, food_macros = server.build_food_macros(foods)
+
+        for count in (1_000, 10_000, 100_000):
+            entries = synthetic_food_entries(count, foods)
+            repeat = max(3, self.repeat * 1000 // count)
+            before = cpu_time_per_call(
+                lambda: loop_nutrient_totals(entries, foods_by_id, server.NUTRIENTS, server.MEAL_TYPES), repeat
+            )
+            after = cpu_time_per_call(lambda: server.nutrient_totals(entries, food_rows, food_macros), repeat)
+            self.log_result(
+                f"nutrient totals x{count} entries",
+                after / 1000,
+                "ms",
+                {"loop_ms": round(before / 1000, 2), "speedup": round(before / after, 1)}
+            )
+
+    def bench_timeseries_storage(self, users=200, days=180, per_day=6):
+        """Storage footprint and 30-day range query latency: regular vs time-series food_entries"""
+        import pymongo
+        import server
+
+        client = pymongo.MongoClient(BENCH_ENV["MONGO_URL"], serverSelectionTimeoutMS=2000)
+        try:
+            client.admin.command("ping")
+        except pymongo.errors.PyMongoError as e:
+            self.log_result("entries storage (time-series)", None, "kB", {"error": type(e).__name__})
+            return
+
+        database = client[BENCH_ENV["DB_NAME"]]
+        events = synthetic_entry_events(users, days, per_day)
+        names = {"regular": "bench_entries_regular", "timeseries": "bench_entries_timeseries"}
+        sizes, latencies = {}, {}
+        try:
+            for storage, name in names.items():
+                database.drop_collection(name)
+                if storage == "timeseries":
+                    database.create_collection(name, timeseries=server.TIMESERIES_OPTIONS)
+                collection = database[name]
+                collection.create_indexes(server.INDEXES["food_entries"])
+                for start in range(0, len(events), 10_000):
+                    collection.insert_many([dict(event) for event in events[start:start + 10_000]], ordered=False)
+
+                stats = database.command("collStats", name)
+                sizes[storage] = (stats["storageSize"] + stats["totalIndexSize"]) / 1024
+
+                rng = random.Random(7)
+                samples = []
+                for _ in range(self.repeat * 20):
+                    first = datetime(2026, 1, 1) + timedelta(days=rng.randrange(days - 30))
+                    query = {
+                        "user_id": f"user_{rng.randrange(users):05d}",
+                        "date": {"$gte": first.strftime("%Y-%m-%d"), "$lte": (first + timedelta(days=29)).strftime("%Y-%m-%d")},
+                    }
+                    if storage == "timeseries":
+                        # As server.entry_date_query adds on time-series storage
+                        query["created_at"] = {"$gte": first, "$lt": first + timedelta(days=30)}
+                    started = time.perf_counter()
+                    list(collection.find(query, {"_id": 0}))
+                    samples.append((time.perf_counter() - started) * 1000)
+                latencies[storage] = statistics.median(samples)
+        finally:
+            for name in names.values():
+                database.drop_collection(name)
+            client.close()
+
+        self.log_result(
+            f"entries storage x{len(events)} (time-series, data + indexes)",
+            sizes["timeseries"],
+            "kB",
+            {"regular_kB": round(sizes["regular"]), "ratio": round(sizes["regular"] / sizes["timeseries"], 1)}
+        )
+        self.log_result(
+            "30-day range query (time-series)",
+            latencies["timeseries"],
+            "ms",
+            {"regular_ms": round(latencies["regular"], 2)}
+        )
+
+    def run_all_benchmarks(self):
+        """Run all benchmarks"""
+        print("🚀 Starting Backend Benchmarks")
+        print("=" * 60)
+
+        print("\n🔌 Startup:")
+        self.bench_import_time()
+        self.bench_time_to_first_request()
+
+        print("\n📦 Serialization:")
+        self.bench_list_serialization()
+        self.bench_payload_size()
+
+        print("\n🥗 Nutrients:")
+        self.bench_nutrient_totals()
+
+        print("\n🗄️  Storage (needs MongoDB):")
+        self.bench_timeseries_storage()
+
+        print("\n" + "=" * 60)
+        print(f"📊 {len(self.results)} measurements")
+        return self.results
+
+
+if __name__ == "__main__":
+    # python backend_benchmark.py [name ...] runs only bench_<name>, e.g. timeseries_storage
+    benchmark = BackendBenchmark()
+    if len(sys.argv) > 1:
+        for name in sys.argv[1:]:
+            getattr(benchmark, f"bench_{name}")()
+    else:
+        benchmark.run_all_benchmarks()
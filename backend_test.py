@@ -702,13 +702,28 @@ class BackendTester:
                 f"Server is not responding: {str(e)}"
             )
     
+    def fetch_all_foods(self, page_size=200):
+        """Walk the paged foods listing; returns the last response and every food seen"""
+        foods = []
+        while True:
+            response = requests.get(
+                f"{self.base_url}/calories/foods",
+                params={"limit": page_size, "offset": len(foods)},
+                timeout=10
+            )
+            if response.status_code != 200:
+                return response, foods
+            page = response.json()
+            foods.extend(page)
+            if len(page) < page_size:
+                return response, foods
+    
     def test_database_seeding(self):
         """Test if database is properly seeded with foods and activities"""
         try:
-            # Test foods seeding
-            response = requests.get(f"{self.base_url}/calories/foods", timeout=10)
+            # Test foods seeding (the listing is paged, 50 foods by default)
+            response, foods = self.fetch_all_foods()
             if response.status_code == 200:
-                foods = response.json()
                 expected_categories = ["Frutas", "Verduras", "Grãos", "Proteínas", "Sucos", "Lanches"]
                 found_categories = set()
                 
@@ -59,7 +59,7 @@ export default function AtividadesScreen() {
     const newTotal = waterIntake + amount;
     setWaterIntake(newTotal);
     try {
-      await api.updateWaterIntake(newTotal);
+      await api.addWater(amount);
     } catch (error) {
       console.error('Failed to update water:', error);
       // Revert on error
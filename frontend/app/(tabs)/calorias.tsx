@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import {
   View,
   Text,
@@ -15,6 +15,15 @@ import { api } from '../../services/api';
 import { Food } from '../../types';
 import { useFocusEffect } from '@react-navigation/native';
 
+// Foods fetched per request; the list loads the next page as it scrolls
+const FOOD_PAGE_SIZE = 50;
+// The server ranks this many matches per search and pages within them
+const SEARCH_RESULTS_MAX = 200;
+
+// Whether another page can follow one of `pageLength` foods ending at `offset`
+const hasNextFoodPage = (pageLength: number, offset: number, term: string) =>
+  pageLength === FOOD_PAGE_SIZE && (!term || offset + FOOD_PAGE_SIZE <= SEARCH_RESULTS_MAX);
+
 export default function CaloriasScreen() {
   const [loading, setLoading] = useState(true);
   const [todayData, setTodayData] = useState<any>(null);
@@ -23,6 +32,11 @@ export default function CaloriasScreen() {
   const [foods, setFoods] = useState<Food[]>([]);
   const [search, setSearch] = useState('');
   const [selectedCategory, setSelectedCategory] = useState('');
+  const [foodOffset, setFoodOffset] = useState(0); // catalog rows fetched so far
+  const [hasMoreFoods, setHasMoreFoods] = useState(false);
+  const [loadingMoreFoods, setLoadingMoreFoods] = useState(false);
+  const suggestedIds = useRef<Set<string>>(new Set());
+  const foodQuery = useRef('');
 
   // Reload data when screen comes into focus
   useFocusEffect(
@@ -35,14 +49,61 @@ export default function CaloriasScreen() {
     loadData();
   }, []);
 
+  // The catalog is searched on the server, a page at a time
+  useEffect(() => {
+    if (!modalVisible) return;
+    const timer = setTimeout(async () => {
+      try {
+        const term = search.trim();
+        const query = `${selectedCategory}|${term}|${selectedMealType}`;
+        foodQuery.current = query;
+        let suggestions: Food[] = [];
+        let page: Food[];
+        if (term || selectedCategory) {
+          page = await api.getFoods(selectedCategory || undefined, term || undefined, FOOD_PAGE_SIZE);
+        } else {
+          // Foods the user logs most at this meal come first, ready for one tap
+          [suggestions, page] = await Promise.all([
+            api.getFoodSuggestions(selectedMealType),
+            api.getFoods(undefined, undefined, FOOD_PAGE_SIZE),
+          ]);
+        }
+        if (foodQuery.current !== query) return;
+        suggestedIds.current = new Set(suggestions.map((food) => food.food_id));
+        setFoods([...suggestions, ...page.filter((food) => !suggestedIds.current.has(food.food_id))]);
+        setFoodOffset(page.length);
+        setHasMoreFoods(hasNextFoodPage(page.length, page.length, term));
+      } catch (error) {
+        console.error('Failed to search foods:', error);
+      }
+    }, 250);
+    return () => clearTimeout(timer);
+  }, [modalVisible, search, selectedCategory, selectedMealType]);
+
+  const loadMoreFoods = async () => {
+    if (!hasMoreFoods || loadingMoreFoods) return;
+    const query = foodQuery.current;
+    const term = search.trim();
+    setLoadingMoreFoods(true);
+    try {
+      const page: Food[] = await api.getFoods(
+        selectedCategory || undefined, term || undefined, FOOD_PAGE_SIZE, foodOffset
+      );
+      if (foodQuery.current !== query) return;
+      setFoods((current) => [...current, ...page.filter((food) => !suggestedIds.current.has(food.food_id))]);
+      setFoodOffset(foodOffset + page.length);
+      setHasMoreFoods(hasNextFoodPage(page.length, foodOffset + page.length, term));
+    } catch (error) {
+      console.error('Failed to load more foods:', error);
+    } finally {
+      setLoadingMoreFoods(false);
+    }
+  };
+
   const loadData = async () => {
     try {
-      const [caloriesData, foodsData] = await Promise.all([
-        api.getTodayCalories(),
-        api.getFoods(),
-      ]);
+      const caloriesData = await api.getTodayCalories();
       setTodayData(caloriesData);
-      setFoods(foodsData);
     } catch (error) {
       console.error('Failed to load data:', error);
     } finally {
@@ -60,7 +121,7 @@ export default function CaloriasScreen() {
       await api.addMeal({
         meal_type: selectedMealType,
         food_id: food.food_id,
-        portions: 100, // Default 100g
+        portions: food.last_portions ?? 100, // Last portion logged, or 100g
       });
       setModalVisible(false);
       loadData();
@@ -69,12 +130,6 @@ export default function CaloriasScreen() {
     }
   };
 
-  const filteredFoods = foods.filter(
-    (food) =>
-      (selectedCategory === '' || food.category === selectedCategory) &&
-      (search === '' || food.name.toLowerCase().includes(search.toLowerCase()))
-  );
-
   const categories = ['Frutas', 'Verduras', 'Grãos', 'Proteínas', 'Sucos', 'Lanches'];
   const mealTypes = [
     { key: 'cafe_manha', label: 'Café da Manhã', icon: 'coffee' },
@@ -172,7 +227,7 @@ export default function CaloriasScreen() {
           </ScrollView>
 
           <FlatList
-            data={filteredFoods}
+            data={foods}
             keyExtractor={(item) => item.food_id}
             renderItem={({ item }) => (
               <TouchableOpacity style={styles.foodOption} onPress={() => addFoodToMeal(item)}>
@@ -187,6 +242,11 @@ export default function CaloriasScreen() {
                 )}
               </TouchableOpacity>
             )}
+            onEndReached={loadMoreFoods}
+            onEndReachedThreshold={0.5}
+            ListFooterComponent={
+              loadingMoreFoods ? <ActivityIndicator style={styles.foodListFooter} color="#4CAF50" /> : null
+            }
           />
         </View>
       </Modal>
@@ -295,6 +355,9 @@ const styles = StyleSheet.create({
     fontSize: 20,
     fontWeight: '600',
   },
+  foodListFooter: {
+    paddingVertical: 16,
+  },
   searchInput: {
     margin: 16,
     padding: 12,
@@ -39,19 +39,18 @@ export default function HomeScreen() {
   const loadData = async () => {
     try {
       const today = format(new Date(), 'yyyy-MM-dd');
-      const [dailyRecord, methodProgress, calories, activities] = await Promise.all([
-        api.getDailyRecord(today),
-        api.getMethodProgress(),
-        api.getTodayCalories(),
-        api.getTodayActivities(),
-      ]);
+      const data = await api.bootstrap(today);
 
       setTodayData({
-        dailyRecord,
-        calories,
-        activities,
+        dailyRecord: data.daily_record,
+        calories: data.calories_today,
+        activities: data.activities_today,
+      });
+      setProgress({
+        goals: data.goals,
+        daily_records: data.daily_records,
+        total_days_completed: data.total_days_completed,
       });
-      setProgress(methodProgress);
     } catch (error) {
       console.error('Failed to load data:', error);
     } finally {
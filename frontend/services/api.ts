@@ -39,6 +39,20 @@ export const api = {
     return response.json();
   },
 
+  // Home screen data (user, goals, today's record, calories, activities, progress) in one request
+  bootstrap: async (date?: string) => {
+    let url = `${BACKEND_URL}/api/bootstrap`;
+    if (date) url += `?date=${date}`;
+
+    const response = await fetch(url, {
+      headers: {
+        'Authorization': `Bearer ${authToken}`,
+      },
+    });
+    if (!response.ok) throw new Error('Failed to load home data');
+    return response.json();
+  },
+
   // User Goals
   getUserGoals: async () => {
     const response = await fetch(`${BACKEND_URL}/api/user/goals`, {
@@ -83,8 +97,11 @@ export const api = {
     return response.json();
   },
 
-  getAllDailyRecords: async () => {
-    const response = await fetch(`${BACKEND_URL}/api/daily/records`, {
+  getAllDailyRecords: async (cycleId?: string) => {
+    let url = `${BACKEND_URL}/api/daily/records`;
+    if (cycleId) url += `?cycle_id=${cycleId}`;
+
+    const response = await fetch(url, {
       headers: {
         'Authorization': `Bearer ${authToken}`,
       },
@@ -114,6 +131,16 @@ export const api = {
     return response.json();
   },
 
+  addWater: async (increment_ml: number) => {
+    const response = await fetch(`${BACKEND_URL}/api/daily/water?increment_ml=${increment_ml}`, {
+      method: 'PUT',
+      headers: {
+        'Authorization': `Bearer ${authToken}`,
+      },
+    });
+    return response.json();
+  },
+
   // Method Progress
   getMethodProgress: async () => {
     const response = await fetch(`${BACKEND_URL}/api/method/progress`, {
@@ -137,11 +164,13 @@ export const api = {
   },
 
   // Foods
-  getFoods: async (category?: string, search?: string) => {
+  getFoods: async (category?: string, search?: string, limit?: number, offset?: number) => {
     let url = `${BACKEND_URL}/api/calories/foods`;
     const params = new URLSearchParams();
     if (category) params.append('category', category);
     if (search) params.append('search', search);
+    if (limit) params.append('limit', String(limit));
+    if (offset) params.append('offset', String(offset));
     if (params.toString()) url += `?${params.toString()}`;
 
     const response = await fetch(url, {
@@ -152,6 +181,18 @@ export const api = {
     return response.json();
   },
 
+  getFoodSuggestions: async (mealType?: string) => {
+    let url = `${BACKEND_URL}/api/calories/suggestions`;
+    if (mealType) url += `?meal_type=${mealType}`;
+
+    const response = await fetch(url, {
+      headers: {
+        'Authorization': `Bearer ${authToken}`,
+      },
+    });
+    return response.json();
+  },
+
   addMeal: async (meal: any) => {
     const response = await fetch(`${BACKEND_URL}/api/calories/add-meal`, {
       method: 'POST',
@@ -164,6 +205,72 @@ export const api = {
     return response.json();
   },
 
+  // Saved meals
+  getMealTemplates: async () => {
+    const response = await fetch(`${BACKEND_URL}/api/calories/templates`, {
+      headers: {
+        'Authorization': `Bearer ${authToken}`,
+      },
+    });
+    return response.json();
+  },
+
+  createMealTemplate: async (template: any) => {
+    const response = await fetch(`${BACKEND_URL}/api/calories/templates`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${authToken}`,
+      },
+      body: JSON.stringify(template),
+    });
+    return response.json();
+  },
+
+  logMealTemplate: async (templateId: string, mealType?: string) => {
+    const response = await fetch(`${BACKEND_URL}/api/calories/templates/${templateId}/log`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${authToken}`,
+      },
+      body: JSON.stringify(mealType ? { meal_type: mealType } : {}),
+    });
+    return response.json();
+  },
+
+  deleteMealTemplate: async (templateId: string) => {
+    const response = await fetch(`${BACKEND_URL}/api/calories/templates/${templateId}`, {
+      method: 'DELETE',
+      headers: {
+        'Authorization': `Bearer ${authToken}`,
+      },
+    });
+    return response.json();
+  },
+
+  updateFoodEntry: async (entryId: string, changes: any) => {
+    const response = await fetch(`${BACKEND_URL}/api/calories/${entryId}`, {
+      method: 'PUT',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${authToken}`,
+      },
+      body: JSON.stringify(changes),
+    });
+    return response.json();
+  },
+
+  deleteFoodEntry: async (entryId: string) => {
+    const response = await fetch(`${BACKEND_URL}/api/calories/${entryId}`, {
+      method: 'DELETE',
+      headers: {
+        'Authorization': `Bearer ${authToken}`,
+      },
+    });
+    return response.json();
+  },
+
   getTodayCalories: async () => {
     const response = await fetch(`${BACKEND_URL}/api/calories/today`, {
       headers: {
@@ -194,6 +301,28 @@ export const api = {
     return response.json();
   },
 
+  updateActivityEntry: async (entryId: string, changes: any) => {
+    const response = await fetch(`${BACKEND_URL}/api/activities/${entryId}`, {
+      method: 'PUT',
+      headers: {
+        'Content-Type': 'application/json',
+        'Authorization': `Bearer ${authToken}`,
+      },
+      body: JSON.stringify(changes),
+    });
+    return response.json();
+  },
+
+  deleteActivityEntry: async (entryId: string) => {
+    const response = await fetch(`${BACKEND_URL}/api/activities/${entryId}`, {
+      method: 'DELETE',
+      headers: {
+        'Authorization': `Bearer ${authToken}`,
+      },
+    });
+    return response.json();
+  },
+
   getTodayActivities: async () => {
     const response = await fetch(`${BACKEND_URL}/api/activities/today`, {
       headers: {
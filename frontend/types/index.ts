@@ -11,12 +11,14 @@ export interface User {
   chest?: number;
   activation_code?: string;
   is_active: boolean;
+  active_cycle_id?: string;
   created_at: string;
   updated_at?: string;
 }
 
 export interface UserGoals {
   user_id: string;
+  cycle_id?: string;
   meta_principal: string;
   desejo_transformar: string;
   sentimento_desejado: string;
@@ -47,6 +49,7 @@ export interface PraticasDiarias {
 
 export interface DailyRecord {
   user_id: string;
+  cycle_id?: string;
   date: string;
   day_number: number;
   checklist_alimentar: ChecklistAlimentar;
@@ -68,6 +71,13 @@ export interface Food {
   category: string;
   calories_per_100g: number;
   detox_friendly: boolean;
+  protein_g?: number;
+  carbs_g?: number;
+  fat_g?: number;
+  fiber_g?: number;
+  // Present on /calories/suggestions results
+  times_logged?: number;
+  last_portions?: number;
 }
 
 export interface Activity {
@@ -78,6 +88,7 @@ export interface Activity {
 }
 
 export interface FoodEntry {
+  entry_id: string;
   user_id: string;
   date: string;
   meal_type: string;
@@ -89,6 +100,7 @@ export interface FoodEntry {
 }
 
 export interface ActivityEntry {
+  entry_id: string;
   user_id: string;
   date: string;
   activity_id: string;
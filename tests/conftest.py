@@ -0,0 +1,38 @@
+"""Backend unit tests against an in-memory MongoDB (mongomock-motor)"""
+
+import sys
+import uuid
+from pathlib import Path
+
+import mongomock_motor
+import motor.motor_asyncio
+import pytest
+
+# Installed before server is imported, which binds AsyncIOMotorClient at import
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def database():
+    """A fresh, empty database per test"""
+    server.configure(server.Settings(mongo_url="mongodb://localhost", db_name=f"test_{uuid.uuid4().hex[:8]}"))
+    server.progress_cache.clear()
+    server.session_cache.clear()
+    yield server.db
+    server.close_client()
+
+
+@pytest.fixture
+async def catalog(database):
+    """The versioned catalog (foods and activities), stored and cached"""
+    await server.sync_catalog()
+    await server.catalog_cache.load()
+    return server.catalog_cache
@@ -0,0 +1,31 @@
+from starlette.requests import Request
+
+import server
+
+
+def request_from(peer, *forwarded_for):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded_for]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "client": (peer, 50000)})
+
+
+def test_forwarded_for_ignored_without_trusted_proxies():
+    control = server.AdmissionControl(server.LocalBucketStore(), 10)
+    assert control.client_ip(request_from("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+
+
+def test_forwarded_for_ignored_from_untrusted_peer():
+    control = server.AdmissionControl(server.LocalBucketStore(), 10, "10.0.0.0/8")
+    assert control.client_ip(request_from("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+
+
+def test_right_most_untrusted_hop_behind_trusted_proxies():
+    control = server.AdmissionControl(server.LocalBucketStore(), 10, "10.0.0.0/8, 127.0.0.1")
+    # The client forged the first entry; our proxies appended the real one
+    request = request_from("127.0.0.1", "1.2.3.4, 198.51.100.1", "10.0.0.5")
+    assert control.client_ip(request) == "198.51.100.1"
+
+
+def test_only_trusted_hops_fall_back_to_the_first():
+    control = server.AdmissionControl(server.LocalBucketStore(), 10, "10.0.0.0/8")
+    assert control.client_ip(request_from("10.0.0.2", "10.0.0.9")) == "10.0.0.9"
+    assert control.client_ip(request_from("10.0.0.2")) == "10.0.0.2"
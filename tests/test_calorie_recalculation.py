@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "user_recalc"
+
+
+async def test_recalculation_moves_daily_totals_by_the_difference(catalog, database):
+    now = datetime.now(timezone.utc)
+    # Musculação (MET 5.0), 60 minutes at 70 kg
+    await database.activity_entries.insert_many([
+        {"entry_id": f"ae_{i}", "user_id": USER_ID, "date": "2026-03-10", "activity_id": "a001",
+         "activity_name": "Musculação", "duration": 60, "intensity": "media", "calories_burned": 350,
+         "created_at": now, "updated_at": now}
+        for i in range(2)
+    ])
+    # 100 kcal of an activity logged while the job runs are already counted
+    await database.daily_records.insert_one(
+        {"user_id": USER_ID, "date": "2026-03-10", "day_number": 1, "calories_burned": 800, "updated_at": now}
+    )
+    await database.jobs.insert_one({"job_id": "job_1", "user_id": USER_ID, "status": "pending"})
+
+    await server.recalculate_calories_burned("job_1", USER_ID, 80)
+
+    entries = await database.activity_entries.find({"user_id": USER_ID}).to_list(None)
+    assert [entry["calories_burned"] for entry in entries] == [400, 400]
+    record = await database.daily_records.find_one({"user_id": USER_ID})
+    assert record["calories_burned"] == 900
+    job = await database.jobs.find_one({"job_id": "job_1"})
+    assert (job["status"], job["processed"]) == ("completed", 2)
+
+
+async def test_entries_edited_meanwhile_do_not_move_daily_totals(catalog, database, monkeypatch):
+    now = datetime.now(timezone.utc)
+    await database.activity_entries.insert_many([
+        {"entry_id": f"ae_{i}", "user_id": USER_ID, "date": "2026-03-10", "activity_id": "a001",
+         "activity_name": "Musculação", "duration": 60, "intensity": "media", "calories_burned": 350,
+         "created_at": now, "updated_at": now}
+        for i in range(2)
+    ])
+    await database.daily_records.insert_one(
+        {"user_id": USER_ID, "date": "2026-03-10", "day_number": 1, "calories_burned": 700, "updated_at": now}
+    )
+    await database.jobs.insert_one({"job_id": "job_1", "user_id": USER_ID, "status": "pending"})
+
+    update_job = server.update_job
+    progress = []
+
+    async def edit_while_running(job_id, **fields):
+        if fields.get("processed") == 0:
+            # The user edits ae_1 after the job read it (standalone: no transaction)
+            await database.activity_entries.update_one(
+                {"entry_id": "ae_1"}, {"$set": {"calories_burned": 500, "updated_at": datetime.now(timezone.utc)}}
+            )
+            await database.daily_records.update_one({"user_id": USER_ID}, {"$inc": {"calories_burned": 150}})
+        progress.append(fields)
+        await update_job(job_id, **fields)
+
+    monkeypatch.setattr(server, "update_job", edit_while_running)
+    await server.recalculate_calories_burned("job_1", USER_ID, 80)
+
+    entries = {entry["entry_id"]: entry async for entry in database.activity_entries.find({"user_id": USER_ID})}
+    assert (entries["ae_0"]["calories_burned"], entries["ae_1"]["calories_burned"]) == (400, 500)
+    record = await database.daily_records.find_one({"user_id": USER_ID})
+    assert record["calories_burned"] == 900
+
+    # The total is known before the first batch and processed moves per batch
+    assert progress[1] == {"total": 2, "processed": 0}
+    assert {"processed": 2} in progress[2:]
+    job = await database.jobs.find_one({"job_id": "job_1"})
+    assert (job["status"], job["total"], job["processed"]) == ("completed", 2, 2)
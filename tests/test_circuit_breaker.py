@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+from pymongo.errors import PyMongoError
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def failing():
+    raise PyMongoError("down")
+
+
+async def test_slow_closed_call_does_not_release_the_trial(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    breaker = server.CircuitBreaker("test", failures=1, reset_timeout=30)
+
+    slow_started, finish_slow, finish_trial = asyncio.Event(), asyncio.Event(), asyncio.Event()
+
+    async def slow():
+        slow_started.set()
+        await finish_slow.wait()
+
+    slow_call = asyncio.create_task(breaker.call(slow))
+    await slow_started.wait()
+
+    with pytest.raises(PyMongoError):
+        await breaker.call(failing)
+    assert breaker.state == "open"
+
+    clock[0] += 30
+    trial = asyncio.create_task(breaker.call(finish_trial.wait))
+    await asyncio.sleep(0)
+    assert breaker.trial_running
+
+    finish_slow.set()
+    await slow_call
+    assert breaker.trial_running
+    with pytest.raises(server.CircuitOpenError):
+        await breaker.call(failing)
+
+    finish_trial.set()
+    await trial
+    assert breaker.state == "closed"
+
+
+async def test_failed_trial_reopens(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: clock[0])
+    breaker = server.CircuitBreaker("test", failures=2, reset_timeout=30)
+
+    for _ in range(2):
+        with pytest.raises(PyMongoError):
+            await breaker.call(failing)
+    assert breaker.state == "open"
+
+    clock[0] += 30
+    with pytest.raises(PyMongoError):
+        await breaker.call(failing)
+    assert breaker.state == "open"
+    assert not breaker.trial_running
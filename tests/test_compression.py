@@ -0,0 +1,104 @@
+import gzip
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+BODY = b'{"foods": [' + b'{"name": "Arroz Integral", "calories_per_100g": 111}, ' * 40 + b"]}"
+needs_brotli = pytest.mark.skipif(server.brotli is None, reason="brotli is not installed")
+
+
+def middleware(minimum_size=500):
+    return server.CompressionMiddleware(None, minimum_size=minimum_size)
+
+
+@pytest.mark.parametrize("header, encoding", [
+    ("gzip", "gzip"),
+    ("gzip, deflate", "gzip"),
+    ("GZIP;q=0.5", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=0.0", None),
+    ("gzip; q=0.000", None),
+    ("gzip;q=abc", None),
+    ("deflate", None),
+    ("", None),
+    ("*", "gzip"),
+    ("*;q=0, gzip", "gzip"),
+    ("identity, *;q=0", None),
+])
+def test_negotiate(header, encoding):
+    assert middleware().negotiate(header) == encoding
+
+
+@needs_brotli
+@pytest.mark.parametrize("header, encoding", [
+    ("gzip, br", "br"),
+    ("br;q=0.000, gzip", "gzip"),
+    ("br;q=0.5, gzip;q=0.8", "gzip"),
+    ("br, gzip;q=0", "br"),
+])
+def test_negotiate_brotli(header, encoding):
+    assert middleware().negotiate(header) == encoding
+
+
+def app_sending(body_chunks, headers):
+    async def app(scope, receive, send):
+        length = sum(len(chunk) for chunk in body_chunks)
+        raw = [(b"content-length", str(length).encode()), (b"content-type", b"application/json")]
+        raw += [(name.encode(), value.encode()) for name, value in headers.items()]
+        await send({"type": "http.response.start", "status": 200, "headers": raw})
+        for i, chunk in enumerate(body_chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(body_chunks) - 1})
+    return app
+
+
+async def run(body_chunks, accept_encoding="gzip", headers=None, minimum_size=500):
+    compression = middleware(minimum_size)
+    compression.app = app_sending(body_chunks, headers or {})
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    await compression(scope, None, send)
+    start, *bodies = messages
+    response_headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    return response_headers, bodies
+
+
+async def test_rechunked_body_is_compressed_once():
+    chunks = [BODY[:100], BODY[100:1000], BODY[1000:]]
+    headers, bodies = await run(chunks)
+
+    assert len(bodies) == 1
+    assert headers["content-encoding"] == "gzip"
+    assert headers["content-length"] == str(len(bodies[0]["body"]))
+    assert gzip.decompress(bodies[0]["body"]) == BODY
+    assert headers["vary"] == "Accept-Encoding"
+
+
+async def test_vary_is_added_to_an_existing_one():
+    headers, _ = await run([BODY], headers={"vary": "Authorization"})
+    assert headers["vary"] == "Authorization, Accept-Encoding"
+
+
+async def test_small_bodies_pass_through():
+    headers, bodies = await run([BODY[:100]], minimum_size=500)
+    assert "content-encoding" not in headers
+    assert bodies[0]["body"] == BODY[:100]
+
+
+async def test_encoded_responses_pass_through():
+    encoded = gzip.compress(BODY)
+    headers, bodies = await run([encoded], headers={"content-encoding": "gzip"}, minimum_size=10)
+    assert headers["content-encoding"] == "gzip"
+    assert bodies[0]["body"] == encoded
+
+
+async def test_refused_encoding_passes_through():
+    headers, bodies = await run([BODY], accept_encoding="gzip;q=0")
+    assert "content-encoding" not in headers
+    assert bodies[0]["body"] == BODY
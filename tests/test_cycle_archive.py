@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "user_archive"
+CYCLE_ID = "cycle_first"
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def record(day):
+    date = START + timedelta(days=day)
+    return {
+        "user_id": USER_ID, "cycle_id": CYCLE_ID, "date": date.strftime("%Y-%m-%d"), "day_number": day + 1,
+        "checklist_alimentar": {"sem_acucar": True}, "praticas_diarias": {}, "gratidoes": [],
+        "calories_consumed": 1500, "calories_burned": 200, "water_intake": 2000,
+        "created_at": date, "updated_at": date
+    }
+
+
+@pytest.fixture
+async def completed_cycle(database):
+    await database.users.insert_one({
+        "user_id": USER_ID, "email": "a@x.com", "name": "A", "active_cycle_id": CYCLE_ID, "created_at": START
+    })
+    await database.user_goals.insert_one({"user_id": USER_ID, "cycle_id": CYCLE_ID, "created_at": START})
+    await database.daily_records.insert_many([record(day) for day in range(21)])
+    await database.final_reflections.insert_one({
+        "user_id": USER_ID, "cycle_id": CYCLE_ID, "mudancas": "x", "nova_intencao": "y",
+        "data_conclusao": START + timedelta(days=21)
+    })
+    return database
+
+
+async def test_archiving_releases_the_active_cycle(completed_cycle):
+    summary = await server.archive_cycle(USER_ID, CYCLE_ID)
+    assert summary["days_completed"] == 21
+
+    user = await completed_cycle.users.find_one({"user_id": USER_ID})
+    assert user["active_cycle_id"] is None
+    assert await completed_cycle.daily_records.count_documents({}) == 0
+    # A request still carrying the archived cycle starts its record outside it
+    assert await server.open_cycle_id(USER_ID, CYCLE_ID) is None
+    fields = await server.new_daily_record_fields(USER_ID, CYCLE_ID, datetime.now(timezone.utc))
+    assert fields["cycle_id"] is None
+
+
+async def test_records_reaching_an_archived_cycle_are_merged(completed_cycle):
+    await server.archive_cycle(USER_ID, CYCLE_ID)
+    assert await server.archive_cycle(USER_ID, CYCLE_ID) is None
+
+    late = record(21)
+    await completed_cycle.daily_records.insert_one(late)
+    summary = await server.archive_cycle(USER_ID, CYCLE_ID)
+
+    assert summary["days_completed"] == 22
+    assert await completed_cycle.daily_records.count_documents({}) == 0
+    archived = await server.load_cycle_records(USER_ID, CYCLE_ID)
+    assert [day["day_number"] for day in archived] == list(range(1, 23))
+    assert await completed_cycle.cycle_archives.count_documents({}) == 1
+
+
+async def test_archived_records_are_deleted_for_synced_clients(completed_cycle):
+    synced_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await server.archive_cycle(USER_ID, CYCLE_ID)
+
+    reflection = await completed_cycle.final_reflections.find_one({"cycle_id": CYCLE_ID})
+    assert reflection["updated_at"] == reflection["archived_at"]
+
+    late = record(21)
+    await completed_cycle.daily_records.insert_one(late)
+    await server.archive_cycle(USER_ID, CYCLE_ID)
+
+    user = server.User(user_id=USER_ID, email="a@x.com", name="A", created_at=START)
+    changes = orjson.loads((await server.get_sync_changes(since=synced_at, current_user=user)).body)
+    assert changes["daily_records"] == []
+    deleted = changes["deleted_entries"]
+    assert {entry["collection"] for entry in deleted} == {"daily_records"}
+    assert sorted(entry["date"] for entry in deleted) == [record(day)["date"] for day in range(22)]
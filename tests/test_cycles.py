@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "user_cycles"
+NOW = datetime.now(timezone.utc)
+GOALS = server.UserGoalsCreate(
+    meta_principal="a", desejo_transformar="b", sentimento_desejado="c", compromisso="d"
+)
+
+
+@pytest.fixture
+async def user(database):
+    await database.users.insert_one({"user_id": USER_ID, "email": "c@x.com", "name": "C", "created_at": NOW})
+    return server.User(user_id=USER_ID, email="c@x.com", name="C", created_at=NOW)
+
+
+async def test_days_logged_before_goals_join_the_first_cycle(user, database):
+    await server.create_or_update_daily_record(
+        server.DailyRecordCreate(date="2026-03-10", day_number=1), current_user=user
+    )
+    assert (await database.daily_records.find_one({"user_id": USER_ID}))["cycle_id"] is None
+
+    goals = await server.create_user_goals(GOALS, current_user=user)
+
+    records = await server.load_cycle_records(USER_ID, goals.cycle_id)
+    assert [record["date"] for record in records] == ["2026-03-10"]
+
+
+async def test_a_new_cycle_does_not_take_records_of_the_previous_one(user, database):
+    first = await server.create_user_goals(GOALS, current_user=user)
+    user.active_cycle_id = first.cycle_id
+    await server.create_or_update_daily_record(
+        server.DailyRecordCreate(date="2026-03-10", day_number=1), current_user=user
+    )
+    await database.final_reflections.insert_one(
+        {"user_id": USER_ID, "cycle_id": first.cycle_id, "mudancas": "x", "nova_intencao": "y", "data_conclusao": NOW}
+    )
+
+    second = await server.create_user_goals(GOALS, current_user=user)
+
+    assert second.cycle_id != first.cycle_id
+    assert len(await server.load_cycle_records(USER_ID, first.cycle_id)) == 1
+    assert await server.load_cycle_records(USER_ID, second.cycle_id) == []
+
+
+async def test_migration_adopts_unassigned_records(database):
+    await database.users.insert_many([
+        {"user_id": "with_cycle", "active_cycle_id": "cycle_1"},
+        {"user_id": "without_cycle"},
+    ])
+    await database.daily_records.insert_many([
+        {"user_id": "with_cycle", "cycle_id": None, "date": "2026-03-10"},
+        {"user_id": "without_cycle", "cycle_id": None, "date": "2026-03-10"},
+    ])
+
+    await server.adopt_unassigned_daily_records()
+
+    cycles = {record["user_id"]: record["cycle_id"] for record in await database.daily_records.find().to_list(None)}
+    assert cycles == {"with_cycle": "cycle_1", "without_cycle": None}
+
+
+async def test_sync_sends_only_the_days_of_the_active_cycle(user, database):
+    await database.daily_records.insert_many([
+        {"user_id": USER_ID, "cycle_id": "cycle_old", "date": "2026-01-10", "updated_at": NOW},
+        {"user_id": USER_ID, "cycle_id": "cycle_new", "date": "2026-03-10", "updated_at": NOW},
+        {"user_id": USER_ID, "cycle_id": None, "date": "2026-03-11", "updated_at": NOW},
+    ])
+    user.active_cycle_id = "cycle_new"
+
+    changes = orjson.loads((await server.get_sync_changes(since=None, current_user=user)).body)
+
+    assert [record["date"] for record in changes["daily_records"]] == ["2026-03-10", "2026-03-11"]
+
+
+async def test_cycle_backfill_moves_updated_at(database):
+    await database.users.insert_one({"user_id": USER_ID, "created_at": NOW})
+    await database.user_goals.insert_one({"user_id": USER_ID, "created_at": NOW})
+    await database.daily_records.insert_one({"user_id": USER_ID, "date": "2026-03-10", "updated_at": NOW})
+
+    await server.backfill_cycle_ids()
+
+    record = await database.daily_records.find_one({"user_id": USER_ID})
+    assert record["cycle_id"].startswith("cycle_")
+    assert record["updated_at"] > NOW.replace(tzinfo=None)
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "user_edits"
+DATE = "2026-03-10"
+
+
+@pytest.fixture
+async def day(database):
+    now = datetime.now(timezone.utc)
+    await database.daily_records.insert_one({
+        "user_id": USER_ID, "date": DATE, "day_number": 1,
+        "calories_consumed": 300, "calories_burned": 250, "updated_at": now
+    })
+    await database.food_entries.insert_many([
+        {"entry_id": "fe_1", "user_id": USER_ID, "date": DATE, "meal_type": "almoco", "food_id": "f001",
+         "food_name": "Maçã", "portions": 100.0, "calories": 52, "created_at": now, "updated_at": now},
+        {"entry_id": "fe_2", "user_id": USER_ID, "date": DATE, "meal_type": "almoco", "food_id": "f002",
+         "food_name": "Banana", "portions": 200.0, "calories": 248, "created_at": now, "updated_at": now},
+    ])
+    await database.activity_entries.insert_one({
+        "entry_id": "ae_1", "user_id": USER_ID, "date": DATE, "activity_id": "a001", "activity_name": "Caminhada",
+        "duration": 50, "intensity": "media", "calories_burned": 250, "created_at": now, "updated_at": now
+    })
+    return database
+
+
+async def counters(database):
+    record = await database.daily_records.find_one({"user_id": USER_ID, "date": DATE})
+    return record["calories_consumed"], record["calories_burned"]
+
+
+async def test_update_moves_only_the_difference(day):
+    updated = await server.update_entry("food_entries", USER_ID, "fe_1", {"portions": 150.0, "calories": 78})
+    assert updated["calories"] == 78
+    assert await counters(day) == (326, 250)
+
+    await server.update_entry("activity_entries", USER_ID, "ae_1", {"duration": 30, "calories_burned": 150})
+    assert await counters(day) == (326, 150)
+
+
+async def test_update_without_calorie_change_leaves_counters(day):
+    await server.update_entry("food_entries", USER_ID, "fe_1", {"meal_type": "jantar"})
+    assert await counters(day) == (300, 250)
+
+
+async def test_delete_reverses_calories_and_leaves_a_tombstone(day):
+    assert await server.delete_entry("food_entries", USER_ID, "fe_2")
+    assert await server.delete_entry("activity_entries", USER_ID, "ae_1")
+    assert await counters(day) == (52, 0)
+
+    tombstones = await day.deleted_entries.find({"user_id": USER_ID}, {"_id": 0, "updated_at": 0}).to_list(None)
+    assert sorted(tombstones, key=lambda tombstone: tombstone["entry_id"]) == [
+        {"user_id": USER_ID, "collection": "activity_entries", "entry_id": "ae_1", "date": DATE},
+        {"user_id": USER_ID, "collection": "food_entries", "entry_id": "fe_2", "date": DATE},
+    ]
+
+
+async def test_repeated_delete_and_foreign_entries_change_nothing(day):
+    assert await server.delete_entry("food_entries", USER_ID, "fe_2")
+    assert not await server.delete_entry("food_entries", USER_ID, "fe_2")
+    assert not await server.delete_entry("food_entries", "someone_else", "fe_1")
+    assert await server.update_entry("food_entries", "someone_else", "fe_1", {"calories": 0}) is None
+    assert await counters(day) == (52, 250)
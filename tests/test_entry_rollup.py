@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "user_rollup"
+NOW = datetime.now(timezone.utc)
+OLD_DAY = (NOW - timedelta(days=200)).strftime("%Y-%m-%d")
+RECENT_DAY = (NOW - timedelta(days=5)).strftime("%Y-%m-%d")
+
+
+def food_entry(index, date, food_id, portions, calories, meal_type="almoco"):
+    return {
+        "entry_id": f"fe_{index}", "user_id": USER_ID, "date": date, "meal_type": meal_type,
+        "food_id": food_id, "food_name": food_id, "portions": portions, "calories": calories,
+        "created_at": NOW, "updated_at": NOW
+    }
+
+
+def activity_entry(index, date, duration, calories):
+    return {
+        "entry_id": f"ae_{index}", "user_id": USER_ID, "date": date, "activity_id": "a001",
+        "activity_name": "Musculação", "duration": duration, "intensity": "media",
+        "calories_burned": calories, "created_at": NOW, "updated_at": NOW
+    }
+
+
+@pytest.fixture
+async def history(catalog, database):
+    await database.users.insert_one({"user_id": USER_ID, "email": "r@x.com", "name": "R", "created_at": NOW})
+    await database.food_entries.insert_many([
+        food_entry(1, OLD_DAY, "f001", 150.0, 78, "cafe_manha"),
+        food_entry(2, OLD_DAY, "f002", 100.0, 89),
+        food_entry(3, OLD_DAY, "f001", 100.0, 52),
+        food_entry(4, RECENT_DAY, "f002", 120.0, 106),
+    ])
+    # Musculação (MET 5.0) at 70 kg: 60 min = 350 kcal, 30 min = 175 kcal
+    await database.activity_entries.insert_many([
+        activity_entry(1, OLD_DAY, 60, 350),
+        activity_entry(2, OLD_DAY, 60, 350),
+        activity_entry(3, OLD_DAY, 30, 175),
+        activity_entry(4, RECENT_DAY, 60, 350),
+    ])
+    await database.daily_records.insert_one(
+        {"user_id": USER_ID, "date": OLD_DAY, "day_number": 1, "calories_burned": 875, "updated_at": NOW}
+    )
+    return database
+
+
+def user():
+    return server.User(user_id=USER_ID, email="r@x.com", name="R", created_at=NOW)
+
+
+async def nutrient_totals(start, end):
+    response = await server.get_nutrient_totals(start, end, current_user=user())
+    return orjson.loads(response.body)
+
+
+async def test_totals_are_identical_before_and_after_rollup(history):
+    start, end = OLD_DAY, NOW.strftime("%Y-%m-%d")
+    before = await nutrient_totals(start, end)
+
+    stats = await server.entry_rollup.run(after_days=90)
+    assert (stats["days"], stats["food_entries"], stats["activity_entries"]) == (1, 3, 3)
+    assert await history.food_entries.count_documents({"date": OLD_DAY}) == 0
+
+    assert await nutrient_totals(start, end) == before
+
+
+async def test_summary_keeps_activity_totals_and_groups(history):
+    await server.entry_rollup.run(after_days=90)
+
+    summary = await history.daily_summaries.find_one({"user_id": USER_ID, "date": OLD_DAY})
+    assert summary["food_entry_count"] == 3
+    assert (summary["calories_burned"], summary["activity_entry_count"]) == (875, 3)
+    assert summary["by_activity_category"] == {"Academia": {"calories_burned": 875, "duration": 150, "entries": 3}}
+    assert sorted((group["duration"], group["entries"]) for group in summary["activities"]) == [(30, 1), (60, 2)]
+
+
+async def test_leftover_rows_of_a_summarized_day_are_not_counted_twice(history):
+    await server.entry_rollup.run(after_days=90)
+    summary = await history.daily_summaries.find_one({"user_id": USER_ID, "date": OLD_DAY})
+
+    # As if a previous run stopped between the summary write and the deletes
+    await history.food_entries.insert_one(food_entry(5, OLD_DAY, "f001", 100.0, 52))
+    stats = {"users": 0, "days": 0, "food_entries": 0, "activity_entries": 0}
+    await server.entry_rollup.roll_up_days(USER_ID, [OLD_DAY], False, stats)
+
+    assert stats["food_entries"] == 1
+    assert await history.food_entries.count_documents({"date": OLD_DAY}) == 0
+    assert await history.daily_summaries.find_one({"user_id": USER_ID, "date": OLD_DAY}) == summary
+
+
+async def test_recalculation_updates_rolled_up_days(history):
+    await server.entry_rollup.run(after_days=90)
+    await history.jobs.insert_one({"job_id": "job_1", "user_id": USER_ID, "status": "pending"})
+
+    await server.recalculate_calories_burned("job_1", USER_ID, 80)
+
+    # 80 kg: 60 min = 400 kcal, 30 min = 200 kcal
+    summary = await history.daily_summaries.find_one({"user_id": USER_ID, "date": OLD_DAY})
+    assert summary["calories_burned"] == 1000
+    assert summary["by_activity_category"]["Academia"]["calories_burned"] == 1000
+    record = await history.daily_records.find_one({"user_id": USER_ID, "date": OLD_DAY})
+    assert record["calories_burned"] == 1000
+    recent = await history.activity_entries.find_one({"date": RECENT_DAY})
+    assert recent["calories_burned"] == 400
+
+
+async def test_sync_returns_summaries_of_rolled_up_days(history):
+    synced = orjson.loads((await server.get_sync_changes(None, current_user=user())).body)
+    watermark = datetime.fromisoformat(synced["watermark"].replace("Z", "+00:00")) + server.SYNC_WATERMARK_LAG
+    assert synced["daily_summaries"] == []
+
+    await server.entry_rollup.run(after_days=90)
+
+    delta = orjson.loads((await server.get_sync_changes(watermark, current_user=user())).body)
+    assert [summary["date"] for summary in delta["daily_summaries"]] == [OLD_DAY]
+    assert delta["daily_summaries"][0]["calories_burned"] == 875
+    full = orjson.loads((await server.get_sync_changes(None, current_user=user())).body)
+    assert {entry["date"] for entry in full["food_entries"]} == {RECENT_DAY}
+    assert [summary["date"] for summary in full["daily_summaries"]] == [OLD_DAY]
@@ -0,0 +1,76 @@
+import pytest
+from bson import ObjectId
+
+import server
+
+
+@pytest.fixture
+def cache(database, monkeypatch):
+    monkeypatch.setattr(server.change_streams, "active", True)
+    return server.ExpiringCache("test")
+
+
+def test_delete_event_evicts_only_the_owner(cache, monkeypatch):
+    monkeypatch.setattr(server, "progress_cache", cache)
+    record_a, record_b = ObjectId(), ObjectId()
+    cache.set("user_a", ("records", "goals"), cache.generation, tags=(record_a,))
+    cache.set("user_b", ("records", "goals"), cache.generation, tags=(record_b,))
+
+    server.invalidate_progress({"operationType": "delete", "documentKey": {"_id": record_a}})
+    assert cache.get("user_a") is None
+    assert cache.get("user_b") is not None
+
+    # A record no cached user holds evicts nothing
+    server.invalidate_progress({"operationType": "delete", "documentKey": {"_id": ObjectId()}})
+    assert cache.get("user_b") is not None
+
+
+def test_replaced_and_evicted_entries_drop_their_tags(cache):
+    cache.max_size = 1
+    cache.set("token_1", {"user": "a"}, cache.generation, tags=("user_a",))
+    cache.set("token_1", {"user": "a"}, cache.generation, tags=("user_a", "oid_1"))
+    assert cache.tagged == {"user_a": {"token_1"}, "oid_1": {"token_1"}}
+
+    cache.set("token_2", {"user": "b"}, cache.generation, tags=("user_b",))
+    assert cache.tagged == {"user_b": {"token_2"}}
+
+    cache.discard_tagged("user_b")
+    assert not cache.entries and not cache.tagged
+
+
+def test_unrelated_invalidation_does_not_block_caching(cache):
+    generation = cache.generation
+    cache.pop("user_b")
+    cache.discard_tagged("oid_of_someone_else")
+    cache.set("user_a", 1, generation, tags=("oid_a",))
+    assert cache.get("user_a") == 1
+
+
+def test_load_racing_its_own_invalidation_is_dropped(cache):
+    generation = cache.generation
+    cache.pop("user_a")
+    cache.set("user_a", 1, generation)
+    assert cache.get("user_a") is None
+
+    generation = cache.generation
+    cache.discard_tagged("oid_a")
+    cache.set("user_a", 1, generation, tags=("oid_a",))
+    assert cache.get("user_a") is None
+
+    generation = cache.generation
+    cache.clear()
+    cache.set("user_a", 1, generation)
+    assert cache.get("user_a") is None
+
+
+def test_forgotten_invalidations_make_older_loads_stale(cache):
+    cache.max_size = 2
+    generation = cache.generation
+    for user in ("user_b", "user_c", "user_d"):
+        cache.pop(user)
+    assert len(cache.invalidated) == 2
+
+    cache.set("user_a", 1, generation)
+    assert cache.get("user_a") is None
+    cache.set("user_a", 1, cache.generation)
+    assert cache.get("user_a") == 1
@@ -0,0 +1,81 @@
+import random
+import time
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+NAMES = ["Pão de Queijo", "Pão", "Pão Francês", "Pão Integral", "Torrada de Pão", "Queijo Minas"]
+
+
+@pytest.fixture
+async def foods(database):
+    documents = [
+        server.food_document({
+            "food_id": f"f{i:03d}", "name": name, "category": "Lanches",
+            "calories_per_100g": 250, "detox_friendly": False
+        })
+        for i, name in enumerate(NAMES)
+    ]
+    random.Random(7).shuffle(documents)
+    await database.foods.insert_many(documents)
+    await server.catalog_cache.load()
+    return documents
+
+
+async def get_foods(search=None, limit=50, offset=0):
+    response = await server.get_foods(category=None, search=search, limit=limit, offset=offset)
+    return [food["name"] for food in orjson.loads(response.body)]
+
+
+def test_search_key_folds_case_accents_and_punctuation():
+    assert server.search_key("  Pão-de-Queijo (Mineiro)! ") == "pao de queijo mineiro"
+    assert server.search_key("AÇAÍ") == "acai"
+
+
+def test_search_relevance_orders_exact_prefix_then_word_prefix():
+    keys = ["torrada de pao", "pao frances", "pao", "paozinho"]
+    assert sorted(keys, key=lambda key: server.search_relevance(key, "pao")) == [
+        "pao", "paozinho", "pao frances", "torrada de pao"
+    ]
+    assert server.search_relevance("queijo", "pao")[0] == 3
+
+
+def test_rank_foods_matches_on_the_search_key():
+    foods = [{"name": name} for name in ("Torrada de Pão", "Pão Francês", "Pão")]
+    assert [food["name"] for food in server.rank_foods(foods, "pao")] == ["Pão", "Pão Francês", "Torrada de Pão"]
+
+
+async def test_search_ranks_leading_and_word_matches(foods):
+    assert await get_foods("pão") == ["Pão", "Pão Francês", "Pão Integral", "Pão de Queijo", "Torrada de Pão"]
+    assert await get_foods("queijo") == ["Queijo Minas", "Pão de Queijo"]
+    assert await get_foods("pao", limit=2, offset=3) == ["Pão de Queijo", "Torrada de Pão"]
+
+
+async def test_candidates_are_read_in_name_order(foods, monkeypatch):
+    monkeypatch.setattr(server, "SEARCH_CANDIDATES", 2)
+    # Both queries see the same first two names whatever the insertion order
+    found = await server.search_foods("queijo", None)
+    assert [food["name"] for food in found] == ["Queijo Minas", "Pão de Queijo"]
+
+
+async def test_pages_past_the_candidates_are_rejected(foods):
+    with pytest.raises(HTTPException) as error:
+        await get_foods("pao", limit=50, offset=server.SEARCH_CANDIDATES)
+    assert error.value.status_code == 400
+    # The listing is not capped
+    assert len(await get_foods(limit=50, offset=server.SEARCH_CANDIDATES)) == 0
+
+
+async def test_open_breaker_searches_the_cached_catalog(foods, monkeypatch):
+    breaker = server.CircuitBreaker("catalog", failures=1, reset_timeout=60)
+    breaker.opened_at = time.monotonic()
+    monkeypatch.setattr(server.catalog_cache, "breaker", breaker)
+
+    assert await get_foods("pao fr") == ["Pão Francês"]
+    assert await get_foods("de") == ["Pão de Queijo", "Torrada de Pão"]
+    assert breaker.rejected == 2
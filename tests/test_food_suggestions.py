@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import pytest
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "user_suggestions"
+NOW = datetime.now(timezone.utc)
+FOOD_IDS = ["rice", "egg", "tbca.c0001", "$oats", "50%cocoa"]
+
+
+@pytest.fixture
+async def user(database):
+    await database.foods.insert_many([
+        server.food_document({
+            "food_id": food_id, "name": f"Food {i}", "category": "Lanches",
+            "calories_per_100g": 100, "detox_friendly": True
+        })
+        for i, food_id in enumerate(FOOD_IDS)
+    ])
+    await server.catalog_cache.load()
+    return server.User(user_id=USER_ID, email="s@x.com", name="S", created_at=NOW)
+
+
+async def suggestions(user, meal_type=None, limit=10):
+    response = await server.get_food_suggestions(meal_type=meal_type, limit=limit, current_user=user)
+    return orjson.loads(response.body)
+
+
+def test_food_stats_key_escapes_dots_and_dollars():
+    assert server.food_stats_key("tbca.c0001") == "tbca%2Ec0001"
+    assert server.food_stats_key("$oats") == "%24oats"
+    # Escaping is reversible: an existing % cannot collide with an escape
+    assert server.food_stats_key("a%2Eb") == "a%252Eb" != server.food_stats_key("a.b")
+
+
+def test_a_use_one_half_life_ago_weighs_half():
+    ratio = server.food_use_weight(NOW - server.FOOD_USE_HALF_LIFE) / server.food_use_weight(NOW)
+    assert ratio == pytest.approx(0.5)
+
+
+async def test_foods_of_the_meal_come_first_then_overall_use(user):
+    month_ago = NOW - timedelta(days=30)
+    # rice: lots of lunches a month ago; egg: one breakfast today; oats: one lunch today
+    for _ in range(3):
+        await server.record_food_uses(USER_ID, "almoco", [("rice", 150)], month_ago)
+    await server.record_food_uses(USER_ID, "cafe_manha", [("egg", 50)], NOW)
+    await server.record_food_uses(USER_ID, "almoco", [("$oats", 40)], NOW)
+
+    breakfast = await suggestions(user, "cafe_manha")
+    assert [food["food_id"] for food in breakfast] == ["egg", "$oats", "rice"]
+    # Three uses decayed over a month score below one use today
+    lunch = await suggestions(user, "almoco")
+    assert [food["food_id"] for food in lunch] == ["$oats", "rice", "egg"]
+    assert lunch[1]["times_logged"] == 3
+    assert lunch[1]["last_portions"] == 150
+
+    overall = await suggestions(user)
+    assert {food["food_id"] for food in overall[:2]} == {"egg", "$oats"}
+    assert [food["food_id"] for food in await suggestions(user, limit=2)] == [food["food_id"] for food in overall[:2]]
+
+
+async def test_food_ids_with_dots_and_dollars_are_stored_escaped(user, database):
+    await server.record_food_uses(USER_ID, "lanche", [("tbca.c0001", 30), ("50%cocoa", 20)], NOW)
+
+    stats = await database.user_food_stats.find_one({"user_id": USER_ID})
+    assert set(stats["foods"]) == {"tbca%2Ec0001", "50%25cocoa"}
+    assert {food["food_id"] for food in await suggestions(user, "lanche")} == {"tbca.c0001", "50%cocoa"}
+
+
+async def test_foods_no_longer_in_the_catalog_are_skipped(user):
+    await server.record_food_uses(USER_ID, "jantar", [("removed", 100), ("egg", 50)], NOW)
+    assert [food["food_id"] for food in await suggestions(user)] == ["egg"]
+
+
+async def test_stats_are_trimmed_past_the_maximum(user, database, monkeypatch):
+    monkeypatch.setattr(server, "FOOD_STATS_MAX", 3)
+    monkeypatch.setattr(server, "FOOD_STATS_KEEP", 2)
+    for days_ago, food_id in enumerate(FOOD_IDS):
+        await server.record_food_uses(USER_ID, "almoco", [(food_id, 100)], NOW - timedelta(days=days_ago))
+
+    assert len(await suggestions(user)) == len(FOOD_IDS)
+    await asyncio.gather(*server.background_tasks)
+
+    stats = await database.user_food_stats.find_one({"user_id": USER_ID})
+    assert set(stats["foods"]) == {"rice", "egg"}
@@ -0,0 +1,45 @@
+import logging
+
+import pytest
+
+import import_foods
+
+
+def test_csv_rows_report_their_first_line(tmp_path):
+    path = tmp_path / "foods.csv"
+    path.write_text('nome;kcal\nArroz;128\n\nFeijão;"76\n"\nOvo;146\n', encoding="utf-8")
+    assert [line for line, _ in import_foods.read_rows(path)] == [2, 4, 6]
+
+
+def test_jsonl_rows_are_numbered_from_one(tmp_path):
+    path = tmp_path / "foods.jsonl"
+    path.write_text('{"nome": "Arroz"}\n\n{"nome": "Ovo"}\n', encoding="utf-8")
+    assert [line for line, _ in import_foods.read_rows(path)] == [1, 3]
+
+
+@pytest.mark.parametrize("text, number", [
+    ("128", 128.0), ("1,5", 1.5), ("1.5", 1.5), ("1.234,5", 1234.5), ("1,234.5", 1234.5),
+    ("1.234.567,8", 1234567.8), ("Tr", 0.0), ("NA", None),
+])
+def test_parse_number(text, number):
+    assert import_foods.parse_number(text) == number
+
+
+@pytest.mark.anyio
+async def test_malformed_jsonl_lines_are_rejected_not_fatal(tmp_path, database, caplog):
+    path = tmp_path / "foods.jsonl"
+    path.write_text(
+        '{"nome": "Arroz", "categoria": "Grãos", "kcal": "128"}\n'
+        '{"nome": "Feijão", \n'
+        '["Ovo", 146]\n'
+        '{"nome": "Ovo", "categoria": "Proteínas", "kcal": "146"}\n',
+        encoding="utf-8"
+    )
+    importer = import_foods.FoodImporter("test")
+
+    with caplog.at_level(logging.WARNING, logger="import_foods"):
+        await importer.run(path)
+
+    assert (importer.rows, importer.rejected) == (2, 2)
+    assert [record.getMessage().split(":")[0] for record in caplog.records] == ["Row 2 rejected", "Row 3 rejected"]
+    assert await database.foods.count_documents({"source": "test"}) == 2
@@ -0,0 +1,17 @@
+import logging
+
+import server
+
+
+def test_stop_logging_restores_previous_handlers(database):
+    root = logging.getLogger()
+    handlers, level = list(root.handlers), root.level
+
+    for _ in range(2):  # as create_app() twice would
+        server.configure_logging(server.get_settings())
+        assert [type(handler) for handler in root.handlers] == [server.LocalQueueHandler]
+
+    server.stop_logging()
+    assert root.handlers == handlers
+    assert root.level == level
+    assert not any(isinstance(handler, server.LocalQueueHandler) for handler in root.handlers)
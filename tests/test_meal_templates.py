@@ -0,0 +1,139 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "user_templates"
+NOW = datetime.now(timezone.utc)
+TODAY = NOW.strftime("%Y-%m-%d")
+FOODS = [
+    {"food_id": "rice", "name": "Arroz", "category": "Grãos", "calories_per_100g": 130, "detox_friendly": True},
+    {"food_id": "egg", "name": "Ovo", "category": "Proteínas", "calories_per_100g": 146, "detox_friendly": True},
+]
+
+
+class RecordingDatabase:
+    """server.db, noting every (collection, method) called through it"""
+
+    def __init__(self, database):
+        self.database = database
+        self.calls = []
+
+    def __getattr__(self, name):
+        return RecordingCollection(self, name)
+
+    def __getitem__(self, name):
+        return RecordingCollection(self, name)
+
+
+class RecordingCollection:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __getattr__(self, method):
+        self.recorder.calls.append((self.name, method))
+        return getattr(self.recorder.database[self.name], method)
+
+
+async def set_catalog_revision(database, revision):
+    await database.metadata.update_one({"_id": "catalog"}, {"$set": {"updated_at": revision}}, upsert=True)
+    await server.catalog_cache.load()
+
+
+@pytest.fixture
+async def user(database):
+    await database.foods.insert_many([server.food_document(food) for food in FOODS])
+    await set_catalog_revision(database, NOW - timedelta(days=1))
+    await database.daily_records.insert_one(
+        {"user_id": USER_ID, "date": TODAY, "day_number": 1, "calories_consumed": 100, "updated_at": NOW}
+    )
+    return server.User(user_id=USER_ID, email="t@x.com", name="T", created_at=NOW)
+
+
+async def create_template(user, meal_type="almoco"):
+    template = server.MealTemplateCreate(name="Almoço", meal_type=meal_type, items=[
+        server.MealTemplateItem(food_id="rice", portions=200),
+        server.MealTemplateItem(food_id="egg", portions=100),
+    ])
+    return orjson.loads((await server.create_meal_template(template, current_user=user)).body)
+
+
+async def log(user, template_id, meal_type=None):
+    options = server.MealTemplateLog(meal_type=meal_type) if meal_type else None
+    response = await server.log_meal_template(template_id, options, current_user=user)
+    await asyncio.gather(*server.background_tasks)
+    return orjson.loads(response.body)
+
+
+async def test_logging_writes_once_per_collection(user, database, monkeypatch):
+    template = await create_template(user)
+    assert template["total_calories"] == 406
+
+    recorder = RecordingDatabase(database)
+    monkeypatch.setattr(server, "db", recorder)
+    entries = await log(user, template["template_id"])
+
+    writes = [call for call in recorder.calls if call[1] not in ("find", "find_one")]
+    assert writes == [
+        ("food_entries", "insert_many"),
+        ("daily_records", "update_one"),
+        ("user_food_stats", "update_one"),
+    ]
+    assert [(entry["food_id"], entry["calories"], entry["meal_type"]) for entry in entries] == [
+        ("rice", 260, "almoco"), ("egg", 146, "almoco")
+    ]
+    assert await database.food_entries.count_documents({"user_id": USER_ID}) == 2
+    record = await database.daily_records.find_one({"user_id": USER_ID})
+    assert record["calories_consumed"] == 506
+
+
+async def test_catalog_changes_reprice_the_template(user, database):
+    template = await create_template(user)
+
+    await database.foods.update_one({"food_id": "rice"}, {"$set": {"calories_per_100g": 110}})
+    await set_catalog_revision(database, NOW)
+    entries = await log(user, template["template_id"])
+
+    assert [entry["calories"] for entry in entries] == [220, 146]
+    stored = await database.meal_templates.find_one({"template_id": template["template_id"]})
+    assert stored["total_calories"] == 366
+    assert stored["catalog_revision"] == server.catalog_cache.revision
+
+
+async def test_unchanged_catalog_uses_the_saved_prices(user, database):
+    template = await create_template(user)
+    # Not a revision change: the cached calories stand
+    await database.foods.update_one({"food_id": "rice"}, {"$set": {"calories_per_100g": 110}})
+    await server.catalog_cache.load()
+
+    entries = await log(user, template["template_id"])
+    assert [entry["calories"] for entry in entries] == [260, 146]
+
+
+async def test_meal_type_can_be_overridden(user):
+    template = await create_template(user)
+    entries = await log(user, template["template_id"], meal_type="jantar")
+    assert {entry["meal_type"] for entry in entries} == {"jantar"}
+
+
+async def test_meal_type_is_required_without_a_default(user):
+    template = await create_template(user, meal_type=None)
+    with pytest.raises(HTTPException) as error:
+        await log(user, template["template_id"])
+    assert error.value.status_code == 400
+
+    entries = await log(user, template["template_id"], meal_type="lanche")
+    assert len(entries) == 2
+
+
+async def test_unknown_template(user):
+    with pytest.raises(HTTPException) as error:
+        await log(user, "tpl_missing")
+    assert error.value.status_code == 404
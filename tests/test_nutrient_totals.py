@@ -0,0 +1,139 @@
+from datetime import datetime, timezone
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+import server
+
+USER_ID = "user_nutrients"
+NOW = datetime.now(timezone.utc)
+TODAY = NOW.strftime("%Y-%m-%d")
+
+# Per 100 g
+FOODS = [
+    {"food_id": "rice", "name": "Arroz", "category": "Grãos", "calories_per_100g": 130, "detox_friendly": True,
+     "protein_g": 2.5, "carbs_g": 28.0, "fat_g": 0.2, "fiber_g": 1.6},
+    {"food_id": "egg", "name": "Ovo", "category": "Proteínas", "calories_per_100g": 146, "detox_friendly": True,
+     "protein_g": 13.0, "carbs_g": 0.6, "fat_g": 9.5},
+]
+
+
+def entry(date, meal_type, food_id, portions, calories):
+    return {"user_id": USER_ID, "date": date, "meal_type": meal_type, "food_id": food_id,
+            "portions": portions, "calories": calories}
+
+
+def test_totals_per_meal_and_day():
+    rows, macros = server.build_food_macros(FOODS)
+    nutrients = server.nutrient_totals([
+        entry("2026-03-10", "almoco", "rice", 200, 260),
+        entry("2026-03-10", "almoco", "egg", 100, 146),
+        entry("2026-03-10", "jantar", "egg", 50, 73),
+        entry("2026-03-11", "cafe_manha", "rice", 100, 130),
+    ], rows, macros)
+
+    first, second = nutrients["days"]
+    assert (first["date"], second["date"]) == ("2026-03-10", "2026-03-11")
+    assert first["by_meal"]["almoco"] == {
+        "calories": 406, "protein_g": 18.0, "carbs_g": 56.6, "fat_g": 9.9, "fiber_g": 3.2
+    }
+    assert first["by_meal"]["jantar"]["protein_g"] == 6.5
+    assert first["by_meal"]["lanche"] == server.nutrient_dict(server.np.zeros(len(server.NUTRIENTS)))
+    assert first["totals"]["calories"] == 479
+    assert second["totals"] == {"calories": 130, "protein_g": 2.5, "carbs_g": 28.0, "fat_g": 0.2, "fiber_g": 1.6}
+    assert nutrients["totals"]["calories"] == 609
+    assert nutrients["totals"]["fiber_g"] == 4.8
+
+
+def test_unknown_meal_type_counts_in_the_day_total_only():
+    rows, macros = server.build_food_macros(FOODS)
+    nutrients = server.nutrient_totals([
+        entry("2026-03-10", "almoco", "egg", 100, 146),
+        entry("2026-03-10", "ceia", "egg", 100, 146),
+    ], rows, macros)
+
+    day = nutrients["days"][0]
+    assert set(day["by_meal"]) == set(server.MEAL_TYPES)
+    assert sum(meal["calories"] for meal in day["by_meal"].values()) == 146
+    assert day["totals"]["calories"] == 292
+    assert day["totals"]["protein_g"] == 26.0
+
+
+def test_foods_missing_from_the_catalog_keep_calories_without_macros():
+    rows, macros = server.build_food_macros(FOODS)
+    nutrients = server.nutrient_totals([entry("2026-03-10", "almoco", "removed", 100, 300)], rows, macros)
+
+    assert nutrients["totals"] == {"calories": 300, "protein_g": 0.0, "carbs_g": 0.0, "fat_g": 0.0, "fiber_g": 0.0}
+
+
+def test_no_entries():
+    rows, macros = server.build_food_macros(FOODS)
+    assert server.nutrient_totals([], rows, macros) == {
+        "totals": {"calories": 0, "protein_g": 0.0, "carbs_g": 0.0, "fat_g": 0.0, "fiber_g": 0.0}, "days": []
+    }
+
+
+@pytest.fixture
+async def user(database):
+    await database.foods.insert_many([server.food_document(food) for food in FOODS])
+    await server.catalog_cache.load()
+    return server.User(user_id=USER_ID, email="n@x.com", name="N", created_at=NOW)
+
+
+@pytest.mark.anyio
+async def test_today_groups_entries_and_totals_by_meal(user, database):
+    await database.food_entries.insert_many([
+        {**entry(TODAY, "almoco", "rice", 200, 260), "entry_id": "fe_1", "food_name": "Arroz", "created_at": NOW},
+        {**entry(TODAY, "ceia", "egg", 100, 146), "entry_id": "fe_2", "food_name": "Ovo", "created_at": NOW},
+        {**entry("2026-01-01", "almoco", "egg", 100, 146), "entry_id": "fe_3", "food_name": "Ovo", "created_at": NOW},
+    ])
+
+    today = await server.load_today_calories(USER_ID)
+
+    assert today["total_calories"] == 406
+    assert [item["entry_id"] for item in today["by_meal"]["almoco"]] == ["fe_1"]
+    assert len(today["all_entries"]) == 2
+    assert today["by_meal_totals"]["almoco"]["carbs_g"] == 56.0
+    assert today["totals"]["protein_g"] == 18.0
+
+
+@pytest.mark.anyio
+async def test_empty_day_has_zero_meal_totals(user):
+    today = await server.load_today_calories(USER_ID)
+    assert today["total_calories"] == 0
+    assert set(today["by_meal_totals"]) == set(server.MEAL_TYPES)
+    assert all(meal["calories"] == 0 for meal in today["by_meal_totals"].values())
+
+
+@pytest.mark.anyio
+async def test_range_totals(user, database):
+    await database.food_entries.insert_many([
+        entry("2026-03-10", "almoco", "rice", 100, 130),
+        entry("2026-03-12", "jantar", "egg", 100, 146),
+        entry("2026-03-13", "jantar", "egg", 100, 146),
+    ])
+
+    response = await server.get_nutrient_totals(start="2026-03-10", end="2026-03-12", current_user=user)
+    nutrients = orjson.loads(response.body)
+
+    assert [day["date"] for day in nutrients["days"]] == ["2026-03-10", "2026-03-12"]
+    assert nutrients["totals"]["calories"] == 276
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("start, end", [
+    ("2026-01-01", "2027-01-02"),  # 367 days
+    ("2026-03-12", "2026-03-10"),
+    ("2026-02-30", "2026-03-10"),
+])
+async def test_range_is_validated(user, start, end):
+    with pytest.raises(HTTPException) as error:
+        await server.get_nutrient_totals(start=start, end=end, current_user=user)
+    assert error.value.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_a_leap_year_fits_the_range(user):
+    response = await server.get_nutrient_totals(start="2028-01-01", end="2028-12-31", current_user=user)
+    assert orjson.loads(response.body)["days"] == []
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_callers_share_one_load():
+    flight = server.SingleFlight()
+    release = asyncio.Event()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await release.wait()
+        return {"foods": []}
+
+    callers = [asyncio.create_task(flight.do(("foods", "a"), load)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers)
+
+    assert len(loads) == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"foods": {"calls": 5, "executions": 1, "coalescing_ratio": 0.8}}
+    # Finished: the next call loads again
+    await flight.do(("foods", "a"), load)
+    assert len(loads) == 2
+
+
+async def test_different_keys_load_separately():
+    flight = server.SingleFlight()
+
+    async def load(value):
+        await asyncio.sleep(0)
+        return value
+
+    assert await asyncio.gather(flight.do(("foods", "a"), lambda: load(1)), flight.do(("foods", "b"), lambda: load(2))) == [1, 2]
+    assert flight.stats()["foods"]["executions"] == 2
+
+
+async def test_errors_reach_every_waiter():
+    flight = server.SingleFlight()
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise RuntimeError("primary unavailable")
+
+    callers = [asyncio.create_task(flight.do(("foods",), failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+
+    assert [str(result) for result in results] == ["primary unavailable"] * 3
+    assert not flight.in_flight
+
+
+async def test_a_cancelled_waiter_does_not_cancel_the_load():
+    flight = server.SingleFlight()
+    release = asyncio.Event()
+
+    async def load():
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(flight.do(("foods",), load))
+    second = asyncio.create_task(flight.do(("foods",), load))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == "done"
+
+
+def test_metrics_require_the_internal_token(database):
+    client = TestClient(server.app)
+    assert client.get("/health/metrics").status_code == 404
+
+    server.get_settings().metrics_token = "s3cret"
+    assert client.get("/health/metrics").status_code == 401
+    assert client.get("/health/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/health/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "single_flight" in response.json()
@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+from pymongo.errors import PyMongoError
+
+import server
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = "user_water"
+DATE = "2026-03-10"
+
+
+async def wait_for(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not await condition():
+        assert loop.time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+async def stored_water(database):
+    record = await database.daily_records.find_one({"user_id": USER_ID, "date": DATE})
+    return record and record["water_intake"]
+
+
+async def test_failed_flush_is_requeued(database, monkeypatch):
+    buffer = server.WaterWriteBehind(window=0.01, max_delay=0.05)
+    current_day_number = server.current_day_number
+    failures = []
+
+    async def unavailable(user_id, cycle_id):
+        if not failures:
+            failures.append(user_id)
+            raise PyMongoError("primary unavailable")
+        return await current_day_number(user_id, cycle_id)
+
+    monkeypatch.setattr(server, "current_day_number", unavailable)
+    buffer.add(USER_ID, DATE, increment_ml=250)
+
+    await wait_for(lambda: asyncio.sleep(0, bool(failures)))
+    assert (USER_ID, DATE) in buffer.pending
+
+    await wait_for(lambda: stored_water(database))
+    assert await stored_water(database) == 250
+    assert await database.water_events.count_documents({"user_id": USER_ID}) == 1
+    assert not buffer.pending
+
+
+async def test_requeue_keeps_taps_that_arrived_meanwhile(database, monkeypatch):
+    buffer = server.WaterWriteBehind(window=0.01, max_delay=0.05)
+    current_day_number = server.current_day_number
+    flushing = asyncio.Event()
+    release = asyncio.Event()
+
+    async def fails_once(user_id, cycle_id):
+        if not release.is_set():
+            flushing.set()
+            await release.wait()
+            raise PyMongoError("primary unavailable")
+        return await current_day_number(user_id, cycle_id)
+
+    monkeypatch.setattr(server, "current_day_number", fails_once)
+    buffer.add(USER_ID, DATE, increment_ml=250)
+    await flushing.wait()
+
+    # Lands in a fresh batch while the first one is failing
+    buffer.add(USER_ID, DATE, increment_ml=100)
+    release.set()
+
+    await wait_for(lambda: stored_water(database))
+    await wait_for(lambda: asyncio.sleep(0, not buffer.pending))
+    assert await stored_water(database) == 350
+    assert await database.water_events.count_documents({"user_id": USER_ID}) == 2
+
+
+async def test_absolute_value_replaces_requeued_drinks(database):
+    buffer = server.WaterWriteBehind(window=60, max_delay=60)
+    buffer.add(USER_ID, DATE, increment_ml=250)
+    failed = buffer.pending.pop((USER_ID, DATE))
+    buffer.timers.pop((USER_ID, DATE)).cancel()
+
+    buffer.add(USER_ID, DATE, water_ml=1000, increment_ml=200)
+    buffer._requeue((USER_ID, DATE), failed)
+    pending = buffer.pending[(USER_ID, DATE)]
+
+    assert pending["value"] + pending["increment"] == 1200
+    assert len(pending["events"]) == 2
+    await buffer.flush_all()
+    assert await stored_water(database) == 1200
+
+
+async def test_reads_include_buffered_taps(database, monkeypatch):
+    buffer = server.WaterWriteBehind(window=60, max_delay=60)
+    monkeypatch.setattr(server, "water_buffer", buffer)
+
+    buffer.add(USER_ID, DATE, increment_ml=250)
+    record = await server.load_daily_record(USER_ID, DATE)
+    assert record["water_intake"] == 250
+    assert record["day_number"] == 1
+
+    await buffer.flush_all()
+    buffer.add(USER_ID, DATE, increment_ml=300)
+    assert (await server.load_daily_record(USER_ID, DATE))["water_intake"] == 550
+
+    buffer.add(USER_ID, DATE, water_ml=800)
+    assert (await server.load_daily_record(USER_ID, DATE))["water_intake"] == 800
+    await buffer.flush_all()
+    assert await stored_water(database) == 800
+
+
+async def test_flush_all_waits_for_flushes_in_flight(database, monkeypatch):
+    buffer = server.WaterWriteBehind(window=0.01, max_delay=0.05)
+    current_day_number = server.current_day_number
+    flushing = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow(user_id, cycle_id):
+        flushing.set()
+        await release.wait()
+        return await current_day_number(user_id, cycle_id)
+
+    monkeypatch.setattr(server, "current_day_number", slow)
+    buffer.add(USER_ID, DATE, increment_ml=250)
+    await flushing.wait()
+    assert not buffer.timers and buffer.flushing
+
+    shutdown = asyncio.create_task(buffer.flush_all())
+    await asyncio.sleep(0.01)
+    assert not shutdown.done()
+
+    release.set()
+    await shutdown
+    assert await stored_water(database) == 250
+    assert not buffer.flushing
+
+
+def test_negative_amounts_are_rejected(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    user = server.User(user_id=USER_ID, email="w@x.com", name="W", created_at=server.datetime.now(server.timezone.utc))
+    monkeypatch.setitem(server.app.dependency_overrides, server.require_auth, lambda: user)
+    client = TestClient(server.app)
+    for params in ({"increment_ml": -250}, {"water_ml": -1}):
+        response = client.put("/api/daily/water", params=params)
+        assert response.status_code == 422